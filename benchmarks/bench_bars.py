@@ -0,0 +1,66 @@
+"""
+Measure the cost of building 1s, 1m and 15m bars as trades are recorded, and of querying them.
+The query is compared with rebuilding the bars of one symbol by rescanning
+its trades in the trade store.
+Usage:
+    python benchmarks/bench_bars.py --trades 500000 --symbols 100
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from models.bars import BarBuilder, BarSeries
+from models.stock import Stock
+from models.trade import TradeType
+from models.trade_store import TradeStore
+from utils.convert import datetime_to_ns
+
+def record(store : TradeStore, stocks : list[Stock], count : int, start_ns : int, step_ns : int) -> float:
+    """
+    Record a trading day of trades and return the elapsed time.
+    """
+    generator = random.Random(0)
+    started = time.perf_counter()
+    for index in range(count):
+        store.record(generator.choice(stocks), generator.randint(1, 100), TradeType.Buy, generator.uniform(1, 100), start_ns + index * step_ns)
+    return time.perf_counter() - started
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="OHLCV bar benchmark")
+    parser.add_argument('--trades', type=int, default=500_000, help='Number of recorded trades')
+    parser.add_argument('--symbols', type=int, default=100, help='Number of symbols')
+    parser.add_argument('--hours', type=float, default=8, help='Length of the simulated trading day')
+    args = parser.parse_args()
+
+    stocks = [Stock(f"S{index}", 1.0, 0, 1.0) for index in range(args.symbols)]
+    start_ns = datetime_to_ns(datetime(2024, 1, 2, 8))
+    step_ns = int(args.hours * 3600 * 10**9) // args.trades
+
+    plain = record(TradeStore(), stocks, args.trades, start_ns, step_ns)
+    store = TradeStore()
+    builder = BarBuilder()
+    builder.attach(store)
+    with_bars = record(store, stocks, args.trades, start_ns, step_ns)
+    print(f"{'record':<28} {args.trades / plain:>14,.0f} trades/s")
+    print(f"{'record + bars':<28} {args.trades / with_bars:>14,.0f} trades/s, {len(builder):,} bars")
+
+    symbol = stocks[0].symbol
+    started = time.perf_counter()
+    bars = builder.bars(symbol, timedelta(minutes=1), start_ns + 3600 * 10**9, start_ns + 2 * 3600 * 10**9)
+    queried = time.perf_counter() - started
+    print(f"{'query one hour of 1m bars':<28} {queried * 1000:>11.3f} ms, {len(bars)} bars")
+
+    started = time.perf_counter()
+    series = BarSeries(60 * 10**9)
+    for trade in store.trades_for(symbol):
+        series.record(datetime_to_ns(trade.date), trade.price, trade.quantity)
+    rescanned = time.perf_counter() - started
+    print(f"{'rescan the symbol trades':<28} {rescanned * 1000:>11.3f} ms, {len(series)} bars")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Measure how concurrent trade recording scales with the number of threads.
+Every thread records trades of its own symbols, so the threads never wait on
+the same symbol lock, while a reader thread keeps querying the VWSP. The
+recorded totals are checked against the generated trades after every run.
+CPython threads share the GIL, so expect throughput to stay roughly flat
+rather than grow with the threads; the run shows the sharded locks add no
+contention on top of it.
+Usage:
+    python benchmarks/bench_concurrency.py --trades 200000 --threads 1 2 4 8
+"""
+import argparse
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from models.stock import Stock
+from models.trade import TradeType
+from models.trade_store import TradeStore
+
+def run(threads : int, trades : int, symbols : int) -> tuple[float, float]:
+    """
+    Record trades from several threads.
+    Args:
+    - threads (int): The number of writer threads.
+    - trades (int): The total number of trades, split evenly between the threads.
+    - symbols (int): The number of symbols, split evenly between the threads.
+    Returns:
+    - tuple[float, float]: The elapsed seconds and the number of VWSP queries answered meanwhile.
+    """
+    stocks = [Stock(f"S{index}", 1.0, 0, 1.0) for index in range(symbols)]
+    store = TradeStore()
+    now_ns = time.time_ns()
+    per_thread = trades // threads
+    done = threading.Event()
+    queries = 0
+
+    def write(thread_index):
+        own = stocks[thread_index::threads]
+        for index in range(per_thread):
+            store.record(own[index % len(own)], 1 + index % 10, TradeType.Buy, 10.0, now_ns)
+
+    def read():
+        nonlocal queries
+        while not done.is_set():
+            for stock in stocks:
+                store.vwsp(stock.symbol)
+                queries += 1
+
+    writers = [threading.Thread(target=write, args=(index,)) for index in range(threads)]
+    reader = threading.Thread(target=read)
+    reader.start()
+    started = time.perf_counter()
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    reader.join()
+
+    expected = threads * sum(1 + index % 10 for index in range(per_thread))
+    recorded = sum(store.totals_since(stock.symbol, datetime(1970, 1, 2))[1] for stock in stocks)
+    if recorded != expected or len(store) != per_thread * threads:
+        sys.exit(f"Recorded volume {recorded} does not match the expected {expected}")
+    return elapsed, queries
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Concurrent trade recording benchmark")
+    parser.add_argument('--trades', type=int, default=200_000, help='Total number of trades per run')
+    parser.add_argument('--symbols', type=int, default=64, help='Number of symbols')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8], help='Thread counts to measure')
+    args = parser.parse_args()
+
+    baseline = None
+    print(f"{'threads':>8} {'elapsed':>10} {'trades/s':>12} {'scaling':>8} {'queries':>10}")
+    for threads in args.threads:
+        elapsed, queries = run(threads, args.trades, max(args.symbols, threads))
+        rate = args.trades // threads * threads / elapsed
+        baseline = baseline or rate
+        print(f"{threads:>8} {elapsed:>9.3f}s {rate:>12,.0f} {rate / baseline:>7.2f}x {queries:>10,}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Compare load time and peak RSS of the list based, streaming and parallel stock loaders.
+Every loader runs in its own process, so the peak RSS of one does not hide the other.
+Usage:
+    python benchmarks/bench_csv_load.py --rows 200000
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.csv import expected_csv_headers, load_csv, init_stock, iter_stock_data
+
+def write_stock_csv(file_path : str, rows : int, seed : int = 0) -> None:
+    """
+    Write a synthetic stock data CSV file.
+    Args:
+    - file_path (str): The path of the file to write.
+    - rows (int): The number of stocks.
+    - seed (int): The random seed.
+    """
+    generator = random.Random(seed)
+    with open(file_path, 'w', newline='') as csv_file:
+        csv_file.write(','.join(expected_csv_headers) + '\n')
+        for index in range(rows):
+            if generator.random() < 0.2:
+                csv_file.write(f"S{index},Preferred,{generator.uniform(0, 1):.2f},{generator.uniform(0.01, 0.1):.2f},{generator.choice([1, 10, 100])}\n")
+            else:
+                csv_file.write(f"S{index},Common,{generator.uniform(0, 1):.2f},,{generator.choice([1, 10, 100])}\n")
+
+def load_list(file_path : str) -> int:
+    """
+    Load stocks the original way, materialising every row before building stocks.
+    """
+    rows = load_csv(file_path)
+    stocks = [stock for index, row in enumerate(rows) if type(stock := init_stock(row, index)) != str]
+    return len(stocks)
+
+def load_streaming(file_path : str) -> int:
+    """
+    Load stocks with the streaming loader, keeping the stocks.
+    """
+    return len(list(iter_stock_data(file_path)))
+
+def load_streaming_chunks(file_path : str) -> int:
+    """
+    Load stocks with the streaming loader in chunks, without keeping them.
+    """
+    return sum(len(chunk) for chunk in iter_stock_data(file_path, chunk_size=10_000))
+
+def load_parallel(file_path : str) -> int:
+    """
+    Load stocks with the streaming loader, parsing in a process pool.
+    """
+    return len(list(iter_stock_data(file_path, workers=os.cpu_count() or 1)))
+
+LOADERS = {
+    'list': load_list,
+    'streaming': load_streaming,
+    'streaming_chunks': load_streaming_chunks,
+    'parallel': load_parallel,
+}
+
+def run_loader(name : str, file_path : str) -> None:
+    """
+    Run a single loader and print its results, called in a child process.
+    """
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        count = LOADERS[name](file_path)
+    elapsed = time.perf_counter() - started
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{name},{count},{elapsed:.3f},{peak_kb / 1024:.1f}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stock loader benchmark")
+    parser.add_argument('--rows', type=int, default=200_000, help='Number of stocks in the generated file')
+    parser.add_argument('--run', choices=LOADERS.keys(), help=argparse.SUPPRESS)
+    parser.add_argument('--file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_loader(args.run, args.file)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = str(Path(directory) / 'stocks.csv')
+        write_stock_csv(file_path, args.rows)
+        print(f"{'loader':<18}{'stocks':>10}{'seconds':>10}{'rows/s':>12}{'peak MB':>10}")
+        for name in LOADERS:
+            output = subprocess.run(
+                [sys.executable, __file__, '--run', name, '--file', file_path],
+                check=True, capture_output=True, text=True
+            ).stdout.strip()
+            _, count, elapsed, peak = output.split(',')
+            print(f"{name:<18}{count:>10}{elapsed:>10}{int(count) / float(elapsed):>12,.0f}{peak:>10}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Compare memory per instance and construction rate of Stock and Trade with the plain dataclasses they replaced.
+The plain versions are reproduced here with the same validation, but with a
+per-instance __dict__ and no trusted constructor.
+Usage:
+    python benchmarks/bench_model_objects.py --count 200000
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from models.stock import Stock, StockType
+from models.trade import Trade, TradeType
+
+@dataclass
+class PlainStock():
+    symbol: str
+    last_dividend: float
+    fixed_dividend: float
+    par_value: float
+    type: StockType = field(default=StockType.Common)
+
+    def __post_init__(self):
+        if self.symbol is None or not len(self.symbol):
+            raise ValueError('Invalid symbol')
+        if self.last_dividend is None or self.last_dividend < 0:
+            raise ValueError('Invalid dividend value')
+        if (self.type == StockType.Common and self.fixed_dividend > 0):
+            raise ValueError('Common Stock with fixed dividend value')
+        if (self.type == StockType.Preferred and not self.fixed_dividend):
+            raise ValueError('Preferred Stock is missing fixed dividend value')
+        if (self.type == StockType.Preferred and self.fixed_dividend <= 0) or self.fixed_dividend > 1:
+            raise ValueError('Invalid fixed dividend value')
+        if self.par_value is None or self.par_value < 0:
+            raise ValueError('Invalid par value')
+
+@dataclass
+class PlainTrade():
+    stock: Stock
+    quantity: int
+    type: TradeType
+    price: float
+    date: datetime = field(default_factory=datetime.now)
+
+    def __post_init__(self):
+        if self.stock is None:
+            raise ValueError("Invalid Trade stock")
+        if self.quantity < 1:
+            raise ValueError("Invalid Trade quantity")
+        if self.price <= 0:
+            raise ValueError("Invalid Trade price")
+        if self.date > datetime.now():
+            raise ValueError("Invalid Trade date")
+
+def measure(label : str, build, count : int) -> None:
+    """
+    Build count instances, printing the construction rate and the memory held per instance.
+    """
+    started = time.perf_counter()
+    build(count)
+    rate = count / (time.perf_counter() - started)
+    tracemalloc.start()
+    instances = build(count)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del instances
+    print(f"{label:<24} {rate:>14,.0f} {size / count:>12.1f}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stock and Trade object benchmark")
+    parser.add_argument('--count', type=int, default=200_000, help='Instances built per measurement')
+    args = parser.parse_args()
+
+    stock = Stock("POP", 8.0, 0, 100.0)
+    date = datetime(2024, 1, 2, 9, 30)
+    # Fields are shared between instances, so only the instances themselves are measured
+    print(f"{'class':<24} {'instances/s':>14} {'bytes/inst':>12}")
+    measure('PlainStock', lambda count: [PlainStock("POP", 8.0, 0, 100.0) for _ in range(count)], args.count)
+    measure('Stock', lambda count: [Stock("POP", 8.0, 0, 100.0) for _ in range(count)], args.count)
+    measure('Stock.trusted', lambda count: [Stock.trusted("POP", 8.0, 0, 100.0) for _ in range(count)], args.count)
+    measure('PlainTrade', lambda count: [PlainTrade(stock, 10, TradeType.Buy, 12.5, date) for _ in range(count)], args.count)
+    measure('Trade', lambda count: [Trade(stock, 10, TradeType.Buy, 12.5, date) for _ in range(count)], args.count)
+    measure('Trade.trusted', lambda count: [Trade.trusted(stock, 10, TradeType.Buy, 12.5, date) for _ in range(count)], args.count)
+
+if __name__ == "__main__":
+    main()
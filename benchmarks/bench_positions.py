@@ -0,0 +1,84 @@
+"""
+Measure the incremental position book: trades applied per second, and the
+time of the book totals and of a bulk revaluation compared with rescanning
+every trade of the store.
+Usage:
+    python benchmarks/bench_positions.py --trades 1000000 --symbols 10000
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from models.positions import CostMethod, PositionBook
+from models.stock import Stock
+from models.symbol_registry import SymbolRegistry
+from models.trade import TradeType
+from models.trade_store import TradeStore
+from utils.convert import datetime_to_ns
+
+def rescan(store : TradeStore, prices : list[float]) -> float:
+    """
+    Compute the unrealized profit and loss at average cost by reading every trade.
+    """
+    quantities : dict[int, int] = {}
+    costs : dict[int, float] = {}
+    for _, symbol_id, quantity, price, side in store.iter_rows():
+        signed = quantity if side == TradeType.Buy.value else -quantity
+        position = quantities.get(symbol_id, 0)
+        cost = costs.get(symbol_id, 0.0)
+        if position and (position > 0) != (signed > 0):
+            closed = -signed if abs(signed) <= abs(position) else position
+            cost -= cost / position * closed
+            position -= closed
+            signed += closed
+        quantities[symbol_id] = position + signed
+        costs[symbol_id] = cost + signed * price
+    return sum(quantity * prices[symbol_id] - costs[symbol_id] for symbol_id, quantity in quantities.items())
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Position book benchmark")
+    parser.add_argument('--trades', type=int, default=1_000_000, help='Number of trades')
+    parser.add_argument('--symbols', type=int, default=10_000, help='Number of symbols')
+    args = parser.parse_args()
+
+    generator = random.Random(0)
+    registry = SymbolRegistry(Stock(f"S{index}", 1.0, 0, 100.0) for index in range(args.symbols))
+    stocks = list(registry)
+    start_ns = datetime_to_ns(datetime.now() - timedelta(minutes=10))
+    trades = [(generator.choice(stocks), generator.randint(1, 1000), TradeType.Buy if generator.random() < 0.5 else TradeType.Sell, round(generator.uniform(1, 200), 2), start_ns + index)
+              for index in range(args.trades)]
+
+    for method in CostMethod:
+        book = PositionBook(registry, method)
+        started = time.perf_counter()
+        for stock, quantity, type, price, _ in trades:
+            book.record(stock, quantity, type, price)
+        elapsed = time.perf_counter() - started
+        print(f"{f'record {method.name}':<24} {elapsed:>8.3f}s {args.trades / elapsed:>14,.0f} trades/s")
+
+    store = TradeStore(registry=registry)
+    book = PositionBook(registry, CostMethod.Average)
+    book.attach(store)
+    for trade in trades:
+        store.record(*trade)
+    prices = [generator.uniform(1, 200) for _ in range(args.symbols)]
+
+    started = time.perf_counter()
+    book.totals()
+    print(f"{'totals':<24} {(time.perf_counter() - started) * 1000:>8.2f}ms")
+    started = time.perf_counter()
+    unrealized = book.revalue(prices)
+    revalued = time.perf_counter() - started
+    print(f"{'revalue':<24} {revalued * 1000:>8.2f}ms {args.symbols:>14,} symbols, unrealized {unrealized:,.2f}")
+    started = time.perf_counter()
+    unrealized = rescan(store, prices)
+    rescanned = time.perf_counter() - started
+    print(f"{'rescan trades':<24} {rescanned * 1000:>8.2f}ms {args.trades:>14,} trades, unrealized {unrealized:,.2f}, {rescanned / revalued:.0f}x slower")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Compare reloading a changed stock data CSV file with loading it again from scratch.
+Usage:
+    python benchmarks/bench_reload.py --stocks 100000 --changes 5
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from models.symbol_registry import SymbolRegistry
+from utils.csv import StockDataReloader, read_stock_data
+
+def write_file(file_path : str, lines : list[str]) -> None:
+    """
+    Write rows under the stock data CSV header.
+    """
+    with open(file_path, 'w') as csv_file:
+        csv_file.write("symbol,type,last_dividend,fixed_dividend,par_value\n")
+        csv_file.write('\n'.join(lines) + '\n')
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stock data hot reload benchmark")
+    parser.add_argument('--stocks', type=int, default=100_000, help='Number of stocks')
+    parser.add_argument('--changes', type=int, default=5, help='Number of changed dividends per reload')
+    args = parser.parse_args()
+
+    generator = random.Random(0)
+    lines = [f"S{index},Common,{generator.uniform(0, 20):.2f},,100" for index in range(args.stocks)]
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "stocks.csv")
+        write_file(file_path, lines)
+
+        started = time.perf_counter()
+        registry = SymbolRegistry(read_stock_data(file_path))
+        full = time.perf_counter() - started
+        print(f"{'full load':<24} {full * 1000:>10.1f}ms {len(registry):>10,} stocks")
+
+        reloader = StockDataReloader(file_path, registry)
+        started = time.perf_counter()
+        reloader.prime()
+        print(f"{'prime':<24} {(time.perf_counter() - started) * 1000:>10.1f}ms")
+
+        for index in generator.sample(range(args.stocks), args.changes):
+            lines[index] = f"S{index},Common,{generator.uniform(20, 40):.2f},,100"
+        write_file(file_path, lines)
+        stats = reloader.reload()
+        print(f"{'reload, edited rows':<24} {stats.elapsed * 1000:>10.1f}ms {len(stats.changed):>10,} changed, {full / stats.elapsed:.0f}x faster")
+
+        lines.insert(args.stocks // 2, "NEW,Preferred,1,0.02,100")
+        del lines[args.stocks // 4]
+        write_file(file_path, lines)
+        stats = reloader.reload()
+        print(f"{'reload, moved rows':<24} {stats.elapsed * 1000:>10.1f}ms {len(stats.added):>10,} added, {len(stats.removed)} removed, {full / stats.elapsed:.0f}x faster")
+
+if __name__ == "__main__":
+    main()
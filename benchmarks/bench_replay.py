@@ -0,0 +1,59 @@
+"""
+Record a simulated trading day to a binary trade file and replay it as fast as possible.
+The replay rate is compared with importing the same file into a trade store,
+which records the trades without moving a clock or taking samples.
+Usage:
+    python benchmarks/bench_replay.py --trades 1000000 --interval 60
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from models.stock import Stock
+from models.symbol_registry import SymbolRegistry
+from models.trade import TradeType
+from models.trade_store import TradeStore
+from services.replay import ReplayEngine
+from utils.convert import datetime_to_ns
+from utils.trade_io import export_trades, import_trades
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Historical replay benchmark")
+    parser.add_argument('--trades', type=int, default=1_000_000, help='Number of recorded trades')
+    parser.add_argument('--symbols', type=int, default=100, help='Number of symbols')
+    parser.add_argument('--hours', type=float, default=8, help='Length of the recorded trading day')
+    parser.add_argument('--interval', type=float, default=60, help='Seconds of simulated time between two samples')
+    args = parser.parse_args()
+
+    registry = SymbolRegistry([Stock(f"S{index}", 1.0, 0, 1.0) for index in range(args.symbols)])
+    stocks = list(registry)
+    store = TradeStore(registry=registry)
+    generator = random.Random(0)
+    start_ns = datetime_to_ns(datetime(2024, 1, 2, 8))
+    step_ns = int(args.hours * 3600 * 10**9) // args.trades
+    for index in range(args.trades):
+        store.record(generator.choice(stocks), generator.randint(1, 100), TradeType.Buy, generator.uniform(1, 100), start_ns + index * step_ns)
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "day.trades")
+        export_trades(file_path, store)
+        del store
+
+        started = time.perf_counter()
+        import_trades(file_path, TradeStore(registry=registry), registry.get)
+        imported = time.perf_counter() - started
+        print(f"{'import_trades':<24} {imported:>8.3f}s {args.trades / imported:>14,.0f} trades/s")
+
+        samples = []
+        stats = ReplayEngine(registry, timedelta(seconds=args.interval)).replay_file(file_path, samples.append)
+        print(f"{'ReplayEngine':<24} {stats.elapsed:>8.3f}s {stats.trades_per_second:>14,.0f} trades/s")
+        print(f"{stats.samples} samples of {len(samples[-1].vwsp)} symbols, final GBCE {samples[-1].gbce:.4f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Simulate a trading day of trades and report the memory held by the trade store every hour.
+With a retention period the memory stays flat once the retention has filled,
+without one it grows with every trade.
+Usage:
+    python benchmarks/bench_retention.py --hours 8 --trades_per_second 50 --retention 30
+    python benchmarks/bench_retention.py --retention 0
+"""
+import argparse
+import random
+import resource
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from models.stock import Stock
+from models.trade import TradeType
+from models.trade_store import TradeStore
+from utils.convert import datetime_to_ns
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Trade store retention benchmark")
+    parser.add_argument('--hours', type=int, default=8, help='Length of the simulated trading day')
+    parser.add_argument('--trades_per_second', type=int, default=50, help='Simulated trades per second')
+    parser.add_argument('--symbols', type=int, default=100, help='Number of symbols')
+    parser.add_argument('--retention', type=float, default=30, help='Retention in minutes, 0 keeps every trade')
+    args = parser.parse_args()
+
+    stocks = [Stock(f"S{index}", 1.0, 0, 1.0) for index in range(args.symbols)]
+    store = TradeStore(retention=timedelta(minutes=args.retention) if args.retention > 0 else None)
+    generator = random.Random(0)
+    start_ns = datetime_to_ns(datetime(2024, 1, 2, 8))
+    step_ns = 10**9 // args.trades_per_second
+    trades_per_hour = 3600 * args.trades_per_second
+    started = time.perf_counter()
+    print(f"{'hour':>5} {'trades':>12} {'resident':>10} {'store MiB':>10} {'peak RSS MiB':>13}")
+    for hour in range(args.hours):
+        for index in range(hour * trades_per_hour, (hour + 1) * trades_per_hour):
+            store.record(generator.choice(stocks), generator.randint(1, 100), TradeType.Buy, generator.uniform(1, 100), start_ns + index * step_ns)
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"{hour + 1:>5} {(hour + 1) * trades_per_hour:>12,} {len(store):>10,} {store.nbytes() / 2**20:>10.2f} {peak_rss:>13.1f}")
+    elapsed = time.perf_counter() - started
+    print(f"{args.hours * trades_per_hour / elapsed:,.0f} trades/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Compare a cold start, parsing the stock data CSV file and importing a trade CSV file, with restoring a snapshot of the same state.
+Usage:
+    python benchmarks/bench_snapshot.py --stocks 100000 --trades 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from models.symbol_registry import SymbolRegistry
+from models.trade_store import TradeStore
+from utils.convert import datetime_to_ns
+from utils.csv import read_stock_data
+from utils.snapshot import load_snapshot, source_fingerprint, write_snapshot
+from utils.trade_io import import_trades_csv
+
+def write_files(directory : str, stocks : int, trades : int) -> tuple[str, str]:
+    """
+    Write a stock data CSV file and a trade CSV file of the last hour.
+    Returns:
+    - tuple[str, str]: The paths of the stock data and of the trade file.
+    """
+    generator = random.Random(0)
+    stocks_path = os.path.join(directory, "stocks.csv")
+    with open(stocks_path, 'w') as csv_file:
+        csv_file.write("symbol,type,last_dividend,fixed_dividend,par_value\n")
+        for index in range(stocks):
+            if index % 5 == 4:
+                csv_file.write(f"S{index},Preferred,{generator.uniform(0, 20):.2f},{generator.uniform(0.01, 0.1):.3f},100\n")
+            else:
+                csv_file.write(f"S{index},Common,{generator.uniform(0, 20):.2f},,100\n")
+    trades_path = os.path.join(directory, "trades.csv")
+    start = datetime_to_ns(datetime.now() - timedelta(hours=1))
+    step = 3600 * 10**9 // max(trades, 1)
+    with open(trades_path, 'w') as csv_file:
+        csv_file.write("symbol,type,quantity,price,timestamp\n")
+        for index in range(trades):
+            timestamp = start + index * step
+            csv_file.write(f"S{generator.randrange(stocks)},{'Buy' if index % 2 else 'Sell'},{generator.randint(1, 1000)},{generator.uniform(1, 200):.2f},{timestamp // 10**9}.{timestamp % 10**9:09d}\n")
+    return stocks_path, trades_path
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Snapshot warm restart benchmark")
+    parser.add_argument('--stocks', type=int, default=100_000, help='Number of stocks')
+    parser.add_argument('--trades', type=int, default=1_000_000, help='Number of trades')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        stocks_path, trades_path = write_files(directory, args.stocks, args.trades)
+        fingerprint = source_fingerprint(stocks_path)
+        trades_fingerprint = source_fingerprint(trades_path)
+
+        started = time.perf_counter()
+        registry = SymbolRegistry(read_stock_data(stocks_path))
+        store = TradeStore(registry=registry)
+        import_trades_csv(trades_path, store, registry.get)
+        cold = time.perf_counter() - started
+        print(f"{'cold start':<20} {cold:>8.3f}s {len(registry):>10,} stocks {len(store):>12,} trades")
+
+        snapshot_path = os.path.join(directory, "market.snapshot")
+        started = time.perf_counter()
+        write_snapshot(snapshot_path, fingerprint, registry, store, trades_fingerprint)
+        print(f"{'write snapshot':<20} {time.perf_counter() - started:>8.3f}s {os.path.getsize(snapshot_path) / 2**20:>10.1f} MiB")
+        del registry, store
+
+        started = time.perf_counter()
+        registry, store = load_snapshot(snapshot_path, fingerprint, lambda registry: TradeStore(registry=registry), trades_fingerprint=trades_fingerprint)
+        warm = time.perf_counter() - started
+        print(f"{'restore snapshot':<20} {warm:>8.3f}s {len(registry):>10,} stocks {len(store):>12,} trades, {cold / warm:.1f}x faster")
+
+if __name__ == "__main__":
+    main()
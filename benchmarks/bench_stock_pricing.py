@@ -0,0 +1,54 @@
+"""
+Compare the per-call cost of the cached stock pricing methods with the uncached calculations they replaced.
+The uncached versions are reproduced here: they dispatch on the stock type
+and multiply the fixed dividend by the par value on every call, and render
+the representation every time it is printed.
+Usage:
+    python benchmarks/bench_stock_pricing.py --calls 1000000
+"""
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from models.stock import Stock, StockType
+
+def uncached_dividend_yield(stock : Stock, price : float) -> float:
+    """
+    The dividend yield as calculated before the constants were cached.
+    """
+    if stock.type == StockType.Common:
+        return (stock.last_dividend / price) if price > 0 else 0
+    return ((stock.fixed_dividend * stock.par_value) / price) if price > 0 else 0
+
+def uncached_pe_ratio(stock : Stock, price : float) -> float:
+    """
+    The P/E ratio as calculated before the constants were cached.
+    """
+    return price / stock.last_dividend if stock.last_dividend > 0 else 0
+
+def measure(label : str, cached, uncached, calls : int) -> None:
+    """
+    Time both versions of an operation and print the per-call cost.
+    """
+    cached_ns = min(timeit.repeat(cached, number=calls, repeat=5)) / calls * 1e9
+    uncached_ns = min(timeit.repeat(uncached, number=calls, repeat=5)) / calls * 1e9
+    print(f"{label:<24} {uncached_ns:>10.1f}ns {cached_ns:>10.1f}ns {uncached_ns / cached_ns:>8.2f}x")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stock pricing micro-benchmark")
+    parser.add_argument('--calls', type=int, default=1_000_000, help='Calls per measurement')
+    args = parser.parse_args()
+
+    common = Stock("POP", 8.0, 0, 100.0)
+    preferred = Stock("GIN", 8.0, 0.02, 100.0, StockType.Preferred)
+    print(f"{'operation':<24} {'uncached':>12} {'cached':>12} {'speedup':>9}")
+    measure('yield (common)', lambda: common.calculate_dividend_yield(12.5), lambda: uncached_dividend_yield(common, 12.5), args.calls)
+    measure('yield (preferred)', lambda: preferred.calculate_dividend_yield(12.5), lambda: uncached_dividend_yield(preferred, 12.5), args.calls)
+    measure('pe ratio', lambda: common.calculate_pe_ratio(12.5), lambda: uncached_pe_ratio(common, 12.5), args.calls)
+    measure('repr', lambda: repr(preferred), lambda: preferred._render(), args.calls // 10)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Measure parsing a column of timestamps to epoch nanoseconds, in bulk and one value at a time.
+Usage:
+    python benchmarks/bench_timestamps.py --count 1000000
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.convert import datetime_to_ns, parse_timestamps, timestamp_to_ns
+
+def make_timestamps(count : int, seed : int = 0) -> tuple[list[str], list[str]]:
+    """
+    Generate the same trading day of increasing timestamps as ISO-8601 and as epoch seconds.
+    Returns:
+    - tuple[list[str], list[str]]: The ISO-8601 and the epoch seconds values.
+    """
+    generator = random.Random(seed)
+    start = datetime(2024, 1, 2, 8)
+    step = timedelta(hours=9) / count
+    moments = [start + step * index + timedelta(microseconds=generator.randrange(1000)) for index in range(count)]
+    return [moment.isoformat(timespec='microseconds') for moment in moments], [f"{moment.timestamp():.6f}" for moment in moments]
+
+def measure(label : str, parse, values : list[str]) -> list:
+    """
+    Time a parser over a column and print the rate.
+    """
+    started = time.perf_counter()
+    result = parse(values)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<36} {elapsed:>8.3f}s {len(values) / elapsed:>14,.0f}/s")
+    return result
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Timestamp parsing benchmark")
+    parser.add_argument('--count', type=int, default=1_000_000, help='Number of timestamps')
+    args = parser.parse_args()
+
+    iso, epoch = make_timestamps(args.count)
+    print(f"{'parser':<36} {'elapsed':>9} {'rate':>16}")
+    measure('float + datetime.fromtimestamp', lambda values: [datetime.fromtimestamp(float(value)) for value in values], epoch)
+    exact = measure('timestamp_to_ns per value', lambda values: [timestamp_to_ns(value) for value in values], epoch)
+    bulk = measure('parse_timestamps (epoch)', parse_timestamps, epoch)
+    reference = measure('fromisoformat + datetime_to_ns', lambda values: [datetime_to_ns(datetime.fromisoformat(value)) for value in values], iso)
+    bulk_iso = measure('parse_timestamps (ISO-8601)', parse_timestamps, iso)
+    if bulk != exact or bulk_iso != reference:
+        sys.exit("Bulk parsing does not match the per value parsers")
+
+if __name__ == "__main__":
+    main()
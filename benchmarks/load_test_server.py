@@ -0,0 +1,124 @@
+"""
+Load test of the market server, reporting requests per second and latency percentiles.
+Every client opens a connection and keeps up to --pipeline requests in flight.
+Without --port a server is started on a free port from main.py and the stock CSV file.
+Usage:
+    python benchmarks/load_test_server.py --clients 8 --requests 20000 --pipeline 32
+    python benchmarks/load_test_server.py --port 8765
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+def make_request(request_id : int, symbols : list[str], generator : random.Random) -> bytes:
+    """
+    Build a random request, mostly queries with some trades.
+    """
+    symbol = generator.choice(symbols)
+    draw = generator.random()
+    if draw < 0.2:
+        request = {'op': 'trade', 'symbol': symbol, 'type': generator.choice(['buy', 'sell']), 'quantity': generator.randint(1, 100), 'price': round(generator.uniform(1, 100), 2)}
+    elif draw < 0.6:
+        request = {'op': 'vwsp', 'symbol': symbol}
+    elif draw < 0.8:
+        request = {'op': 'yield', 'symbol': symbol, 'price': round(generator.uniform(1, 100), 2)}
+    else:
+        request = {'op': 'pe', 'symbol': symbol, 'price': round(generator.uniform(1, 100), 2)}
+    request['id'] = request_id
+    return json.dumps(request).encode() + b'\n'
+
+async def run_client(host : str, port : int, requests : int, pipeline : int, symbols : list[str], seed : int) -> tuple[list[float], int]:
+    """
+    Send requests over one connection, keeping up to pipeline requests in flight.
+    Returns:
+    - tuple[list[float], int]: The latency of every request in seconds, and the number of error responses.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    generator = random.Random(seed)
+    sent_at : dict[int, float] = {}
+    latencies : list[float] = []
+    errors = 0
+    in_flight = asyncio.Semaphore(pipeline)
+
+    async def send():
+        for request_id in range(requests):
+            await in_flight.acquire()
+            sent_at[request_id] = time.perf_counter()
+            writer.write(make_request(request_id, symbols, generator))
+            await writer.drain()
+
+    sender = asyncio.create_task(send())
+    for _ in range(requests):
+        response = json.loads(await reader.readline())
+        latencies.append(time.perf_counter() - sent_at.pop(response['id']))
+        errors += 'error' in response
+        in_flight.release()
+    await sender
+    writer.close()
+    await writer.wait_closed()
+    return latencies, errors
+
+def percentile(values : list[float], fraction : float) -> float:
+    """
+    Get a percentile of sorted values.
+    """
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+async def load_test(host : str, port : int, clients : int, requests : int, pipeline : int, symbols : list[str]) -> None:
+    """
+    Run the clients concurrently and print the results.
+    """
+    started = time.perf_counter()
+    results = await asyncio.gather(*(run_client(host, port, requests, pipeline, symbols, seed) for seed in range(clients)))
+    elapsed = time.perf_counter() - started
+    latencies = sorted(latency for client_latencies, _ in results for latency in client_latencies)
+    errors = sum(client_errors for _, client_errors in results)
+    print(f"requests:     {len(latencies)} ({errors} errors)")
+    print(f"elapsed:      {elapsed:.3f}s")
+    print(f"requests/s:   {len(latencies) / elapsed:,.0f}")
+    for label, fraction in [('p50', 0.5), ('p90', 0.9), ('p99', 0.99)]:
+        print(f"{label} latency:  {percentile(latencies, fraction) * 1000:.3f}ms")
+
+def read_symbols(stock_csv_path : str) -> list[str]:
+    """
+    Read the symbols of a stock CSV file.
+    """
+    with open(stock_csv_path) as csv_file:
+        return [line.split(',')[0] for line in csv_file.read().splitlines()[1:] if line.strip()]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Market server load test")
+    parser.add_argument('--host', default='127.0.0.1', help='Host of the server')
+    parser.add_argument('--port', type=int, default=None, help='Port of a running server, a server is started if omitted')
+    parser.add_argument('--stock_csv', default=str(ROOT / 'stock_data.csv'), help='Stock CSV file of the server')
+    parser.add_argument('--clients', type=int, default=8, help='Number of concurrent connections')
+    parser.add_argument('--requests', type=int, default=20_000, help='Number of requests per connection')
+    parser.add_argument('--pipeline', type=int, default=32, help='Number of requests in flight per connection')
+    args = parser.parse_args()
+
+    symbols = read_symbols(args.stock_csv)
+    server = None
+    port = args.port
+    if port is None:
+        port = 18765
+        server = subprocess.Popen([sys.executable, str(ROOT / 'main.py'), args.stock_csv, '--serve', str(port)], stdout=subprocess.PIPE, text=True, cwd=ROOT)
+        # Wait for the server to report it is listening
+        while 'Serving on' not in server.stdout.readline():
+            if server.poll() is not None:
+                sys.exit('Server failed to start')
+    try:
+        asyncio.run(load_test(args.host, port, args.clients, args.requests, args.pipeline, symbols))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Benchmark suite running the hot paths of models/ and utils/ across data sizes.
+Every case runs on synthetic stocks and trades generated from a fixed seed,
+so runs on the same machine are comparable. Every case times a number of
+calls, each doing a batch of operations such as loading every row of a
+file or 1000 lookups. For every case and
+size the suite records the operations per second of the median call, the
+latency percentiles of one operation (the call time divided by its batch)
+and the peak memory allocated by a call, and writes them to JSON.
+Given a baseline written by an earlier run, it flags the cases that got
+slower or use more memory than the tolerance allows and exits with status 1.
+Usage:
+    python benchmarks/suite.py --save_baseline
+    python benchmarks/suite.py --baseline benchmarks/baseline.json --tolerance 0.25
+    python benchmarks/suite.py --only vwsp gbce --stocks 100 1000 --trades 10000
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from models.stock import Stock, StockType
+from models.symbol_registry import SymbolRegistry
+from models.trade import Trade, TradeType
+from models.trade_store import TradeStore
+from utils.convert import datetime_to_ns
+from utils.csv import read_stock_data
+
+DEFAULT_BASELINE = str(Path(__file__).resolve().parent / 'baseline.json')
+
+#==============================================================================
+# Synthetic data
+
+def make_stocks(count : int, seed : int = 0) -> list[Stock]:
+    """
+    Generate stocks with unique symbols, one in five preferred.
+    """
+    generator = random.Random(seed)
+    stocks = []
+    for index in range(count):
+        symbol = f"S{index:06d}"
+        if index % 5 == 4:
+            stocks.append(Stock(symbol, round(generator.uniform(0, 20), 2), round(generator.uniform(0.01, 0.1), 3), 100.0, StockType.Preferred))
+        else:
+            stocks.append(Stock(symbol, round(generator.uniform(0, 20), 2), 0, 100.0))
+    return stocks
+
+def write_stock_csv(file_path : str, stocks : list[Stock]) -> None:
+    """
+    Write stocks in the Stock Data CSV format.
+    """
+    with open(file_path, 'w') as csv_file:
+        csv_file.write("symbol,type,last_dividend,fixed_dividend,par_value\n")
+        for stock in stocks:
+            fixed = stock.fixed_dividend if stock.type == StockType.Preferred else ''
+            csv_file.write(f"{stock.symbol},{stock.type.name},{stock.last_dividend},{fixed},{stock.par_value}\n")
+
+def make_trades(stocks : list[Stock], count : int, seed : int = 0) -> list[tuple[Stock, int, TradeType, float, int]]:
+    """
+    Generate trades spread over the last ten minutes, inside the default VWSP window.
+    Returns:
+    - list[tuple[Stock, int, TradeType, float, int]]: The stock, quantity, type, price and timestamp (epoch ns) of every trade.
+    """
+    generator = random.Random(seed)
+    start_ns = datetime_to_ns(datetime.now() - timedelta(minutes=10))
+    step_ns = 600 * 10**9 // max(count, 1)
+    return [(generator.choice(stocks), generator.randint(1, 1000), TradeType.Buy if index % 2 else TradeType.Sell, round(generator.uniform(1, 200), 2), start_ns + index * step_ns)
+            for index in range(count)]
+
+#==============================================================================
+# Cases, every case builds its data and returns the operation to time and the work done per call
+
+def case_read_stock_data(stocks : int, trades : int, directory : str) -> tuple[Callable[[], object], int]:
+    file_path = os.path.join(directory, f"stocks_{stocks}.csv")
+    write_stock_csv(file_path, make_stocks(stocks))
+    return lambda: read_stock_data(file_path), stocks
+
+def case_find_stock(stocks : int, trades : int, directory : str) -> tuple[Callable[[], object], int]:
+    data = make_stocks(stocks)
+    registry = SymbolRegistry(data)
+    lookups = [stock.symbol.lower() for stock in random.Random(1).choices(data, k=1000)]
+    get = registry.get
+    return lambda: [get(symbol) for symbol in lookups], len(lookups)
+
+def case_trade_construction(stocks : int, trades : int, directory : str) -> tuple[Callable[[], object], int]:
+    data = make_trades(make_stocks(stocks), 1000)
+    dates = [datetime.now() - timedelta(minutes=1)] * len(data)
+    return lambda: [Trade(stock, quantity, type, price, date) for (stock, quantity, type, price, _), date in zip(data, dates)], len(data)
+
+def case_trade_record(stocks : int, trades : int, directory : str) -> tuple[Callable[[], object], int]:
+    data = make_trades(make_stocks(stocks), trades)
+
+    def record():
+        store = TradeStore()
+        for trade in data:
+            store.record(*trade)
+
+    return record, trades
+
+def case_vwsp(stocks : int, trades : int, directory : str) -> tuple[Callable[[], object], int]:
+    data = make_stocks(stocks)
+    store = TradeStore()
+    for trade in make_trades(data, trades):
+        store.record(*trade)
+    queried = random.Random(2).choices(data, k=1000)
+    return lambda: [stock.calculate_volume_weighted_stock_price(store) for stock in queried], len(queried)
+
+def case_gbce(stocks : int, trades : int, directory : str) -> tuple[Callable[[], object], int]:
+    prices = [random.Random(3).uniform(1, 200) for _ in range(stocks)]
+    return lambda: Stock.calculate_gbce_index(prices), stocks
+
+CASES : dict[str, Callable[[int, int, str], tuple[Callable[[], object], int]]] = {
+    'read_stock_data': case_read_stock_data,
+    'find_stock': case_find_stock,
+    'trade_construction': case_trade_construction,
+    'trade_record': case_trade_record,
+    'vwsp': case_vwsp,
+    'gbce': case_gbce,
+}
+
+#==============================================================================
+# Measurement
+
+@dataclass
+class CaseResult():
+    """
+    The measurements of a case at one size.
+    Attributes:
+    - ops_per_second (float): Operations, such as rows loaded or lookups, per second in the median call.
+    - p50_us, p90_us, p99_us (float): Latency percentiles of one operation in microseconds.
+    - peak_kib (float): Peak memory allocated by a call, in KiB.
+    """
+    ops_per_second : float
+    p50_us : float
+    p90_us : float
+    p99_us : float
+    peak_kib : float
+
+def percentile(values : list[float], fraction : float) -> float:
+    """
+    Get the nearest-rank percentile of sorted values.
+    Args:
+    - values (list[float]): The sorted values.
+    - fraction (float): The percentile as a fraction, 0.99 for p99.
+    Returns:
+    - float: The percentile.
+    """
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def measure(operation : Callable[[], object], work : int, calls : int) -> CaseResult:
+    """
+    Time calls of an operation one by one, then trace the memory of one more call.
+    The median is used for the rate, so a call slowed down by the rest of the machine does not count.
+    Args:
+    - operation (Callable[[], object]): Runs a batch of operations.
+    - work (int): The number of operations in the batch.
+    - calls (int): The number of timed calls.
+    Returns:
+    - CaseResult: The measurements.
+    """
+    operation()
+    latencies = []
+    for _ in range(calls):
+        started = time.perf_counter_ns()
+        operation()
+        latencies.append((time.perf_counter_ns() - started) / work)
+    latencies.sort()
+    tracemalloc.start()
+    operation()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    median = percentile(latencies, 0.5)
+    return CaseResult(1e9 / median, median / 1000, percentile(latencies, 0.9) / 1000, percentile(latencies, 0.99) / 1000, peak / 1024)
+
+def compare(results : dict[str, dict], baseline : dict[str, dict], tolerance : float) -> list[str]:
+    """
+    Find the cases slower, or using more memory, than their baseline beyond the tolerance.
+    Memory growth under 64 KiB is ignored, small cases would flag allocator noise.
+    Args:
+    - results (dict[str, dict]): The results of this run by case.
+    - baseline (dict[str, dict]): The baseline results by case, cases missing from it are skipped.
+    - tolerance (float): The relative slowdown or memory growth allowed.
+    Returns:
+    - list[str]: A description of every regression.
+    """
+    regressions = []
+    for key, result in results.items():
+        if (reference := baseline.get(key)) is None:
+            continue
+        if result['ops_per_second'] < reference['ops_per_second'] * (1 - tolerance):
+            regressions.append(f"{key}: {result['ops_per_second']:,.0f} ops/s, baseline {reference['ops_per_second']:,.0f} ops/s")
+        if result['peak_kib'] > reference['peak_kib'] * (1 + tolerance) + 64:
+            regressions.append(f"{key}: {result['peak_kib']:,.1f} KiB peak, baseline {reference['peak_kib']:,.1f} KiB")
+    return regressions
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Hot path benchmark suite")
+    parser.add_argument('--stocks', type=int, nargs='+', default=[100, 1_000, 10_000], help='Numbers of generated stocks')
+    parser.add_argument('--trades', type=int, nargs='+', default=[10_000, 100_000], help='Numbers of generated trades, for the cases using trades')
+    parser.add_argument('--calls', type=int, default=20, help='Timed calls per case and size')
+    parser.add_argument('--only', nargs='+', choices=list(CASES), default=list(CASES), help='Cases to run')
+    parser.add_argument('--output', type=str, default=None, help='Path of the JSON results, printed when omitted')
+    parser.add_argument('--baseline', type=str, default=DEFAULT_BASELINE, help='Baseline JSON results compared against')
+    parser.add_argument('--save_baseline', action='store_true', help='Write the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Relative slowdown or memory growth flagged as a regression')
+    args = parser.parse_args()
+
+    results : dict[str, dict] = {}
+    print(f"{'case':<40} {'ops/s':>14} {'p50 us/op':>10} {'p90 us/op':>10} {'p99 us/op':>10} {'peak KiB':>10}", file=sys.stderr)
+    with tempfile.TemporaryDirectory() as directory:
+        for name in args.only:
+            uses_trades = name in ['trade_record', 'vwsp']
+            for stocks in args.stocks:
+                for trades in args.trades if uses_trades else [0]:
+                    key = f"{name}/stocks={stocks}" + (f"/trades={trades}" if uses_trades else '')
+                    operation, work = CASES[name](stocks, trades, directory)
+                    result = measure(operation, work, args.calls)
+                    results[key] = asdict(result)
+                    print(f"{key:<40} {result.ops_per_second:>14,.0f} {result.p50_us:>10.3f} {result.p90_us:>10.3f} {result.p99_us:>10.3f} {result.peak_kib:>10.1f}", file=sys.stderr)
+
+    report = {'python': platform.python_version(), 'machine': platform.machine(), 'created': datetime.now().isoformat(timespec='seconds'), 'results': results}
+    if args.output is not None:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    elif not args.save_baseline:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    regressions = []
+    if not args.save_baseline and Path(args.baseline).is_file():
+        with open(args.baseline) as baseline:
+            regressions = compare(results, json.load(baseline)['results'], args.tolerance)
+        for regression in regressions:
+            print(f"[Regression] {regression}", file=sys.stderr)
+        print(f"[Info] {len(regressions)} regressions against {args.baseline}", file=sys.stderr)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as baseline:
+            json.dump(report, baseline, indent=2)
+        print(f"[Info] Baseline written to {args.baseline}", file=sys.stderr)
+    if regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,37 @@
 import argparse
-from utils.csv import read_stock_data
+import contextlib
+import os
+import signal
+import sys
+import time
+from utils.csv import read_stock_data,LoadStats,StockDataReloader
 from models.stock import Stock
 from models.trade import Trade,TradeType
+from models.trade_store import TradeStore
+from models.market import Market
+from models.symbol_registry import SymbolRegistry
+from models.bars import BarBuilder
+from models.positions import PositionBook,CostMethod
+from services.batch import run_batch,BATCH_OUTPUT_FORMATS
+from services.server import run_server
+from services.replay import ReplayEngine,sample_writer
 from utils.convert import try_parse_int,try_parse_float,timestamp_to_datetime
-from datetime import datetime
+from utils.trade_io import import_trades,import_trades_csv,export_trades,export_bars
+from utils.journal import TradeJournal,FsyncPolicy
+from utils.instrumentation import INSTRUMENTATION,ProfileMode
+from utils.snapshot import NO_SOURCE,source_fingerprint,load_snapshot,write_snapshot
+from datetime import datetime,timedelta
+from typing import Callable
 
 stock_data : list[Stock] = []
-trade_data : list[Trade] = []
+stock_registry : SymbolRegistry = SymbolRegistry()
+trade_data : TradeStore = TradeStore()
+stock_reloader : StockDataReloader|None = None
+position_book : PositionBook|None = None
+# Fingerprint of the Stock Data CSV file the snapshot written on exit is valid for
+stock_fingerprint : tuple[int, int]|None = None
+# Fingerprint of the trade file loaded at startup the snapshot written on exit is valid for
+trades_fingerprint : tuple[int, int] = NO_SOURCE
 
 def find_stock_by_ticker(ticker:str) -> Stock|None:
     """
@@ -16,7 +41,7 @@ def find_stock_by_ticker(ticker:str) -> Stock|None:
     Returns:
     - Stock | None: The found stock if exists, None otherwise.
     """
-    return next((x for x in stock_data if x.symbol.lower() == ticker.lower()),None)    
+    return stock_registry.get(ticker)
 
 def handle_stock_menu(stock:Stock):
     """
@@ -71,7 +96,10 @@ def handle_stock_menu(stock:Stock):
                 trade = Trade(stock,quantity,trade_type,price,date)
             except Exception as e:
                 print(f'Could not create Trade! {str(e)}')
-        trade_data.append(trade)        
+        try:
+            trade_data.add(trade)
+        except Exception as e:
+            print(f'Could not record Trade! {str(e)}')
     
     elif choice == "4":
         print(f'Volume Weighted Stock Price: {round(stock.calculate_volume_weighted_stock_price(trade_data),4)}')
@@ -87,11 +115,15 @@ def handle_menu():
     2. Stock Actions
     3. Print all Trades
     4. Calculate GBCE All Share Index
+    5. Export all Trades
+    6. Print instrumentation
+    7. Reload Stock Data
+    8. Print positions
     Input any other key to exit application
     """)
     choice = input("Select one of the above options: ")
 
-    if choice not in ["1","2","3","4"]:
+    if choice not in ["1","2","3","4","5","6","7","8"]:
         print("Exiting. Bye Bye")
         return False
     
@@ -117,23 +149,281 @@ def handle_menu():
                     print(f"Invalid price! Please try again")
                 prices.append(price)
             print(f'GBCE Stock Index: {round(Stock.calculate_gbce_index(prices),4)}')
+
+    elif choice == "5":
+        result = export_trades(input("Export file path: "), trade_data)
+        print(result if type(result) == str else f"Exported {result} trades")
+
+    elif choice == "6":
+        print(INSTRUMENTATION.report() if INSTRUMENTATION.enabled else 'Instrumentation is disabled, run with --instrument')
+
+    elif choice == "7":
+        reload_stock_data()
+
+    elif choice == "8":
+        print_positions()
     
     return True
 
-def main(file_path:str, skip_csv_errors : bool) -> None:
+def load_trades(file_path:str, skip_csv_errors : bool, workers : int = 1) -> bool:
+    """
+    Load trades from a trade CSV file or a binary trade file into the trade store.
+    Args:
+    - file_path (str): Path to the trade file, CSV files are recognised by their .csv extension.
+    - skip_csv_errors (bool): Skip row errors on imported CSV.
+    - workers (int): Number of processes parsing a trade CSV file.
+    Returns:
+    - bool: True if the trades were loaded, False otherwise.
+    """
+    if file_path.lower().endswith('.csv'):
+        result = import_trades_csv(file_path, trade_data, find_stock_by_ticker, skip_csv_errors, workers)
+    else:
+        result = import_trades(file_path, trade_data, find_stock_by_ticker)
+    if type(result) == str:
+        print(result)
+        return False
+    print(f"[Info] Loaded {result} trades")
+    return True
+
+def open_journal(file_path:str, fsync_policy : FsyncPolicy) -> TradeJournal|None:
+    """
+    Open the trade journal and replay its trades into the trade store.
+    The journal is attached to the trade store by the caller, once the
+    trades loaded at startup are in, so they are not journaled.
+    Args:
+    - file_path (str): Path to the journal file, created if missing.
+    - fsync_policy (FsyncPolicy): When the journal is flushed to disk.
+    Returns:
+    - TradeJournal | None: The open journal if successful, None otherwise.
+    """
+    try:
+        journal = TradeJournal(file_path, fsync_policy)
+    except Exception as e:
+        print(f"[Error] Could not open journal. {e}")
+        return None
+    print(f"[Info] Recovered {journal.replay(trade_data, find_stock_by_ticker)} trades from journal")
+    return journal
+
+def run_batch_file(file_path:str, output_format : str) -> None:
+    """
+    Run batch commands against the loaded stocks and trades, writing the results to stdout.
+    Args:
+    - file_path (str): Path to the command file, - reads the commands from stdin.
+    - output_format (str): Either json or csv.
+    """
+    market = Market(stock_registry, trade_data)
+    with (open(file_path) if file_path != '-' else contextlib.nullcontext(sys.stdin)) as commands:
+        succeeded, failed = run_batch(market, commands, sys.stdout, output_format)
+    print(f"[Info] Batch completed, {succeeded} commands succeeded, {failed} failed", file=sys.stderr)
+
+def run_replay_file(file_path:str, vwsp_window : float, interval : float, speed : float|None, output_format : str) -> None:
+    """
+    Replay a binary trade file under a simulated clock, writing the VWSP and GBCE samples to stdout.
+    Args:
+    - file_path (str): Path to the binary trade file.
+    - vwsp_window (float): Volume Weighted Stock Price window in minutes.
+    - interval (float): Seconds of simulated time between two samples.
+    - speed (float | None): Replay speed as a multiple of real time, None replays as fast as possible.
+    - output_format (str): Either json or csv.
+    """
+    try:
+        engine = ReplayEngine(stock_registry, timedelta(seconds=interval), timedelta(minutes=vwsp_window), speed)
+    except ValueError as e:
+        print(f"[Error] {e}", file=sys.stderr)
+        return
+    result = engine.replay_file(file_path, sample_writer(sys.stdout, output_format))
+    print(result if type(result) == str else f"[Info] {result}", file=sys.stderr)
+
+def enable_instrumentation(profile_operation : str|None, profile_mode : ProfileMode, profile_seconds : float) -> bool:
+    """
+    Time the pricing, loading and recording operations, dumping the numbers on SIGUSR1.
+    Args:
+    - profile_operation (str | None): Name of an operation profiled from startup, None profiles none.
+    - profile_mode (ProfileMode): Profile with cProfile or tracemalloc.
+    - profile_seconds (float): How long the operation is profiled for.
+    Returns:
+    - bool: True if the instrumentation is enabled, False if the profiled operation is invalid.
+    """
+    INSTRUMENTATION.enable()
+    # Loaders imported by name into this module keep their original otherwise
+    module = sys.modules[__name__]
+    for name in ['read_stock_data', 'import_trades_csv', 'import_trades', 'export_trades']:
+        INSTRUMENTATION.instrument(module, name)
+    if profile_operation is not None:
+        try:
+            INSTRUMENTATION.profile(profile_operation, profile_mode, profile_seconds)
+        except ValueError as e:
+            print(f"[Error] {e}")
+            return False
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: print(INSTRUMENTATION.report(), file=sys.stderr))
+    return True
+
+def restore_snapshot(file_path:str, fingerprint : tuple[int, int], make_store : Callable[[SymbolRegistry], TradeStore], include_trades : bool, trades_fingerprint : tuple[int, int] = NO_SOURCE) -> bool:
+    """
+    Restore the stocks and trades of a snapshot into the application state.
+    Args:
+    - file_path (str): Path to the snapshot.
+    - fingerprint (tuple[int, int]): Fingerprint of the Stock Data CSV file, a snapshot of another version is not restored.
+    - make_store (Callable[[SymbolRegistry], TradeStore]): Builds the empty trade store of the restored stocks.
+    - include_trades (bool): Restore the trades, False when the journal recovers them.
+    - trades_fingerprint (tuple[int, int]): Fingerprint of the trade file loaded at startup, NO_SOURCE without one. Restored trades of another file are not restored.
+    Returns:
+    - bool: True if the snapshot was restored, False if the stocks have to be loaded from the CSV file.
+    """
+    global stock_data, stock_registry, trade_data
+    if not os.path.isfile(file_path):
+        return False
+    started = time.perf_counter()
+    result = load_snapshot(file_path, fingerprint, make_store, include_trades, trades_fingerprint)
+    if type(result) == str:
+        print(f"[Warning] {result.removeprefix('[Error] ')}. Loading the Stock Data CSV file")
+        return False
+    stock_registry, trade_data = result
+    stock_data = list(stock_registry)
+    print(f"[Info] Restored {len(stock_data)} stocks and {len(trade_data)} trades from snapshot in {time.perf_counter() - started:.3f}s")
+    return True
+
+def reload_stock_data() -> None:
+    """
+    Apply the changes of the Stock Data CSV file to the loaded stocks, keeping the recorded trades.
+    """
+    global stock_data, stock_fingerprint
+    if stock_reloader is None:
+        print("Reloading is not available")
+        return
+    # Taken before reading, so a file changing meanwhile invalidates the snapshot
+    fingerprint = source_fingerprint(stock_reloader.file_path) if stock_fingerprint is not None and os.path.isfile(stock_reloader.file_path) else None
+    result = stock_reloader.reload()
+    if type(result) == str:
+        print(result)
+        return
+    if result.added or result.changed:
+        stock_data = list(stock_registry)
+    if stock_fingerprint is not None:
+        stock_fingerprint = fingerprint
+    print(f"[Info] {result}")
+    if result.removed:
+        print(f"[Warning] Kept {len(result.removed)} stocks removed from the file, trades refer to them: {', '.join(result.removed[:10])}")
+
+def print_positions() -> None:
+    """
+    Print the open positions and the profit and loss of the position book.
+    """
+    if position_book is None:
+        print('Positions are not tracked, run with --positions fifo|average')
+        return
+    for position in position_book.positions(open_only=True):
+        print(f"{position.symbol}: {position.quantity} @ {round(position.average_cost,4)}, mark {round(position.price,4)}, realized {round(position.realized,2)}, unrealized {round(position.unrealized,2)}")
+    realized, unrealized = position_book.totals()
+    print(f"Realized P&L: {round(realized,2)}, Unrealized P&L: {round(unrealized,2)}")
+
+def main(file_path:str, skip_csv_errors : bool, vwsp_window : float = 15, workers : int = 1, trades_path : str|None = None, journal_path : str|None = None, journal_fsync : FsyncPolicy = FsyncPolicy.Batch, batch_path : str|None = None, output_format : str = 'json', serve_port : int|None = None, retention : float|None = None, max_trades : int|None = None, archive_path : str|None = None, replay_path : str|None = None, replay_interval : float = 60, replay_speed : float|None = None, bars_path : str|None = None, instrument : bool = False, profile_operation : str|None = None, profile_mode : ProfileMode = ProfileMode.CProfile, profile_seconds : float = 10, snapshot_path : str|None = None, positions : CostMethod|None = None) -> None:
     """
     The main function to run the application.
     Args:
     - file_path (str): Path to the Stock Data CSV file.
     - skip_csv_errors (bool): Skip row errors on imported CSV.
+    - vwsp_window (float): Volume Weighted Stock Price window in minutes.
+    - workers (int): Number of processes parsing the Stock Data and trade CSV files.
+    - trades_path (str | None): Path to a trade CSV or binary trade file loaded at startup.
+    - journal_path (str | None): Path to the trade journal recovering and persisting the recorded trades.
+    - journal_fsync (FsyncPolicy): When the trade journal is flushed to disk.
+    - batch_path (str | None): Path to a batch command file, - for stdin, run instead of the menu.
+    - output_format (str): Format of the batch results, json or csv.
+    - serve_port (int | None): Port of localhost to serve the market on, run instead of the menu.
+    - retention (float | None): Minutes of trades kept in memory per stock, None keeps them all.
+    - max_trades (int | None): Number of trades kept in memory per stock at most, None for no limit.
+    - archive_path (str | None): Path to a trade journal receiving the trades evicted from memory.
+    - replay_path (str | None): Path to a binary trade file replayed under a simulated clock, run instead of the menu.
+    - replay_interval (float): Seconds of simulated time between two replay samples.
+    - replay_speed (float | None): Replay speed as a multiple of real time, None replays as fast as possible.
+    - bars_path (str | None): Path to a CSV file receiving the 1s, 1m and 15m OHLCV bars of the session on exit.
+    - instrument (bool): Time the pricing, loading and recording operations and print the numbers to stderr on exit.
+    - profile_operation (str | None): Name of an instrumented operation profiled from startup, None profiles none.
+    - profile_mode (ProfileMode): Profile with cProfile or tracemalloc.
+    - profile_seconds (float): How long the operation is profiled for.
+    - snapshot_path (str | None): Path to a snapshot of the stocks and trades, restored at startup unless the Stock Data CSV file changed and written on exit.
+    - positions (CostMethod | None): Track the position and profit and loss of every stock with this cost method, None tracks none.
     """
-    global stock_data
-    stock_data = read_stock_data(file_path, skip_csv_errors)
-    if type(stock_data) == str:
-        print(stock_data)
-        return
-    while handle_menu():
-        pass
+    global stock_data, stock_registry, trade_data, stock_reloader, stock_fingerprint, trades_fingerprint, position_book
+    journal = archive = bars = None
+    # Batch and replay results go to stdout, so loading messages are kept out of it
+    with contextlib.redirect_stdout(sys.stderr) if batch_path is not None or replay_path is not None else contextlib.nullcontext():
+        if (instrument or profile_operation is not None) and not enable_instrumentation(profile_operation, profile_mode, profile_seconds):
+            return
+        make_store = lambda registry: TradeStore(timedelta(minutes=vwsp_window), registry, timedelta(minutes=retention) if retention is not None else None, max_trades)
+        # Taken before loading, so a stock data or trade file changing meanwhile invalidates the snapshot
+        stock_fingerprint = source_fingerprint(file_path) if snapshot_path is not None and os.path.isfile(file_path) else None
+        trades_fingerprint = source_fingerprint(trades_path) if stock_fingerprint is not None and trades_path is not None and os.path.isfile(trades_path) else NO_SOURCE
+        restored = restore_snapshot(snapshot_path, stock_fingerprint, make_store, journal_path is None, trades_fingerprint) if stock_fingerprint is not None else False
+        if not restored:
+            stats = LoadStats()
+            stock_data = read_stock_data(file_path, skip_csv_errors, stats, workers)
+            if type(stock_data) == str:
+                print(stock_data)
+                return
+            print(f"[Info] {stats}")
+            stock_registry = SymbolRegistry(stock_data)
+            try:
+                trade_data = make_store(stock_registry)
+            except ValueError as e:
+                print(f"[Error] {e}")
+                return
+        if journal_path is not None and (journal := open_journal(journal_path, journal_fsync)) is None:
+            return
+        # Trades loaded at startup are part of a restored snapshot of the same
+        # trade file. They are never journaled, so they are loaded again next
+        # to a recovered journal
+        if trades_path is not None and restored and journal is None:
+            print(f"[Info] Trades of {trades_path} restored from snapshot, the file is unchanged")
+        elif trades_path is not None and not load_trades(trades_path, skip_csv_errors, workers):
+            if journal is not None:
+                journal.close()
+            return
+        if journal is not None:
+            trade_data.journal = journal
+        # Opened after loading, so trades evicted while recovering are not archived twice
+        if archive_path is not None:
+            try:
+                archive = trade_data.archive = TradeJournal(archive_path, FsyncPolicy.Never)
+            except Exception as e:
+                print(f"[Warning] Could not open trade archive, evicted trades are dropped. {e}")
+        if bars_path is not None:
+            bars = BarBuilder()
+            bars.attach(trade_data)
+        if positions is not None:
+            position_book = PositionBook(stock_registry, positions)
+            position_book.attach(trade_data)
+        # Only the long running modes reload, the rows of the loaded file are remembered for the diff
+        if replay_path is None and batch_path is None:
+            stock_reloader = StockDataReloader(file_path, stock_registry, skip_csv_errors)
+            stock_reloader.prime()
+            if hasattr(signal, 'SIGHUP'):
+                signal.signal(signal.SIGHUP, lambda signum, frame: reload_stock_data())
+    try:
+        if replay_path is not None:
+            run_replay_file(replay_path, vwsp_window, replay_interval, replay_speed, output_format)
+        elif batch_path is not None:
+            run_batch_file(batch_path, output_format)
+        elif serve_port is not None:
+            run_server(Market(stock_registry, trade_data), port=serve_port)
+        else:
+            while handle_menu():
+                pass
+    finally:
+        if journal is not None:
+            journal.close()
+        if archive is not None:
+            archive.close()
+        if bars is not None:
+            result = export_bars(bars_path, bars)
+            print(result if type(result) == str else f"[Info] Exported {result} bars", file=sys.stderr)
+        if stock_fingerprint is not None:
+            result = write_snapshot(snapshot_path, stock_fingerprint, stock_registry, trade_data, trades_fingerprint)
+            print(result if type(result) == str else f"[Info] Snapshot of {len(stock_registry)} stocks and {result} trades written", file=sys.stderr)
+        if INSTRUMENTATION.enabled:
+            print(INSTRUMENTATION.report(), file=sys.stderr)
 
 def parse_arguments() -> argparse.Namespace:
     """
@@ -144,9 +434,30 @@ def parse_arguments() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Argument Parser Example")
     parser.add_argument('stock_csv_path', type=str, help='Path to the Stock Data CSV file')
     parser.add_argument('--skip_csv_errors', action='store_true', help='Skip row errors on imported CSV')
+    parser.add_argument('--vwsp_window', type=float, default=15, help='Volume Weighted Stock Price window in minutes')
+    parser.add_argument('--workers', type=int, default=1, help='Number of processes parsing the Stock Data and trade CSV files')
+    parser.add_argument('--trades', type=str, default=None, help='Path to a trade CSV or binary trade file loaded at startup')
+    parser.add_argument('--journal', type=str, default=None, help='Path to the trade journal, replayed at startup and appended with every recorded trade')
+    parser.add_argument('--journal_fsync', choices=[x.name.lower() for x in FsyncPolicy], default='batch', help='When the trade journal is flushed to disk')
+    parser.add_argument('--batch', type=str, default=None, help='Run the commands of a batch file (- for stdin) instead of the menu')
+    parser.add_argument('--output_format', choices=BATCH_OUTPUT_FORMATS, default='json', help='Format of the batch and replay results')
+    parser.add_argument('--serve', type=int, default=None, metavar='PORT', help='Serve the market over line-delimited JSON on a localhost port instead of the menu')
+    parser.add_argument('--retention', type=float, default=None, help='Minutes of trades kept in memory per stock, at least the VWSP window')
+    parser.add_argument('--max_trades', type=int, default=None, help='Number of trades kept in memory per stock at most')
+    parser.add_argument('--archive', type=str, default=None, help='Path to a trade journal receiving the trades evicted from memory')
+    parser.add_argument('--replay', type=str, default=None, help='Replay a binary trade file under a simulated clock instead of the menu, writing VWSP and GBCE samples')
+    parser.add_argument('--replay_interval', type=float, default=60, help='Seconds of simulated time between two replay samples')
+    parser.add_argument('--replay_speed', type=float, default=None, help='Replay speed as a multiple of real time, as fast as possible when omitted')
+    parser.add_argument('--positions', choices=['fifo', 'average'], default=None, help='Track the position and profit and loss of every stock, costing closed shares FIFO or at average cost')
+    parser.add_argument('--bars', type=str, default=None, help='Path to a CSV file receiving the 1s, 1m and 15m OHLCV bars of the session on exit')
+    parser.add_argument('--instrument', action='store_true', help='Time the pricing, loading and recording operations, printed on exit, on SIGUSR1 and from the menu')
+    parser.add_argument('--profile', type=str, default=None, metavar='OPERATION', help='Profile an instrumented operation from startup, such as Stock.calculate_volume_weighted_stock_price')
+    parser.add_argument('--profile_mode', choices=[x.value for x in ProfileMode], default='cprofile', help='Profile with cProfile or tracemalloc')
+    parser.add_argument('--profile_seconds', type=float, default=10, help='How long the operation is profiled for')
+    parser.add_argument('--snapshot', type=str, default=None, help='Path to a snapshot of the stocks and trades, restored at startup unless the Stock Data CSV file changed and written on exit')
     args = parser.parse_args()
     return args         
 
 if __name__ == "__main__":
     args = parse_arguments()
-    main(args.stock_csv_path, args.skip_csv_errors)
\ No newline at end of file
+    main(args.stock_csv_path, args.skip_csv_errors, args.vwsp_window, args.workers, args.trades, args.journal, FsyncPolicy[args.journal_fsync.capitalize()], args.batch, args.output_format, args.serve, args.retention, args.max_trades, args.archive, args.replay, args.replay_interval, args.replay_speed, args.bars, args.instrument, args.profile, ProfileMode(args.profile_mode), args.profile_seconds, args.snapshot, CostMethod[args.positions.capitalize()] if args.positions is not None else None)
\ No newline at end of file
@@ -0,0 +1,278 @@
+import threading
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Iterable, Iterator
+from models.stock import Stock
+from models.symbol_registry import SymbolRegistry
+from models.trade import TradeType
+from models.trade_store import TradeStore
+
+# 1 second, 1 minute and 15 minute bars
+DEFAULT_BAR_INTERVALS = (timedelta(seconds=1), timedelta(minutes=1), timedelta(minutes=15))
+
+@dataclass(frozen=True, slots=True)
+class Bar():
+    """
+    The open, high, low, close, volume and volume weighted average price of a symbol over one interval.
+    Attributes:
+    - symbol (str): The symbol of the stock.
+    - interval (timedelta): The length of the bar.
+    - start_ns (int): The start of the bar as epoch nanoseconds, a multiple of the interval.
+    - open (float): The price of the first trade.
+    - high (float): The highest price.
+    - low (float): The lowest price.
+    - close (float): The price of the last trade.
+    - volume (int): The quantity of shares traded.
+    - vwap (float): The volume weighted average price.
+    - trades (int): The number of trades.
+    """
+    symbol : str
+    interval : timedelta
+    start_ns : int
+    open : float
+    high : float
+    low : float
+    close : float
+    volume : int
+    vwap : float
+    trades : int
+
+class BarSeries():
+    """
+    Columnar bars of one symbol at one interval, ordered by start time.
+    Trades in time order update the last bar or append a new one in
+    constant time, older trades update or insert their bar found with a
+    binary search. The times of the first and last trade of every bar are
+    kept, so late trades do not move the open or the close. Besides the
+    starts, the integer and the float fields of a bar are interleaved in
+    one array each, so a new bar costs three appends instead of ten.
+    Attributes:
+    - interval_ns (int): The length of the bars in nanoseconds.
+    - starts (array[int]): Bar starts as epoch nanoseconds.
+    - counters (array[int]): Per bar the times of the first and last trade, the volume and the number of trades.
+    - prices (array[float]): Per bar the open, high, low, close and the sum of price * quantity.
+    """
+
+    def __init__(self, interval_ns : int):
+        self.interval_ns = interval_ns
+        self.starts = array('q')
+        self.counters = array('q')
+        self.prices = array('d')
+
+    def _update(self, index : int, timestamp_ns : int, price : float, quantity : int) -> None:
+        """
+        Add a trade to an existing bar.
+        """
+        counters, prices = self.counters, self.prices
+        at, pt = index * 4, index * 5
+        if price > prices[pt + 1]:
+            prices[pt + 1] = price
+        if price < prices[pt + 2]:
+            prices[pt + 2] = price
+        if timestamp_ns < counters[at]:
+            counters[at] = timestamp_ns
+            prices[pt] = price
+        if timestamp_ns >= counters[at + 1]:
+            counters[at + 1] = timestamp_ns
+            prices[pt + 3] = price
+        counters[at + 2] += quantity
+        counters[at + 3] += 1
+        prices[pt + 4] += price * quantity
+
+    def record(self, timestamp_ns : int, price : float, quantity : int) -> None:
+        """
+        Add a trade to its bar.
+        Args:
+        - timestamp_ns (int): The trade time as epoch nanoseconds.
+        - price (float): The price per share.
+        - quantity (int): The quantity of shares traded.
+        """
+        start_ns = timestamp_ns - timestamp_ns % self.interval_ns
+        starts = self.starts
+        if not starts or start_ns > starts[-1]:
+            starts.append(start_ns)
+            self.counters.extend((timestamp_ns, timestamp_ns, quantity, 1))
+            self.prices.extend((price, price, price, price, price * quantity))
+        elif start_ns == starts[-1]:
+            self._update(len(starts) - 1, timestamp_ns, price, quantity)
+        else:
+            index = bisect_left(starts, start_ns)
+            if starts[index] == start_ns:
+                self._update(index, timestamp_ns, price, quantity)
+            else:
+                starts.insert(index, start_ns)
+                self.counters[index * 4:index * 4] = array('q', (timestamp_ns, timestamp_ns, quantity, 1))
+                self.prices[index * 5:index * 5] = array('d', (price, price, price, price, price * quantity))
+
+    def indexes(self, start_ns : int|None = None, end_ns : int|None = None) -> range:
+        """
+        Get the indexes of the bars starting inside a time range.
+        Args:
+        - start_ns (int | None): Bars starting before this epoch nanoseconds time are excluded, None includes them.
+        - end_ns (int | None): Bars starting at or after this epoch nanoseconds time are excluded, None includes them.
+        Returns:
+        - range: The bar indexes, ordered by start time.
+        """
+        low = bisect_left(self.starts, start_ns) if start_ns is not None else 0
+        high = bisect_left(self.starts, end_ns, lo=low) if end_ns is not None else len(self.starts)
+        return range(low, max(low, high))
+
+    def row(self, index : int) -> tuple[int, float, float, float, float, int, float, int]:
+        """
+        Get the columns of a single bar.
+        Args:
+        - index (int): The bar index.
+        Returns:
+        - tuple[int, float, float, float, float, int, float, int]: The start, open, high, low, close, volume, volume weighted average price and number of trades of the bar.
+        """
+        _, _, volume, count = self.counters[index * 4:index * 4 + 4]
+        open, high, low, close, notional = self.prices[index * 5:index * 5 + 5]
+        return (self.starts[index], open, high, low, close, volume, notional / volume if volume else 0.0, count)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+class BarBuilder():
+    """
+    Builds OHLCV bars of every traded symbol at several intervals at once.
+    Every trade updates one bar per interval as it arrives, so bars are
+    never rebuilt by rescanning the recorded trades. Bars are kept in
+    columnar BarSeries and Bar objects are only built when queried.
+    Attributes:
+    - intervals (tuple[timedelta, ...]): The bar lengths, shortest first.
+    - _series (dict[str, tuple[str, list[BarSeries]]]): The symbol and the series per interval, by normalised symbol.
+    - _lock (threading.Lock): Guards the series, trades may arrive from several threads.
+    """
+
+    def __init__(self, intervals : Iterable[timedelta] = DEFAULT_BAR_INTERVALS):
+        self.intervals = tuple(sorted(set(intervals)))
+        if not self.intervals or any(interval < timedelta(microseconds=1) for interval in self.intervals):
+            raise ValueError('Invalid bar interval')
+        self._interval_ns = [interval // timedelta(microseconds=1) * 1000 for interval in self.intervals]
+        self._series : dict[str, tuple[str, list[BarSeries]]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, symbol : str, timestamp_ns : int, price : float, quantity : int) -> None:
+        """
+        Add a trade to the bars of its symbol.
+        Args:
+        - symbol (str): The symbol of the traded stock.
+        - timestamp_ns (int): The trade time as epoch nanoseconds.
+        - price (float): The price per share.
+        - quantity (int): The quantity of shares traded.
+        """
+        key = SymbolRegistry.normalize(symbol)
+        with self._lock:
+            entry = self._series.get(key)
+            if entry is None:
+                entry = self._series[key] = (symbol, [BarSeries(interval_ns) for interval_ns in self._interval_ns])
+            for series in entry[1]:
+                series.record(timestamp_ns, price, quantity)
+
+    def on_trade(self, stock : Stock, quantity : int, type : TradeType, price : float, timestamp_ns : int) -> None:
+        """
+        Trade store listener adding every recorded trade to the bars.
+        """
+        self.record(stock.symbol, timestamp_ns, price, quantity)
+
+    def attach(self, store : TradeStore) -> None:
+        """
+        Build the bars of the trades already in a trade store, then follow its new trades.
+        Trades recorded by other threads while attaching may be missed.
+        Args:
+        - store (TradeStore): The trade store.
+        """
+        symbols : dict[int, str] = {}
+        for timestamp, symbol_id, quantity, price, _ in store.iter_rows():
+            if (symbol := symbols.get(symbol_id)) is None:
+                symbol = symbols[symbol_id] = store.stock(symbol_id).symbol
+            self.record(symbol, timestamp, price, quantity)
+        store.add_listener(self.on_trade)
+
+    def detach(self, store : TradeStore) -> None:
+        """
+        Stop following the trades of a trade store.
+        Args:
+        - store (TradeStore): The trade store.
+        """
+        store.remove_listener(self.on_trade)
+
+    def _interval_index(self, interval : timedelta) -> int:
+        """
+        Get the position of a bar length.
+        Raises:
+        - ValueError: If the bars are not built at this interval.
+        """
+        try:
+            return self.intervals.index(interval)
+        except ValueError:
+            raise ValueError(f'Invalid bar interval {interval}') from None
+
+    def bars(self, symbol : str, interval : timedelta, start_ns : int|None = None, end_ns : int|None = None) -> list[Bar]:
+        """
+        Get the bars of a symbol starting inside a time range.
+        Args:
+        - symbol (str): The symbol of the stock, in any case.
+        - interval (timedelta): The bar length, one of the intervals.
+        - start_ns (int | None): Bars starting before this epoch nanoseconds time are excluded, None includes them.
+        - end_ns (int | None): Bars starting at or after this epoch nanoseconds time are excluded, None includes them.
+        Returns:
+        - list[Bar]: The bars ordered by start time, empty if the symbol has no trades.
+        Raises:
+        - ValueError: If the bars are not built at this interval.
+        """
+        position = self._interval_index(interval)
+        with self._lock:
+            entry = self._series.get(SymbolRegistry.normalize(symbol))
+            if entry is None:
+                return []
+            series = entry[1][position]
+            return [Bar(entry[0], interval, *series.row(index)) for index in series.indexes(start_ns, end_ns)]
+
+    def latest(self, symbol : str, interval : timedelta) -> Bar|None:
+        """
+        Get the most recent bar of a symbol.
+        Args:
+        - symbol (str): The symbol of the stock, in any case.
+        - interval (timedelta): The bar length, one of the intervals.
+        Returns:
+        - Bar | None: The bar with the latest start, None if the symbol has no trades.
+        """
+        position = self._interval_index(interval)
+        with self._lock:
+            entry = self._series.get(SymbolRegistry.normalize(symbol))
+            if entry is None:
+                return None
+            series = entry[1][position]
+            return Bar(entry[0], interval, *series.row(len(series) - 1))
+
+    def symbols(self) -> list[str]:
+        """
+        Get the symbols with bars.
+        Returns:
+        - list[str]: The symbols, in order of their first trade.
+        """
+        with self._lock:
+            return [symbol for symbol, _ in self._series.values()]
+
+    def iter_rows(self, intervals : Iterable[timedelta]|None = None) -> Iterator[tuple[str, timedelta, int, float, float, float, float, int, float, int]]:
+        """
+        Iterate over a snapshot of the bars, by symbol, interval and start time.
+        Args:
+        - intervals (Iterable[timedelta] | None): The bar lengths to include, None includes every interval.
+        Returns:
+        - Iterator[tuple[str, timedelta, int, float, float, float, float, int, float, int]]: The symbol, interval, start, open, high, low, close, volume, volume weighted average price and number of trades of every bar.
+        Raises:
+        - ValueError: If the bars are not built at one of the intervals.
+        """
+        positions = [self._interval_index(interval) for interval in intervals] if intervals is not None else range(len(self.intervals))
+        with self._lock:
+            rows = [(symbol, self.intervals[position], *series[position].row(index))
+                    for symbol, series in self._series.values() for position in positions for index in range(len(series[position]))]
+        return iter(rows)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(series) for _, entry in self._series.values() for series in entry)
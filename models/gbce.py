@@ -0,0 +1,119 @@
+import math
+from typing import Iterable
+
+class GbceIndex():
+    """
+    GBCE All Share Index calculated in log space.
+    The index is the geometric mean of the constituent prices. Summing the
+    logarithms of the prices instead of multiplying them avoids overflow and
+    underflow with many constituents, and lets a single price change update
+    the index in constant time.
+    Attributes:
+    - _prices (dict[str, float]): The current price of every constituent.
+    - _log_sum (float): The sum of the logarithms of the positive prices.
+    - _zero_count (int): The number of constituents priced at zero.
+    """
+
+    # Number of incremental updates after which the log sum is recomputed
+    # to bound the rounding error of the running sum.
+    RESUM_INTERVAL = 100_000
+
+    def __init__(self, prices : dict[str, float]|None = None):
+        self._prices : dict[str, float] = {}
+        self._log_sum = 0.0
+        self._zero_count = 0
+        self._updates = 0
+        for symbol, price in (prices or {}).items():
+            self.update(symbol, price)
+
+    @staticmethod
+    def _log(price : float) -> float:
+        """
+        Get the logarithm of a positive price.
+        Raises:
+        - ValueError: If the price is negative.
+        """
+        if price < 0:
+            raise ValueError('Invalid price')
+        return math.log(price) if price > 0 else 0.0
+
+    def update(self, symbol : str, price : float) -> None:
+        """
+        Set the price of a constituent, adding it if it is new.
+        Args:
+        - symbol (str): The symbol of the constituent.
+        - price (float): The new price.
+        Raises:
+        - ValueError: If the price is negative.
+        """
+        log_price = self._log(price)
+        previous = self._prices.get(symbol)
+        if previous is not None:
+            self._log_sum -= self._log(previous)
+            self._zero_count -= previous == 0
+        self._prices[symbol] = price
+        self._log_sum += log_price
+        self._zero_count += price == 0
+        self._updates += 1
+        if self._updates >= self.RESUM_INTERVAL:
+            self.recompute()
+
+    def remove(self, symbol : str) -> None:
+        """
+        Remove a constituent from the index.
+        Args:
+        - symbol (str): The symbol of the constituent.
+        """
+        price = self._prices.pop(symbol, None)
+        if price is not None:
+            self._log_sum -= self._log(price)
+            self._zero_count -= price == 0
+
+    def recompute(self) -> None:
+        """
+        Recompute the log sum from the current prices.
+        """
+        self._log_sum = math.fsum(self._log(price) for price in self._prices.values())
+        self._updates = 0
+
+    @property
+    def value(self) -> float:
+        """
+        The current value of the index, 0 without constituents or when a constituent is priced at zero.
+        """
+        if not self._prices or self._zero_count:
+            return 0
+        return math.exp(self._log_sum / len(self._prices))
+
+    def __len__(self) -> int:
+        return len(self._prices)
+
+    @staticmethod
+    def from_prices(prices : Iterable[float]) -> float:
+        """
+        Calculate the index over a stream of prices.
+        The prices are consumed one at a time, so they do not need to be held in memory.
+        Args:
+        - prices (Iterable[float]): The constituent prices.
+        Returns:
+        - float: The geometric mean of the prices, 0 if there are none or one of them is zero.
+        Raises:
+        - ValueError: If a price is negative.
+        """
+        count = 0
+        has_zero = False
+        log_prices = []
+        partial = 0.0
+        for price in prices:
+            if price == 0:
+                has_zero = True
+            else:
+                log_prices.append(GbceIndex._log(price))
+                # Fold the partial sums regularly to keep memory bounded
+                if len(log_prices) == 4096:
+                    partial = math.fsum(log_prices + [partial])
+                    log_prices.clear()
+            count += 1
+        if not count or has_zero:
+            return 0
+        return math.exp(math.fsum(log_prices + [partial]) / count)
@@ -0,0 +1,120 @@
+from models.stock import Stock
+from models.trade import Trade, TradeType
+from models.trade_store import TradeStore
+from models.symbol_registry import SymbolRegistry
+from utils.clock import Clock, SYSTEM_CLOCK
+
+class Market():
+    """
+    The loaded stock universe together with its recorded trades.
+    Operations address stocks by symbol, so they can be driven by commands
+    instead of the interactive menus.
+    Attributes:
+    - stocks (SymbolRegistry): The loaded stocks.
+    - trades (TradeStore): The recorded trades.
+    - clock (Clock): Dates trades recorded without a timestamp, the clock of the trade store.
+    """
+
+    def __init__(self, stocks : SymbolRegistry|list[Stock], trades : TradeStore|None = None, clock : Clock = SYSTEM_CLOCK):
+        self.stocks = stocks if isinstance(stocks, SymbolRegistry) else SymbolRegistry(stocks)
+        self.trades = trades if trades is not None else TradeStore(registry=self.stocks, clock=clock)
+
+    @property
+    def clock(self) -> Clock:
+        """
+        The clock dating trades recorded without a timestamp.
+        """
+        return self.trades.clock
+
+    def find_stock(self, symbol : str) -> Stock|None:
+        """
+        Find a stock by its ticker symbol, ignoring case.
+        Args:
+        - symbol (str): The ticker symbol to search for.
+        Returns:
+        - Stock | None: The found stock if exists, None otherwise.
+        """
+        return self.stocks.get(symbol)
+
+    def _get_stock(self, symbol : str) -> Stock:
+        """
+        Get a stock by its ticker symbol.
+        Raises:
+        - ValueError: If there is no stock with this symbol.
+        """
+        stock = self.find_stock(symbol)
+        if stock is None:
+            raise ValueError(f'Invalid ticker {symbol}')
+        return stock
+
+    def dividend_yield(self, symbol : str, price : float) -> float:
+        """
+        Calculate the dividend yield of a stock.
+        Args:
+        - symbol (str): The ticker symbol of the stock.
+        - price (float): The current price of the stock.
+        Returns:
+        - float: The calculated dividend yield.
+        """
+        return self._get_stock(symbol).calculate_dividend_yield(price)
+
+    def pe_ratio(self, symbol : str, price : float) -> float:
+        """
+        Calculate the P/E ratio of a stock.
+        Args:
+        - symbol (str): The ticker symbol of the stock.
+        - price (float): The current price of the stock.
+        Returns:
+        - float: The calculated P/E ratio.
+        """
+        return self._get_stock(symbol).calculate_pe_ratio(price)
+
+    def record_trade(self, symbol : str, quantity : int, type : TradeType, price : float, timestamp_ns : int|None = None) -> int:
+        """
+        Validate and record a trade, without building a Trade object.
+        Args:
+        - symbol (str): The ticker symbol of the stock.
+        - quantity (int): The quantity of shares traded.
+        - type (TradeType): The type of the trade (Buy or Sell).
+        - price (float): The price per share.
+        - timestamp_ns (int | None): The trade time as epoch nanoseconds, defaults to the current time of the clock.
+        Returns:
+        - int: The trade time as epoch nanoseconds.
+        Raises:
+        - ValueError: If the trade is invalid.
+        """
+        stock = self._get_stock(symbol)
+        Trade.validate(stock, quantity, price)
+        now_ns = self.clock.now_ns()
+        if timestamp_ns is None:
+            timestamp_ns = now_ns
+        elif timestamp_ns > now_ns:
+            raise ValueError('Invalid Trade date')
+        self.trades.record(stock, quantity, type, price, timestamp_ns)
+        return timestamp_ns
+
+    def vwsp(self, symbol : str) -> float:
+        """
+        Calculate the volume weighted stock price of a stock.
+        Args:
+        - symbol (str): The ticker symbol of the stock.
+        Returns:
+        - float: The calculated volume weighted stock price.
+        """
+        return self._get_stock(symbol).calculate_volume_weighted_stock_price(self.trades)
+
+    def gbce_index(self, prices : list[float]) -> float:
+        """
+        Calculate the GBCE All Share Index.
+        Args:
+        - prices (list[float]): The price of every loaded stock, in load order.
+        Returns:
+        - float: The calculated GBCE All Share Index.
+        Raises:
+        - ValueError: If there is not exactly one positive price per stock.
+        """
+        if len(prices) != len(self.stocks):
+            raise ValueError(f'Expected {len(self.stocks)} prices, got {len(prices)}')
+        if any(price <= 0 for price in prices):
+            raise ValueError('Invalid price')
+        return Stock.calculate_gbce_index(prices)
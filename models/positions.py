@@ -0,0 +1,246 @@
+import threading
+from array import array
+from collections import deque
+from dataclasses import dataclass
+from enum import Enum
+from itertools import repeat
+from math import fsum
+from operator import mul
+from typing import Mapping, Sequence
+from models.stock import Stock
+from models.symbol_registry import SymbolRegistry
+from models.trade import TradeType
+from models.trade_store import TradeStore
+
+class CostMethod(Enum):
+    Fifo = 1
+    Average = 2
+
+@dataclass(frozen=True, slots=True)
+class Position():
+    """
+    The net position of a symbol and its profit and loss.
+    Attributes:
+    - symbol (str): The symbol of the stock.
+    - quantity (int): The net quantity of shares, negative for a short position.
+    - average_cost (float): The cost per share of the open quantity, 0 when flat.
+    - realized (float): The profit and loss of the closed quantity.
+    - unrealized (float): The profit and loss of the open quantity at the mark price.
+    - price (float): The mark price, the last trade price unless revalued since.
+    """
+    symbol : str
+    quantity : int
+    average_cost : float
+    realized : float
+    unrealized : float
+    price : float
+
+class PositionBook():
+    """
+    Net quantity, cost and profit and loss of every traded symbol, updated on every trade.
+    Buys add to a position and sells take from it, a trade larger than the
+    open position closes it and opens one on the other side. Closed shares
+    are matched against the oldest open lots (FIFO) or priced at the
+    average cost of the position. Every trade costs constant time, FIFO
+    aside from the lots it closes, and the book is kept as columns indexed
+    by symbol id, so totals and revaluations are O(symbols) and never
+    rescan the trades.
+    Attributes:
+    - registry (SymbolRegistry): Gives the symbol ids the columns are indexed by.
+    - method (CostMethod): How closed shares are costed.
+    - _quantities (array[int]): The net quantity of every symbol.
+    - _costs (array[float]): The signed cost of the open quantity of every symbol.
+    - _realized (array[float]): The realized profit and loss of every symbol.
+    - _prices (array[float]): The mark price of every symbol.
+    - _traded (array[int]): 1 for the symbols with trades, 0 otherwise.
+    - _lots (dict[int, deque[list]]): The open lots, signed quantity and price, of every symbol, FIFO only.
+    - _lock (threading.Lock): Guards the columns, trades may arrive from several threads.
+    """
+
+    def __init__(self, registry : SymbolRegistry|None = None, method : CostMethod = CostMethod.Fifo):
+        self.registry = registry if registry is not None else SymbolRegistry()
+        self.method = method
+        self._quantities = array('q')
+        self._costs = array('d')
+        self._realized = array('d')
+        self._prices = array('d')
+        self._traded = array('B')
+        self._lots : dict[int, deque[list]] = {}
+        self._lock = threading.Lock()
+
+    def _grow(self, size : int) -> None:
+        """
+        Extend the columns to hold a number of symbols.
+        """
+        missing = size - len(self._quantities)
+        if missing > 0:
+            self._quantities.extend(repeat(0, missing))
+            self._costs.extend(repeat(0.0, missing))
+            self._realized.extend(repeat(0.0, missing))
+            self._prices.extend(repeat(0.0, missing))
+            self._traded.extend(repeat(0, missing))
+
+    def _close_lots(self, symbol_id : int, closed : int) -> float:
+        """
+        Take shares from the oldest open lots of a symbol.
+        Args:
+        - symbol_id (int): The symbol id.
+        - closed (int): The signed quantity closed, of the sign of the position.
+        Returns:
+        - float: The signed cost of the closed shares.
+        """
+        lots = self._lots[symbol_id]
+        cost = 0.0
+        while closed:
+            lot = lots[0]
+            taken = lot[0] if abs(lot[0]) <= abs(closed) else closed
+            cost += taken * lot[1]
+            lot[0] -= taken
+            closed -= taken
+            if not lot[0]:
+                lots.popleft()
+        return cost
+
+    def record(self, stock : Stock, quantity : int, type : TradeType, price : float) -> None:
+        """
+        Apply a trade to the position of its symbol.
+        Args:
+        - stock (Stock): The stock involved in the trade.
+        - quantity (int): The quantity of shares traded.
+        - type (TradeType): The type of the trade, Buy adds to the position and Sell takes from it.
+        - price (float): The price per share.
+        """
+        symbol_id = self.registry.id_of(stock.symbol)
+        if symbol_id is None:
+            symbol_id = self.registry.add(stock)
+        quantity = quantity if type == TradeType.Buy else -quantity
+        with self._lock:
+            self._grow(symbol_id + 1)
+            self._traded[symbol_id] = 1
+            position = self._quantities[symbol_id]
+            opened = quantity
+            if position and (position > 0) != (quantity > 0):
+                # The signed quantity taken from the position, of the sign of the position
+                closed = -quantity if abs(quantity) <= abs(position) else position
+                if self.method == CostMethod.Fifo:
+                    cost = self._close_lots(symbol_id, closed)
+                else:
+                    cost = self._costs[symbol_id] / position * closed
+                self._realized[symbol_id] += price * closed - cost
+                position -= closed
+                # Reset instead of trusting the subtractions to land on zero
+                self._costs[symbol_id] = self._costs[symbol_id] - cost if position else 0.0
+                opened += closed
+            if opened:
+                position += opened
+                self._costs[symbol_id] += opened * price
+                if self.method == CostMethod.Fifo:
+                    self._lots.setdefault(symbol_id, deque()).append([opened, price])
+            self._quantities[symbol_id] = position
+            self._prices[symbol_id] = price
+
+    def on_trade(self, stock : Stock, quantity : int, type : TradeType, price : float, timestamp_ns : int) -> None:
+        """
+        Trade store listener applying every recorded trade to the book.
+        """
+        self.record(stock, quantity, type, price)
+
+    def attach(self, store : TradeStore) -> None:
+        """
+        Apply the trades already in a trade store in time order, then follow its new trades.
+        Trades recorded by other threads while attaching may be missed.
+        Args:
+        - store (TradeStore): The trade store.
+        """
+        stocks : dict[int, Stock] = {}
+        trade_types = {trade_type.value: trade_type for trade_type in TradeType}
+        for _, symbol_id, quantity, price, side in store.iter_rows():
+            if (stock := stocks.get(symbol_id)) is None:
+                stock = stocks[symbol_id] = store.stock(symbol_id)
+            self.record(stock, quantity, trade_types[side], price)
+        store.add_listener(self.on_trade)
+
+    def detach(self, store : TradeStore) -> None:
+        """
+        Stop following the trades of a trade store.
+        Args:
+        - store (TradeStore): The trade store.
+        """
+        store.remove_listener(self.on_trade)
+
+    def _position(self, symbol_id : int) -> Position:
+        """
+        Build the position of a symbol id from the columns.
+        """
+        quantity = self._quantities[symbol_id]
+        cost = self._costs[symbol_id]
+        price = self._prices[symbol_id]
+        return Position(self.registry.stock(symbol_id).symbol, quantity, cost / quantity if quantity else 0.0,
+                        self._realized[symbol_id], quantity * price - cost, price)
+
+    def position(self, symbol : str) -> Position|None:
+        """
+        Get the position of a symbol.
+        Args:
+        - symbol (str): The symbol of the stock, in any case.
+        Returns:
+        - Position | None: The position, None if the symbol has no trades.
+        """
+        symbol_id = self.registry.id_of(symbol)
+        with self._lock:
+            if symbol_id is None or symbol_id >= len(self._traded) or not self._traded[symbol_id]:
+                return None
+            return self._position(symbol_id)
+
+    def positions(self, open_only : bool = False) -> list[Position]:
+        """
+        Get the position of every traded symbol.
+        Args:
+        - open_only (bool): If True, leave out the flat positions.
+        Returns:
+        - list[Position]: The positions, in symbol id order.
+        """
+        with self._lock:
+            flags = self._traded if not open_only else [traded and quantity != 0 for traded, quantity in zip(self._traded, self._quantities)]
+            return [self._position(symbol_id) for symbol_id, traded in enumerate(flags) if traded]
+
+    def totals(self) -> tuple[float, float]:
+        """
+        Get the profit and loss of the whole book.
+        Returns:
+        - tuple[float, float]: The realized and the unrealized profit and loss.
+        """
+        with self._lock:
+            return fsum(self._realized), fsum(map(mul, self._quantities, self._prices)) - fsum(self._costs)
+
+    def revalue(self, prices : Sequence[float]|Mapping[str, float]) -> float:
+        """
+        Mark the positions to new prices in bulk.
+        Args:
+        - prices (Sequence[float] | Mapping[str, float]): The price of every symbol indexed by symbol id, or the prices of some symbols by symbol.
+        Returns:
+        - float: The unrealized profit and loss of the book at the new prices.
+        Raises:
+        - ValueError: If a price vector is longer than the registry, or a symbol is unknown.
+        """
+        if isinstance(prices, Mapping):
+            updates = []
+            for symbol, price in prices.items():
+                if (symbol_id := self.registry.id_of(symbol)) is None:
+                    raise ValueError(f'Unknown symbol {symbol}')
+                updates.append((symbol_id, price))
+            with self._lock:
+                self._grow(max((symbol_id + 1 for symbol_id, _ in updates), default=0))
+                for symbol_id, price in updates:
+                    self._prices[symbol_id] = price
+        else:
+            if len(prices) > len(self.registry):
+                raise ValueError(f'Expected at most {len(self.registry)} prices, got {len(prices)}')
+            with self._lock:
+                self._grow(len(prices))
+                self._prices[:len(prices)] = array('d', prices)
+        return self.totals()[1]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(self._traded)
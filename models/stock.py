@@ -1,58 +1,55 @@
 from enum import Enum
 from dataclasses import dataclass,field
 from datetime import datetime,timedelta
-import math
+from typing import Iterable
+from models.gbce import GbceIndex
+
+# Frozen instances are built and cached into through object, bypassing the
+# assignment guard of the dataclass.
+_new = object.__new__
+_set_attribute = object.__setattr__
 
 class StockType(Enum):
     Common = 1
     Preferred = 2
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Stock():
     """
     Represents a stock with its attributes and methods.
+    Stocks are immutable and slotted. Changed reference data is applied by
+    replacing the stock, for example with dataclasses.replace, which
+    validates the new values.
     Attributes:
     - symbol (str): The symbol or identifier of the stock.
     - last_dividend (float): The last dividend value of the stock.
     - fixed_dividend (float | None): The fixed dividend value for preferred stock, None for common stock.
     - par_value (float): The par value of the stock.
     - type (StockType): The type of the stock (Common or Preferred).
+    - yield_numerator (float): Last dividend for common stock, fixed dividend * par value for preferred stock.
+    - pe_denominator (float): The last dividend if positive, 0 otherwise.
+    The derived attributes are computed once on construction and the
+    rendered representation on first use.
     """
     symbol: str
     last_dividend: float
     fixed_dividend: float
     par_value: float
     type: StockType = field(default=StockType.Common)
-
-    def _calculate_common_dividend_yield(self,price:float) -> float:
-        """
-        Calculate the common dividend yield for the stock.
-        Args:
-        - price (float): The current price of the stock.
-        Returns:
-        - float: The calculated common dividend yield.
-        """
-        return ( self.last_dividend/price ) if price > 0 else 0
-
-    def _calucalte_preferred_dividend_yield(self,price:float) -> float:
-        """
-        Calculate the preferred dividend yield for the stock.
-        Args:
-        - price (float): The current price of the stock.
-        Returns:
-        - float: The calculated preferred dividend yield.
-        """
-        return ( (self.fixed_dividend * self.par_value) / price ) if price > 0 else 0
+    yield_numerator: float = field(init=False, repr=False, compare=False)
+    pe_denominator: float = field(init=False, repr=False, compare=False)
+    _repr: str|None = field(init=False, repr=False, compare=False, default=None)
 
     def calculate_dividend_yield(self,price:float) -> float:
         """
         Calculate the dividend yield based on the stock type.
+        The numerator of the stock type is precomputed, so no dispatch happens per call.
         Args:
         - price (float): The current price of the stock.
         Returns:
         - float: The calculated dividend yield.
         """
-        return self._calculate_common_dividend_yield(price) if self.type == StockType.Common else self._calucalte_preferred_dividend_yield(price)
+        return self.yield_numerator / price if price > 0 else 0
 
     def calculate_pe_ratio(self,price:float) -> float:
         """
@@ -62,31 +59,34 @@ class Stock():
         Returns:
         - float: The calculated P/E ratio.
         """
-        return price / self.last_dividend if self.last_dividend > 0 else 0
+        return price / self.pe_denominator if self.pe_denominator else 0
 
-    def calculate_volume_weighted_stock_price(self, trades : list['Trade']) -> float:
+    def calculate_volume_weighted_stock_price(self, trades : 'TradeStore|list[Trade]', window : timedelta = timedelta(minutes=15)) -> float:
         """
         Calculate the volume-weighted stock price.
         Args:
-        - trades (list[Trade]): List of trades for a specific stock.
+        - trades (TradeStore | list[Trade]): The trade store, or a list of trades for a specific stock.
+        - window (timedelta): How far back trades are included. A trade store uses its own window.
         Returns:
         - float: The calculated volume-weighted stock price.
         """
-        stock_trades = [x for x in trades if x.stock is self and x.date > (datetime.now() - timedelta(minutes=15))]
+        if not isinstance(trades, list):
+            return trades.vwsp(self.symbol)
+        stock_trades = [x for x in trades if x.stock is self and x.date > (datetime.now() - window)]
         numerator = sum(trade.price * trade.quantity for trade in stock_trades)
         denominator = sum(trade.quantity for trade in stock_trades)
         return numerator / denominator if denominator != 0 else 0
 
     @staticmethod
-    def calculate_gbce_index(prices:list[float]) -> float:
+    def calculate_gbce_index(prices:Iterable[float]) -> float:
         """
         Calculate the GBCE All Share Index.
         Args:
-        - prices (list[float]): List of prices for different stocks.
+        - prices (Iterable[float]): Prices for different stocks.
         Returns:
         - float: The calculated GBCE All Share Index.
         """
-        return math.prod(prices) ** (1 / len(prices)) if prices else 0
+        return GbceIndex.from_prices(prices)
     
     def print_stock_list(stocks : list['Stock']) -> None:
         """
@@ -122,9 +122,53 @@ class Stock():
         if self.par_value is None or self.par_value < 0:
             raise ValueError(f'Invalid par value')
 
+        self._derive()
+
+    def _derive(self) -> None:
+        """
+        Compute the derived pricing attributes.
+        """
+        _set_attribute(self, 'yield_numerator', self.fixed_dividend * self.par_value if self.type == StockType.Preferred else self.last_dividend)
+        _set_attribute(self, 'pe_denominator', self.last_dividend if self.last_dividend > 0 else 0)
+
+    @classmethod
+    def trusted(cls, symbol : str, last_dividend : float, fixed_dividend : float, par_value : float, type : StockType = StockType.Common) -> 'Stock':
+        """
+        Build a stock from already validated data, skipping validation.
+        Meant for data from a trusted source such as a file written by this application, never for user input.
+        Args:
+        - symbol (str): The symbol or identifier of the stock.
+        - last_dividend (float): The last dividend value of the stock.
+        - fixed_dividend (float): The fixed dividend value for preferred stock.
+        - par_value (float): The par value of the stock.
+        - type (StockType): The type of the stock (Common or Preferred).
+        Returns:
+        - Stock: The stock.
+        """
+        stock = _new(cls)
+        _set_attribute(stock, 'symbol', symbol)
+        _set_attribute(stock, 'last_dividend', last_dividend)
+        _set_attribute(stock, 'fixed_dividend', fixed_dividend)
+        _set_attribute(stock, 'par_value', par_value)
+        _set_attribute(stock, 'type', type)
+        _set_attribute(stock, 'yield_numerator', fixed_dividend * par_value if type is StockType.Preferred else last_dividend)
+        _set_attribute(stock, 'pe_denominator', last_dividend if last_dividend > 0 else 0)
+        _set_attribute(stock, '_repr', None)
+        return stock
+
     def __repr__(self):
         """
-        Return a string representation of the stock.
+        Return a string representation of the stock, rendered once and cached.
+        Returns:
+        - str: A string representation of the stock.
+        """
+        if self._repr is None:
+            _set_attribute(self, '_repr', self._render())
+        return self._repr
+
+    def _render(self) -> str:
+        """
+        Render the string representation of the stock.
         Returns:
         - str: A string representation of the stock.
         """
@@ -134,4 +178,4 @@ class Stock():
             Dividend:{self.last_dividend} 
             Fixed Dividend:{self.fixed_dividend if self.type==StockType.Preferred else 'NaN'}
             Par Value:{self.par_value}
-        """
\ No newline at end of file
+        """
@@ -0,0 +1,113 @@
+from typing import Iterable, Iterator
+from models.stock import Stock
+
+class SymbolRegistry():
+    """
+    Registry of the loaded stocks keyed by normalised symbol.
+    Every stock gets a dense integer id in registration order, which array
+    backed storage such as the trade log uses in place of stock references.
+    Lookups are a single hash of the normalised symbol.
+    Attributes:
+    - _stocks (list[Stock]): The registered stocks, indexed by symbol id.
+    - _ids (dict[str, int]): Symbol ids by normalised symbol.
+    """
+
+    def __init__(self, stocks : Iterable[Stock] = ()):
+        self._stocks : list[Stock] = []
+        self._ids : dict[str, int] = {}
+        for stock in stocks:
+            self.add(stock)
+
+    @staticmethod
+    def normalize(symbol : str) -> str:
+        """
+        Normalise a symbol for case-insensitive lookups.
+        Args:
+        - symbol (str): The symbol.
+        Returns:
+        - str: The normalised symbol.
+        """
+        return symbol.lower()
+
+    def add(self, stock : Stock) -> int:
+        """
+        Register a stock.
+        Args:
+        - stock (Stock): The stock to register.
+        Returns:
+        - int: The symbol id assigned to the stock.
+        Raises:
+        - ValueError: If a stock with the same symbol is already registered.
+        """
+        key = self.normalize(stock.symbol)
+        if key in self._ids:
+            raise ValueError(f'Duplicate symbol {stock.symbol}')
+        symbol_id = len(self._stocks)
+        self._ids[key] = symbol_id
+        self._stocks.append(stock)
+        return symbol_id
+
+    def replace(self, stock : Stock) -> int:
+        """
+        Replace a registered stock with a new version of it, keeping its symbol id.
+        Trades refer to stocks by symbol id, so they resolve to the new version.
+        Args:
+        - stock (Stock): The new version of the stock.
+        Returns:
+        - int: The symbol id of the stock.
+        Raises:
+        - ValueError: If no stock with the same symbol is registered.
+        """
+        symbol_id = self._ids.get(self.normalize(stock.symbol))
+        if symbol_id is None:
+            raise ValueError(f'Unknown symbol {stock.symbol}')
+        self._stocks[symbol_id] = stock
+        return symbol_id
+
+    def id_of(self, symbol : str) -> int|None:
+        """
+        Get the id of a symbol.
+        Args:
+        - symbol (str): The symbol, in any case.
+        Returns:
+        - int | None: The symbol id if registered, None otherwise.
+        """
+        return self._ids.get(self.normalize(symbol))
+
+    def get(self, symbol : str) -> Stock|None:
+        """
+        Find a stock by its symbol.
+        Args:
+        - symbol (str): The symbol, in any case.
+        Returns:
+        - Stock | None: The registered stock if exists, None otherwise.
+        """
+        symbol_id = self._ids.get(self.normalize(symbol))
+        return self._stocks[symbol_id] if symbol_id is not None else None
+
+    def stock(self, symbol_id : int) -> Stock:
+        """
+        Get the stock of a symbol id.
+        Args:
+        - symbol_id (int): The symbol id.
+        Returns:
+        - Stock: The registered stock.
+        """
+        return self._stocks[symbol_id]
+
+    def symbols(self) -> list[str]:
+        """
+        Get the registered symbols.
+        Returns:
+        - list[str]: The symbols, indexed by symbol id.
+        """
+        return [stock.symbol for stock in self._stocks]
+
+    def __contains__(self, symbol : str) -> bool:
+        return self.normalize(symbol) in self._ids
+
+    def __len__(self) -> int:
+        return len(self._stocks)
+
+    def __iter__(self) -> Iterator[Stock]:
+        return iter(self._stocks)
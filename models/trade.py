@@ -1,53 +1,99 @@
 from enum import Enum
-from dataclasses import dataclass, field
+from dataclasses import dataclass
 from datetime import datetime
+from typing import Iterable
 from models.stock import Stock
 
 class TradeType(Enum):
     Buy = 1
     Sell = 2
 
-@dataclass
+# Frozen instances are built through object, bypassing the assignment guard
+# of the dataclass.
+_new = object.__new__
+_set_attribute = object.__setattr__
+
+@dataclass(frozen=True, slots=True)
 class Trade():
     """
     Represents a trade with its attributes and methods.
+    Trades are immutable and slotted.
     Attributes:
     - stock (Stock): The stock involved in the trade.
     - quantity (int): The quantity of shares traded.
     - type (TradeType): The type of the trade (Buy or Sell).
     - price (float): The price per share.
-    - date (datetime): The date and time of the trade.
+    - date (datetime): The date and time of the trade, defaults to now.
     """
     stock: Stock
     quantity: int
     type: TradeType
     price: float
-    date: datetime = field(default_factory=datetime.now)
+    date: datetime|None = None
+
+    @classmethod
+    def trusted(cls, stock : Stock, quantity : int, type : TradeType, price : float, date : datetime) -> 'Trade':
+        """
+        Build a trade from already validated data, skipping validation.
+        Meant for trades read back from the trade store, a trade file or the journal, never for user input.
+        Args:
+        - stock (Stock): The stock involved in the trade.
+        - quantity (int): The quantity of shares traded.
+        - type (TradeType): The type of the trade (Buy or Sell).
+        - price (float): The price per share.
+        - date (datetime): The date and time of the trade.
+        Returns:
+        - Trade: The trade.
+        """
+        trade = _new(cls)
+        _set_attribute(trade, 'stock', stock)
+        _set_attribute(trade, 'quantity', quantity)
+        _set_attribute(trade, 'type', type)
+        _set_attribute(trade, 'price', price)
+        _set_attribute(trade, 'date', date)
+        return trade
 
     @staticmethod
-    def print_trade_list(trades : list['Trade']) -> None:
+    def print_trade_list(trades : Iterable['Trade']) -> None:
         """
         Print information about all trades.
+        Trades are consumed one at a time, so a trade store can build them on demand.
         """
-        if not len(trades):
-            print('No trade data available') 
-        else:
-            for index,trade in enumerate(trades):
-                print(f"{index + 1}.{repr(trade)}")
+        index = 0
+        for index,trade in enumerate(trades, start=1):
+            print(f"{index}.{repr(trade)}")
+        if not index:
+            print('No trade data available')
 
-    def __post_init__(self):
+    @staticmethod
+    def validate(stock : Stock, quantity : int, price : float) -> None:
         """
-        Validate trade attributes after initialization.
+        Validate the attributes of a trade other than its date.
+        Args:
+        - stock (Stock): The stock involved in the trade.
+        - quantity (int): The quantity of shares traded.
+        - price (float): The price per share.
         Raises:
         - ValueError: If any attribute is invalid.
         """
-        if self.stock is None:
+        if stock is None:
             raise ValueError("Invalid Trade stock")
-        if self.quantity < 1:
+        if quantity < 1:
             raise ValueError("Invalid Trade quantity")
-        if self.price <= 0:
+        if price <= 0:
             raise ValueError("Invalid Trade price")
-        if self.date > datetime.now():
+
+    def __post_init__(self):
+        """
+        Validate trade attributes after initialization, dating the trade now if it has no date.
+        Raises:
+        - ValueError: If any attribute is invalid.
+        """
+        Trade.validate(self.stock, self.quantity, self.price)
+        now = datetime.now()
+        if self.date is None:
+            _set_attribute(self, 'date', now)
+        elif self.date > now:
             raise ValueError("Invalid Trade date")
     
     def __repr__(self):
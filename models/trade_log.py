@@ -0,0 +1,80 @@
+from array import array
+from typing import Iterable
+
+class TradeLog():
+    """
+    Columnar, append-only log of recorded trades.
+    Every trade is a row spread over typed arrays, so a trade costs a few
+    bytes per column instead of a full Trade instance.
+    Attributes:
+    - timestamps (array[int]): Trade times as epoch nanoseconds.
+    - symbol_ids (array[int]): Ids of the traded symbols.
+    - quantities (array[int]): Quantities of shares traded.
+    - prices (array[float]): Prices per share.
+    - sides (array[int]): Trade sides, the values of TradeType.
+    """
+
+    def __init__(self):
+        self.timestamps = array('q')
+        self.symbol_ids = array('I')
+        self.quantities = array('q')
+        self.prices = array('d')
+        self.sides = array('B')
+
+    def append(self, timestamp_ns : int, symbol_id : int, quantity : int, price : float, side : int) -> int:
+        """
+        Append a trade to the log.
+        Args:
+        - timestamp_ns (int): The trade time as epoch nanoseconds.
+        - symbol_id (int): The id of the traded symbol.
+        - quantity (int): The quantity of shares traded.
+        - price (float): The price per share.
+        - side (int): The trade side, the value of a TradeType.
+        Returns:
+        - int: The row index of the appended trade.
+        """
+        self.timestamps.append(timestamp_ns)
+        self.symbol_ids.append(symbol_id)
+        self.quantities.append(quantity)
+        self.prices.append(price)
+        self.sides.append(side)
+        return len(self.timestamps) - 1
+
+    def row(self, index : int) -> tuple[int, int, int, float, int]:
+        """
+        Get the columns of a single row.
+        Args:
+        - index (int): The row index.
+        Returns:
+        - tuple[int, int, int, float, int]: The timestamp, symbol id, quantity, price and side of the row.
+        """
+        return (self.timestamps[index], self.symbol_ids[index], self.quantities[index], self.prices[index], self.sides[index])
+
+    def totals(self, rows : Iterable[int]) -> tuple[float, int]:
+        """
+        Sum price * quantity and quantity over a set of rows.
+        Args:
+        - rows (Iterable[int]): The row indexes to aggregate.
+        Returns:
+        - tuple[float, int]: The total notional and the total quantity.
+        """
+        quantities = self.quantities
+        prices = self.prices
+        notional = 0.0
+        volume = 0
+        for index in rows:
+            quantity = quantities[index]
+            notional += prices[index] * quantity
+            volume += quantity
+        return notional, volume
+
+    def nbytes(self) -> int:
+        """
+        Get the memory used by the column buffers.
+        Returns:
+        - int: The size of the columns in bytes.
+        """
+        return sum(column.itemsize * len(column) for column in (self.timestamps, self.symbol_ids, self.quantities, self.prices, self.sides))
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
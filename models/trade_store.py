@@ -0,0 +1,543 @@
+import heapq
+import threading
+from array import array
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, Iterator
+from models.stock import Stock
+from models.trade import Trade, TradeType
+from models.trade_log import TradeLog
+from models.symbol_registry import SymbolRegistry
+from utils.convert import datetime_to_ns, ns_to_datetime
+from utils.clock import Clock, SYSTEM_CLOCK
+
+class SymbolTrades():
+    """
+    The recorded trades of a single symbol, guarded by their own lock.
+    Evicted trades are skipped by advancing a head index over the time
+    ordered rows. The log is compacted once the evicted rows make up half
+    of it, so eviction costs amortised constant time per trade. The volume
+    weighted stock price runs over the same columns: running sums of the
+    trades inside the window are kept with a second index, moved forward
+    over the rows as trades leave the window.
+    Attributes:
+    - symbol_id (int): The id of the symbol.
+    - lock (threading.Lock): Guards the other attributes.
+    - log (TradeLog): The columns of the trades, in recording order.
+    - rows (array[int]): The log rows ordered by trade time.
+    - head (int): The number of evicted rows at the start of rows.
+    - window_head (int): The number of rows at the start of rows outside the window, at least head.
+    - notional (float): The sum of price * quantity over the rows inside the window.
+    - volume (int): The sum of quantity over the rows inside the window.
+    """
+
+
+    # Number of evicted rows below which the log is never compacted
+    COMPACT_MIN = 1024
+
+    def __init__(self, symbol_id : int, window_ns : int):
+        self.symbol_id = symbol_id
+        self.lock = threading.Lock()
+        self.log = TradeLog()
+        self.rows = array('Q')
+        self.head = 0
+        self.window_head = 0
+        self.notional = 0.0
+        self.volume = 0
+        self._window_ns = window_ns
+
+    def insert(self, timestamp_ns : int, quantity : int, price : float, side : int, now_ns : int) -> None:
+        """
+        Append a trade to the log and index it by time. The lock must be held and the window expired at now_ns.
+        Args:
+        - timestamp_ns (int): The trade time as epoch nanoseconds.
+        - quantity (int): The quantity of shares traded.
+        - price (float): The price per share.
+        - side (int): The value of the trade type.
+        - now_ns (int): The current time as epoch nanoseconds.
+        """
+        timestamps = self.log.timestamps
+        row = self.log.append(timestamp_ns, self.symbol_id, quantity, price, side)
+        rows = self.rows
+        if not rows or timestamp_ns >= timestamps[rows[-1]]:
+            rows.append(row)
+        else:
+            rows.insert(bisect_right(rows, timestamp_ns, lo=self.head, key=timestamps.__getitem__), row)
+        # A trade already outside the window lands before the rows inside it
+        if timestamp_ns > now_ns - self._window_ns:
+            self.notional += price * quantity
+            self.volume += quantity
+        else:
+            self.window_head += 1
+
+    def expire(self, now_ns : int) -> None:
+        """
+        Take the trades that left the window out of the running sums. The lock must be held.
+        Args:
+        - now_ns (int): The current time as epoch nanoseconds.
+        """
+        self._leave_window(bisect_right(self.rows, now_ns - self._window_ns, lo=self.window_head, key=self.log.timestamps.__getitem__))
+
+    def _leave_window(self, window_head : int) -> None:
+        """
+        Move the window index forward, taking the rows it passes out of the running sums. The lock must be held.
+        Args:
+        - window_head (int): The new number of rows outside the window.
+        """
+        if window_head <= self.window_head:
+            return
+        if window_head >= len(self.rows):
+            # Reset instead of trusting the subtractions to land on zero
+            self.notional, self.volume = 0.0, 0
+        else:
+            notional, volume = self.log.totals(self.rows[self.window_head:window_head])
+            self.notional -= notional
+            self.volume -= volume
+        self.window_head = window_head
+
+    def vwsp(self, now_ns : int) -> float:
+        """
+        Get the volume weighted stock price over the window. The lock must be held.
+        Args:
+        - now_ns (int): The current time as epoch nanoseconds.
+        Returns:
+        - float: The volume weighted stock price, 0 if there are no trades in the window.
+        """
+        self.expire(now_ns)
+        return self.notional / self.volume if self.volume != 0 else 0
+
+    def rows_since(self, timestamp_ns : int) -> array:
+        """
+        Get the rows of the trades strictly after a point in time. The lock must be held.
+        Args:
+        - timestamp_ns (int): Trades at or before this epoch nanoseconds time are excluded.
+        Returns:
+        - array[int]: The matching rows ordered by trade time.
+        """
+        return self.rows[bisect_right(self.rows, timestamp_ns, lo=self.head, key=self.log.timestamps.__getitem__):]
+
+    def snapshot(self, timestamp_ns : int|None = None) -> list[tuple[int, int, int, float, int]]:
+        """
+        Copy the rows of the trades strictly after a point in time under the lock.
+        Args:
+        - timestamp_ns (int | None): Trades at or before this epoch nanoseconds time are excluded, None includes all trades.
+        Returns:
+        - list[tuple[int, int, int, float, int]]: The timestamp, symbol id, quantity, price and side of the matching trades, ordered by trade time.
+        """
+        with self.lock:
+            rows = self.rows[self.head:] if timestamp_ns is None else self.rows_since(timestamp_ns)
+            return [self.log.row(row) for row in rows]
+
+    def evict(self, cutoff_ns : int|None, max_trades : int|None, spill : Callable[[tuple[int, int, int, float, int]], None]|None = None) -> int:
+        """
+        Evict the oldest trades. The lock must be held.
+        Args:
+        - cutoff_ns (int | None): Trades at or before this epoch nanoseconds time are evicted, None keeps them.
+        - max_trades (int | None): The number of most recent trades kept at most, None for no limit.
+        - spill (Callable[[tuple[int, int, int, float, int]], None] | None): Called with the columns of every evicted trade.
+        Returns:
+        - int: The number of evicted trades.
+        """
+        rows = self.rows
+        head = self.head
+        if max_trades is not None:
+            head = max(head, len(rows) - max_trades)
+        if cutoff_ns is not None and head < len(rows) and self.log.timestamps[rows[head]] <= cutoff_ns:
+            head = bisect_right(rows, cutoff_ns, lo=head, key=self.log.timestamps.__getitem__)
+        evicted = head - self.head
+        if evicted == 0:
+            return 0
+        # Trades capped out of the store leave the window as well
+        self._leave_window(head)
+        if spill is not None:
+            for row in rows[self.head:head]:
+                spill(self.log.row(row))
+        self.head = head
+        if head >= self.COMPACT_MIN and head * 2 >= len(rows):
+            self.compact()
+        return evicted
+
+    def compact(self) -> None:
+        """
+        Drop the evicted rows from the log, storing the remaining trades in time order. The lock must be held.
+        """
+        log = TradeLog()
+        for row in self.rows[self.head:]:
+            log.append(*self.log.row(row))
+        self.log = log
+        self.rows = array('Q', range(len(log)))
+        self.window_head -= self.head
+        self.head = 0
+
+    def nbytes(self) -> int:
+        """
+        Get the memory used by the trade columns and the time index.
+        Returns:
+        - int: The size of the buffers in bytes.
+        """
+        return self.log.nbytes() + self.rows.itemsize * len(self.rows)
+
+    def __len__(self) -> int:
+        return len(self.rows) - self.head
+
+class TradeStore():
+    """
+    Stores recorded trades sharded by stock symbol.
+    Every symbol keeps its trades in its own columnar TradeLog with the row
+    indexes in time order, so the trades of a symbol since a given time are
+    found with a binary search and a slice instead of a scan over every
+    recorded trade. Trade objects are only built when requested.
+    The store can be shared between threads. Every symbol has its own lock,
+    so writers on different symbols never contend and readers get a
+    consistent snapshot of the trades of a symbol.
+    Memory can be bounded with a retention period, relative to the latest
+    trade of each symbol, and a cap on the trades kept per symbol. Evicted
+    trades are dropped, or appended to an archive journal if one is set.
+    Attributes:
+    - registry (SymbolRegistry): Assigns the symbol ids of the shards.
+    - retention (timedelta | None): How long trades are kept, None keeps them all.
+    - max_trades (int | None): The number of trades kept per symbol at most, None for no limit.
+    - journal (TradeJournal | None): If set, every recorded trade is also appended to it.
+    - archive (TradeJournal | None): If set, every evicted trade is appended to it.
+    - clock (Clock): The source of the current time when none is given.
+    - _listeners (list[Callable]): Called with the arguments of record after every recorded trade.
+    - _shards (list[SymbolTrades | None]): The trades per symbol id.
+    - _lock (threading.Lock): Guards registering symbols and creating shards.
+    - _counts (list[list[int]]): The change in the number of trades held made by every thread, so len() takes no lock and sums one cell per thread.
+    - _local (threading.local): The count cell of the current thread.
+    """
+
+    def __init__(self, window : timedelta = timedelta(minutes=15), registry : SymbolRegistry|None = None, retention : timedelta|None = None, max_trades : int|None = None, clock : Clock = SYSTEM_CLOCK):
+        if window <= timedelta(0):
+            raise ValueError('Invalid VWSP window')
+        if retention is not None and retention < window:
+            raise ValueError('Retention shorter than the VWSP window')
+        if max_trades is not None and max_trades <= 0:
+            raise ValueError('Invalid maximum number of trades')
+        self.retention = retention
+        self.max_trades = max_trades
+        self.clock = clock
+        self._retention_ns = retention // timedelta(microseconds=1) * 1000 if retention is not None else None
+        self.journal : 'TradeJournal|None' = None
+        self.archive : 'TradeJournal|None' = None
+        self._listeners : list[Callable[[Stock, int, TradeType, float, int], None]] = []
+        self.registry = registry if registry is not None else SymbolRegistry()
+        self._window = window
+        self._window_ns = window // timedelta(microseconds=1) * 1000
+        self._shards : list[SymbolTrades|None] = []
+        self._lock = threading.Lock()
+        self._counts : list[list[int]] = []
+        self._local = threading.local()
+
+    @property
+    def window(self) -> timedelta:
+        """
+        The length of the volume weighted stock price window.
+        """
+        return self._window
+
+    def _symbol_id(self, stock : Stock) -> int:
+        """
+        Get the id of a stock, registering it on first use.
+        Args:
+        - stock (Stock): The stock.
+        Returns:
+        - int: The symbol id of the stock.
+        """
+        symbol_id = self.registry.id_of(stock.symbol)
+        if symbol_id is None:
+            with self._lock:
+                symbol_id = self.registry.id_of(stock.symbol)
+                if symbol_id is None:
+                    symbol_id = self.registry.add(stock)
+        return symbol_id
+
+    def _count(self, change : int) -> None:
+        """
+        Add to the number of trades held, in the cell only the current thread writes to.
+        Args:
+        - change (int): The number of trades recorded, negative for evicted trades.
+        """
+        cell = getattr(self._local, 'cell', None)
+        if cell is None:
+            cell = self._local.cell = [0]
+            with self._lock:
+                self._counts.append(cell)
+        cell[0] += change
+
+    def _shard(self, symbol_id : int) -> SymbolTrades:
+        """
+        Get the trades of a symbol id, creating the shard on first use.
+        Args:
+        - symbol_id (int): The symbol id.
+        Returns:
+        - SymbolTrades: The trades of the symbol.
+        """
+        shards = self._shards
+        if symbol_id < len(shards) and (shard := shards[symbol_id]) is not None:
+            return shard
+        with self._lock:
+            while len(shards) <= symbol_id:
+                shards.append(None)
+            if shards[symbol_id] is None:
+                shards[symbol_id] = SymbolTrades(symbol_id, self._window_ns)
+            return shards[symbol_id]
+
+    def _find_shard(self, symbol : str) -> SymbolTrades|None:
+        """
+        Get the trades of a symbol without creating a shard.
+        Args:
+        - symbol (str): The symbol of the stock.
+        Returns:
+        - SymbolTrades | None: The trades of the symbol, None if it has none.
+        """
+        symbol_id = self.registry.id_of(symbol)
+        if symbol_id is None or symbol_id >= len(self._shards):
+            return None
+        return self._shards[symbol_id]
+
+    def add(self, trade : Trade) -> None:
+        """
+        Record a trade.
+        Args:
+        - trade (Trade): The trade to be recorded.
+        """
+        self.record(trade.stock, trade.quantity, trade.type, trade.price, datetime_to_ns(trade.date))
+
+    def record(self, stock : Stock, quantity : int, type : TradeType, price : float, timestamp_ns : int) -> None:
+        """
+        Record a trade without building a Trade object.
+        Trades arriving in time order are appended in constant time, older
+        trades are inserted at their position in the symbol index. Trades
+        of the symbol that fell out of the retention are evicted. Only the
+        lock of the traded symbol is held.
+        Args:
+        - stock (Stock): The stock involved in the trade.
+        - quantity (int): The quantity of shares traded.
+        - type (TradeType): The type of the trade (Buy or Sell).
+        - price (float): The price per share.
+        - timestamp_ns (int): The trade time as epoch nanoseconds.
+        """
+        # Journaled first, a trade that cannot be journaled is not recorded
+        if self.journal is not None:
+            self.journal.append(stock.symbol, type.value, quantity, price, timestamp_ns)
+        symbol_id = self._symbol_id(stock)
+        shard = self._shard(symbol_id)
+        now_ns = self.clock.now_ns()
+        with shard.lock:
+            shard.expire(now_ns)
+            shard.insert(timestamp_ns, quantity, price, type.value, now_ns)
+            self._count(1)
+            if self._retention_ns is not None or self.max_trades is not None:
+                cutoff_ns = shard.log.timestamps[shard.rows[-1]] - self._retention_ns if self._retention_ns is not None else None
+                self._evict(shard, cutoff_ns)
+        for listener in self._listeners:
+            listener(stock, quantity, type, price, timestamp_ns)
+
+    def restore(self, stock : Stock, trades : Iterable[tuple[int, int, float, int]]) -> int:
+        """
+        Record a run of trades of one stock read back from a snapshot.
+        The symbol and its shard are looked up once for the whole run and
+        the trades skip the journal and the listeners, which saw them when
+        they were first recorded. Retention is applied after the run.
+        Args:
+        - stock (Stock): The stock involved in the trades.
+        - trades (Iterable[tuple[int, int, float, int]]): The timestamp (epoch ns), quantity, price and side of every trade, preferably ordered by time.
+        Returns:
+        - int: The number of restored trades.
+        """
+        symbol_id = self._symbol_id(stock)
+        shard = self._shard(symbol_id)
+        count = 0
+        with shard.lock:
+            log = shard.log
+            timestamps = log.timestamps
+            rows = shard.rows
+            append = log.append
+            for timestamp_ns, quantity, price, side in trades:
+                row = append(timestamp_ns, symbol_id, quantity, price, side)
+                if not rows or timestamp_ns >= timestamps[rows[-1]]:
+                    rows.append(row)
+                else:
+                    rows.insert(bisect_right(rows, timestamp_ns, lo=shard.head, key=timestamps.__getitem__), row)
+                count += 1
+            # The window is summed once over the run instead of per trade
+            window_head = bisect_right(rows, self.clock.now_ns() - self._window_ns, lo=shard.head, key=timestamps.__getitem__)
+            shard.window_head = window_head
+            shard.notional, shard.volume = log.totals(rows[window_head:])
+            self._count(count)
+            if rows and (self._retention_ns is not None or self.max_trades is not None):
+                self._evict(shard, timestamps[rows[-1]] - self._retention_ns if self._retention_ns is not None else None)
+        return count
+
+    def _evict(self, shard : SymbolTrades, cutoff_ns : int|None) -> int:
+        """
+        Evict the trades of a symbol past the retention or the cap, spilling them to the archive. The lock of the symbol must be held.
+        Args:
+        - shard (SymbolTrades): The trades of the symbol.
+        - cutoff_ns (int | None): Trades at or before this epoch nanoseconds time are evicted, None keeps them.
+        Returns:
+        - int: The number of evicted trades.
+        """
+        spill = None
+        if self.archive is not None:
+            archive = self.archive
+            symbol = self.registry.stock(shard.symbol_id).symbol
+            spill = lambda row: archive.append(symbol, row[4], row[2], row[3], row[0])
+        evicted = shard.evict(cutoff_ns, self.max_trades, spill)
+        if evicted:
+            self._count(-evicted)
+        return evicted
+
+    def evict(self, now : datetime|None = None) -> int:
+        """
+        Evict the trades of every symbol that fell out of the retention by a point in time.
+        Symbols evict their own trades as they trade, this also covers idle symbols.
+        Args:
+        - now (datetime | None): The current time, defaults to the clock.
+        Returns:
+        - int: The number of evicted trades.
+        """
+        if self._retention_ns is None and self.max_trades is None:
+            return 0
+        cutoff_ns = None
+        if self._retention_ns is not None:
+            cutoff_ns = (datetime_to_ns(now) if now is not None else self.clock.now_ns()) - self._retention_ns
+        evicted = 0
+        for shard in self.shards():
+            with shard.lock:
+                evicted += self._evict(shard, cutoff_ns)
+        return evicted
+
+    def add_listener(self, listener : Callable[[Stock, int, TradeType, float, int], None]) -> None:
+        """
+        Register a callback invoked after every recorded trade, on the recording thread.
+        Args:
+        - listener (Callable[[Stock, int, TradeType, float, int], None]): Called with the stock, quantity, type, price and epoch nanoseconds time of the trade.
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener : Callable[[Stock, int, TradeType, float, int], None]) -> None:
+        """
+        Unregister a callback added with add_listener.
+        Args:
+        - listener (Callable[[Stock, int, TradeType, float, int], None]): The callback to remove.
+        """
+        self._listeners.remove(listener)
+
+    def _build_trade(self, timestamp : int, symbol_id : int, quantity : int, price : float, side : int) -> Trade:
+        """
+        Build a Trade object from the columns of a row.
+        The row was validated when it was recorded, so validation is skipped.
+        Returns:
+        - Trade: The trade stored in the row.
+        """
+        return Trade.trusted(self.registry.stock(symbol_id), quantity, TradeType(side), price, ns_to_datetime(timestamp))
+
+    def trades_for(self, symbol : str) -> list[Trade]:
+        """
+        Get all trades of a symbol.
+        Args:
+        - symbol (str): The symbol of the stock.
+        Returns:
+        - list[Trade]: The trades of the symbol ordered by date.
+        """
+        shard = self._find_shard(symbol)
+        if shard is None:
+            return []
+        return [self._build_trade(*row) for row in shard.snapshot()]
+
+    def trades_since(self, symbol : str, since : datetime) -> list[Trade]:
+        """
+        Get the trades of a symbol recorded strictly after a point in time.
+        Args:
+        - symbol (str): The symbol of the stock.
+        - since (datetime): Trades dated at or before this time are excluded.
+        Returns:
+        - list[Trade]: The matching trades ordered by date.
+        """
+        shard = self._find_shard(symbol)
+        if shard is None:
+            return []
+        return [self._build_trade(*row) for row in shard.snapshot(datetime_to_ns(since))]
+
+    def totals_since(self, symbol : str, since : datetime) -> tuple[float, int]:
+        """
+        Sum price * quantity and quantity over the trades of a symbol after a point in time.
+        Args:
+        - symbol (str): The symbol of the stock.
+        - since (datetime): Trades dated at or before this time are excluded.
+        Returns:
+        - tuple[float, int]: The total notional and the total quantity.
+        """
+        shard = self._find_shard(symbol)
+        if shard is None:
+            return 0.0, 0
+        with shard.lock:
+            return shard.log.totals(shard.rows_since(datetime_to_ns(since)))
+
+    def vwsp(self, symbol : str, now : datetime|None = None) -> float:
+        """
+        Get the volume weighted stock price of a symbol over the store window.
+        Args:
+        - symbol (str): The symbol of the stock.
+        - now (datetime | None): The current time, defaults to the clock.
+        Returns:
+        - float: The volume weighted stock price, 0 if there are no trades in the window.
+        """
+        shard = self._find_shard(symbol)
+        if shard is None:
+            return 0
+        now_ns = datetime_to_ns(now) if now is not None else self.clock.now_ns()
+        with shard.lock:
+            return shard.vwsp(now_ns)
+
+    def stock(self, symbol_id : int) -> Stock:
+        """
+        Get the stock of a symbol id.
+        Args:
+        - symbol_id (int): The symbol id.
+        Returns:
+        - Stock: The stock.
+        """
+        return self.registry.stock(symbol_id)
+
+    def symbols(self) -> list[str]:
+        """
+        Get the symbols known to the store.
+        Returns:
+        - list[str]: The registered symbols, indexed by symbol id.
+        """
+        return self.registry.symbols()
+
+    def shards(self) -> list[SymbolTrades]:
+        """
+        Get the trades of every symbol that has recorded trades.
+        Returns:
+        - list[SymbolTrades]: The shards ordered by symbol id.
+        """
+        return [shard for shard in list(self._shards) if shard is not None]
+
+    def iter_rows(self) -> Iterator[tuple[int, int, int, float, int]]:
+        """
+        Iterate over a snapshot of all recorded trades, ordered by trade time.
+        Every symbol is copied under its own lock, then the symbols are merged.
+        Returns:
+        - Iterator[tuple[int, int, int, float, int]]: The timestamp, symbol id, quantity, price and side of every trade.
+        """
+        return heapq.merge(*(shard.snapshot() for shard in self.shards()))
+
+    def nbytes(self) -> int:
+        """
+        Get the memory used by the trade columns and indexes, the VWSP window running over them.
+        Returns:
+        - int: The size of the buffers in bytes.
+        """
+        return sum(shard.nbytes() for shard in self.shards())
+
+    def __len__(self) -> int:
+        return sum(cell[0] for cell in list(self._counts))
+
+    def __iter__(self) -> Iterator[Trade]:
+        for row in self.iter_rows():
+            yield self._build_trade(*row)
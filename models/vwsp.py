@@ -0,0 +1,84 @@
+from bisect import bisect_right
+from collections import deque
+from datetime import timedelta
+from utils.clock import Clock, SYSTEM_CLOCK
+
+class VwspEngine():
+    """
+    Streaming volume weighted stock price calculator.
+    Keeps the trades of each symbol that fall inside a sliding time window
+    together with running sums of price * quantity and quantity. Trades
+    leave the window as new trades of the symbol are recorded, so a symbol
+    that is never queried does not grow, and a query only has to expire the
+    trades that left the window since.
+    Attributes:
+    - window (timedelta): The length of the sliding window.
+    - clock (Clock): The source of the current time when none is given.
+    """
+
+    def __init__(self, window : timedelta = timedelta(minutes=15), clock : Clock = SYSTEM_CLOCK):
+        if window <= timedelta(0):
+            raise ValueError('Invalid VWSP window')
+        self.window = window
+        self.clock = clock
+        self._window_ns = window // timedelta(microseconds=1) * 1000
+        self._trades : dict[int|str, deque[tuple[int, float, int]]] = {}
+        self._notional : dict[int|str, float] = {}
+        self._volume : dict[int|str, int] = {}
+
+    def record(self, key : int|str, timestamp_ns : int, price : float, quantity : int, now_ns : int|None = None) -> None:
+        """
+        Add a trade to the window of its symbol, expiring the trades of the symbol that left it.
+        Trades that are already outside the window are ignored.
+        Args:
+        - key (int | str): The symbol, or symbol id, of the traded stock.
+        - timestamp_ns (int): The trade time as epoch nanoseconds.
+        - price (float): The price per share.
+        - quantity (int): The quantity of shares traded.
+        - now_ns (int | None): The current time as epoch nanoseconds, defaults to the clock.
+        """
+        now_ns = now_ns if now_ns is not None else self.clock.now_ns()
+        self._expire(key, now_ns)
+        if timestamp_ns <= now_ns - self._window_ns:
+            return
+        trades = self._trades.setdefault(key, deque())
+        entry = (timestamp_ns, price * quantity, quantity)
+        if not trades or timestamp_ns >= trades[-1][0]:
+            trades.append(entry)
+        else:
+            trades.insert(bisect_right(trades, timestamp_ns, key=lambda x: x[0]), entry)
+        self._notional[key] = self._notional.get(key, 0.0) + entry[1]
+        self._volume[key] = self._volume.get(key, 0) + quantity
+
+    def _expire(self, key : int|str, now_ns : int) -> None:
+        """
+        Remove the trades of a symbol that left the window.
+        Args:
+        - key (int | str): The symbol, or symbol id, of the stock.
+        - now_ns (int): The current time as epoch nanoseconds.
+        """
+        trades = self._trades.get(key)
+        if not trades:
+            return
+        cutoff = now_ns - self._window_ns
+        while trades and trades[0][0] <= cutoff:
+            _, notional, quantity = trades.popleft()
+            self._notional[key] -= notional
+            self._volume[key] -= quantity
+        if not trades:
+            # Reset instead of trusting the subtractions to land on zero
+            self._notional[key] = 0.0
+            self._volume[key] = 0
+
+    def vwsp(self, key : int|str, now_ns : int|None = None) -> float:
+        """
+        Get the volume weighted stock price of a symbol over the window.
+        Args:
+        - key (int | str): The symbol, or symbol id, of the stock.
+        - now_ns (int | None): The current time as epoch nanoseconds, defaults to the clock.
+        Returns:
+        - float: The volume weighted stock price, 0 if there are no trades in the window.
+        """
+        self._expire(key, now_ns if now_ns is not None else self.clock.now_ns())
+        volume = self._volume.get(key, 0)
+        return self._notional[key] / volume if volume != 0 else 0
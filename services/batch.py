@@ -0,0 +1,100 @@
+import csv
+import json
+from typing import Iterable, TextIO
+from models.market import Market
+from models.trade import TradeType
+from utils.convert import try_parse_int, try_parse_float, timestamp_to_ns
+
+BATCH_OUTPUT_FORMATS = ['json', 'csv']
+BATCH_CSV_HEADERS = ['line', 'op', 'symbol', 'result', 'error']
+
+def _parse_price(value : str) -> float:
+    """
+    Parse a price argument.
+    Raises:
+    - ValueError: If the value is not a number.
+    """
+    price = try_parse_float(value)
+    if price is None:
+        raise ValueError(f'Invalid price {value}')
+    return price
+
+def execute_command(market : Market, tokens : list[str]) -> float|int:
+    """
+    Execute a single batch command.
+    Commands:
+    - yield <symbol> <price>
+    - pe <symbol> <price>
+    - trade <symbol> <buy|sell> <quantity> <price> [epoch timestamp]
+    - vwsp <symbol>
+    - gbce <price> ... (one price per loaded stock, in load order)
+    Args:
+    - market (Market): The market the command runs against.
+    - tokens (list[str]): The command name followed by its arguments.
+    Returns:
+    - float | int: The result of the command, the number of recorded trades for trade.
+    Raises:
+    - ValueError: If the command or its arguments are invalid.
+    """
+    op, args = tokens[0].lower(), tokens[1:]
+    if op in ['yield', 'pe'] and len(args) == 2:
+        price = _parse_price(args[1])
+        if op == 'yield':
+            return market.dividend_yield(args[0], price)
+        return market.pe_ratio(args[0], price)
+    if op == 'trade' and len(args) in [4, 5]:
+        symbol, trade_type, quantity, price = args[:4]
+        if trade_type.lower() not in ['buy', 'sell']:
+            raise ValueError(f'Invalid Trade Type {trade_type}')
+        if (quantity := try_parse_int(quantity)) is None:
+            raise ValueError('Invalid quantity')
+        timestamp = None
+        if len(args) == 5 and (timestamp := timestamp_to_ns(args[4])) is None:
+            raise ValueError('Invalid date')
+        market.record_trade(symbol, quantity, TradeType.Buy if trade_type.lower() == 'buy' else TradeType.Sell, _parse_price(price), timestamp)
+        return len(market.trades)
+    if op == 'vwsp' and len(args) == 1:
+        return market.vwsp(args[0])
+    if op == 'gbce':
+        return market.gbce_index([_parse_price(price) for price in args])
+    raise ValueError(f'Invalid command {tokens[0]}')
+
+def run_batch(market : Market, lines : Iterable[str], output : TextIO, output_format : str = 'json') -> tuple[int, int]:
+    """
+    Run batch commands, one per line, and write one result line per command.
+    Blank lines and lines starting with # are ignored. A failing command
+    produces an error line and does not stop the batch.
+    Args:
+    - market (Market): The market the commands run against, kept warm between commands.
+    - lines (Iterable[str]): The command lines.
+    - output (TextIO): Where the results are written, as JSON lines or CSV rows.
+    - output_format (str): Either json or csv.
+    Returns:
+    - tuple[int, int]: The number of successful and of failed commands.
+    """
+    if output_format not in BATCH_OUTPUT_FORMATS:
+        raise ValueError(f'Invalid output format {output_format}')
+    writer = csv.writer(output) if output_format == 'csv' else None
+    if writer is not None:
+        writer.writerow(BATCH_CSV_HEADERS)
+    succeeded = failed = 0
+    for line_number, line in enumerate(lines, start=1):
+        tokens = line.split()
+        if not tokens or tokens[0].startswith('#'):
+            continue
+        op = tokens[0].lower()
+        symbol = tokens[1] if len(tokens) > 1 and op != 'gbce' else None
+        result = error = None
+        try:
+            result = execute_command(market, tokens)
+            succeeded += 1
+        except Exception as e:
+            error = str(e)
+            failed += 1
+        if writer is not None:
+            writer.writerow([line_number, op, symbol or '', '' if result is None else result, error or ''])
+        else:
+            entry = {'line': line_number, 'op': op, 'symbol': symbol}
+            entry['result' if error is None else 'error'] = result if error is None else error
+            output.write(json.dumps(entry) + '\n')
+    return succeeded, failed
@@ -0,0 +1,175 @@
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable
+from models.gbce import GbceIndex
+from models.stock import Stock
+from models.trade import Trade, TradeType
+from models.trade_store import TradeStore
+
+@dataclass
+class MarketUpdate():
+    """
+    The recomputed values of the symbols whose inputs changed since the previous update.
+    Attributes:
+    - timestamp_ns (int): When the update was computed, as epoch nanoseconds.
+    - vwsp (dict[str, float]): The volume weighted stock price of every symbol that traded.
+    - prices (dict[str, float]): The latest price of every symbol that traded or ticked.
+    - gbce (float): The GBCE All Share Index over the latest price of every priced symbol.
+    """
+    timestamp_ns : int
+    vwsp : dict[str, float] = field(default_factory=dict)
+    prices : dict[str, float] = field(default_factory=dict)
+    gbce : float = 0.0
+
+class TickPipeline():
+    """
+    Publish/subscribe pipeline turning trades and price ticks into VWSP and GBCE updates.
+    Publishing only marks the symbol as changed. The changed symbols are
+    recomputed at most once per interval, so a burst of ticks on a symbol
+    produces a single recomputation, and the GBCE index is updated in
+    constant time per changed price. Trades recorded in the store by any
+    other path, such as the menu or the server, are picked up as well.
+    Attributes:
+    - store (TradeStore): The trades the VWSP is calculated from.
+    - interval (float): The minimum number of seconds between two updates.
+    - gbce (GbceIndex): The index over the latest price of every symbol.
+    - _lock (threading.Lock): Guards the changes published since the previous update.
+    - _flush_lock (threading.Lock): Serialises updates, so subscribers see them in order.
+    """
+
+    def __init__(self, store : TradeStore, interval : float = 0.1):
+        if interval < 0:
+            raise ValueError('Invalid interval')
+        self.store = store
+        self.interval = interval
+        self.gbce = GbceIndex()
+        self._subscribers : list[Callable[[MarketUpdate], None]] = []
+        self._traded : set[str] = set()
+        self._prices : dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._stopped = threading.Event()
+        self._thread : threading.Thread|None = None
+        store.add_listener(self._on_trade)
+
+    def subscribe(self, subscriber : Callable[[MarketUpdate], None]) -> None:
+        """
+        Register a callback receiving every update.
+        Args:
+        - subscriber (Callable[[MarketUpdate], None]): Called with every update, on the flushing thread.
+        """
+        self._subscribers.append(subscriber)
+
+    def unsubscribe(self, subscriber : Callable[[MarketUpdate], None]) -> None:
+        """
+        Unregister a callback added with subscribe.
+        Args:
+        - subscriber (Callable[[MarketUpdate], None]): The callback to remove.
+        """
+        self._subscribers.remove(subscriber)
+
+    def _on_trade(self, stock : Stock, quantity : int, type : TradeType, price : float, timestamp_ns : int) -> None:
+        """
+        Mark the symbol of a recorded trade as changed, its price becoming the latest price.
+        """
+        with self._lock:
+            self._traded.add(stock.symbol)
+            self._prices[stock.symbol] = price
+
+    def publish_trade(self, stock : Stock, quantity : int, type : TradeType, price : float, timestamp_ns : int|None = None) -> None:
+        """
+        Record a trade and mark its symbol as changed.
+        Args:
+        - stock (Stock): The stock involved in the trade.
+        - quantity (int): The quantity of shares traded.
+        - type (TradeType): The type of the trade (Buy or Sell).
+        - price (float): The price per share.
+        - timestamp_ns (int | None): The trade time as epoch nanoseconds, defaults to now.
+        Raises:
+        - ValueError: If the stock, quantity, price or date is invalid.
+        """
+        Trade.validate(stock, quantity, price)
+        now_ns = self.store.clock.now_ns()
+        if timestamp_ns is None:
+            timestamp_ns = now_ns
+        elif timestamp_ns > now_ns:
+            raise ValueError('Invalid Trade date')
+        self.store.record(stock, quantity, type, price, timestamp_ns)
+
+    def publish_price(self, symbol : str, price : float) -> None:
+        """
+        Publish the latest price of a symbol without a trade.
+        Args:
+        - symbol (str): The symbol of the stock.
+        - price (float): The latest price.
+        Raises:
+        - ValueError: If the price is negative.
+        """
+        if price < 0:
+            raise ValueError('Invalid price')
+        with self._lock:
+            self._prices[symbol] = price
+
+    def flush(self) -> MarketUpdate|None:
+        """
+        Recompute the changed symbols and notify the subscribers.
+        Returns:
+        - MarketUpdate | None: The published update, None if nothing changed.
+        """
+        with self._flush_lock:
+            with self._lock:
+                traded, self._traded = self._traded, set()
+                prices, self._prices = self._prices, {}
+                self._last_flush = time.monotonic()
+            if not traded and not prices:
+                return None
+            for symbol, price in prices.items():
+                self.gbce.update(symbol, price)
+            update = MarketUpdate(self.store.clock.now_ns(), {symbol: self.store.vwsp(symbol) for symbol in traded}, prices, self.gbce.value)
+            for subscriber in self._subscribers:
+                subscriber(update)
+            return update
+
+    def poll(self) -> MarketUpdate|None:
+        """
+        Flush if the interval has elapsed since the previous update.
+        Returns:
+        - MarketUpdate | None: The published update, None if it is too early or nothing changed.
+        """
+        if time.monotonic() - self._last_flush < self.interval:
+            return None
+        return self.flush()
+
+    def start(self) -> None:
+        """
+        Flush every interval on a background thread until stopped.
+        """
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+
+        def run():
+            while not self._stopped.wait(self.interval):
+                self.flush()
+
+        self._thread = threading.Thread(target=run, name='tick-pipeline', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop the background thread and publish the pending changes.
+        """
+        if self._thread is not None:
+            self._stopped.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def close(self) -> None:
+        """
+        Stop and detach the pipeline from the trade store.
+        """
+        self.stop()
+        self.store.remove_listener(self._on_trade)
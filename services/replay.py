@@ -0,0 +1,200 @@
+import csv
+import json
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Callable, Iterable, TextIO
+from models.gbce import GbceIndex
+from models.stock import Stock
+from models.symbol_registry import SymbolRegistry
+from models.trade import TradeType
+from models.trade_store import TradeStore
+from utils.clock import ManualClock
+from utils.trade_io import TradeFileError, open_trade_file
+
+REPLAY_OUTPUT_FORMATS = ['json', 'csv']
+REPLAY_CSV_HEADERS = ['timestamp', 'symbol', 'vwsp', 'gbce']
+
+@dataclass
+class ReplaySample():
+    """
+    The market state at a point of a replay.
+    Attributes:
+    - timestamp_ns (int): The simulated time of the sample, as epoch nanoseconds.
+    - vwsp (dict[str, float]): The volume weighted stock price of every symbol traded so far.
+    - gbce (float): The GBCE All Share Index over the last traded price of every symbol traded so far.
+    """
+    timestamp_ns : int
+    vwsp : dict[str, float]
+    gbce : float
+
+@dataclass
+class ReplayStats():
+    """
+    Statistics of a replay.
+    Attributes:
+    - trades (int): The number of replayed trades.
+    - skipped (int): The number of trades of unknown symbols.
+    - samples (int): The number of emitted samples.
+    - elapsed (float): The wall clock duration of the replay in seconds.
+    """
+    trades : int = 0
+    skipped : int = 0
+    samples : int = 0
+    elapsed : float = 0.0
+
+    @property
+    def trades_per_second(self) -> float:
+        """
+        The number of trades replayed per wall clock second.
+        """
+        return self.trades / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self) -> str:
+        return f"Replayed {self.trades} trades ({self.skipped} skipped) into {self.samples} samples in {self.elapsed:.3f}s, {self.trades_per_second:,.0f} trades/s"
+
+class ReplayEngine():
+    """
+    Streams recorded trades through a trade store under a simulated clock.
+    The clock follows the trade timestamps, so the VWSP window and the
+    trade date checks see the recorded times instead of the wall clock.
+    A sample of every traded symbol's VWSP and of the GBCE index is emitted
+    at every interval boundary of simulated time. The store keeps only the
+    VWSP window, so memory stays flat however long the tape is.
+    Attributes:
+    - registry (SymbolRegistry): The stocks the trades refer to.
+    - interval (timedelta): The simulated time between two samples.
+    - speed (float | None): The replay speed as a multiple of real time, None replays as fast as possible.
+    - clock (ManualClock): The simulated clock.
+    - store (TradeStore): The trades inside the VWSP window.
+    - gbce (GbceIndex): The index over the last traded price of every symbol.
+    """
+
+    def __init__(self, registry : SymbolRegistry, interval : timedelta = timedelta(minutes=1), window : timedelta = timedelta(minutes=15), speed : float|None = None):
+        if interval <= timedelta(0):
+            raise ValueError('Invalid replay interval')
+        if speed is not None and speed <= 0:
+            raise ValueError('Invalid replay speed')
+        self.registry = registry
+        self.interval = interval
+        self.speed = speed
+        self.clock = ManualClock()
+        self.store = TradeStore(window, registry, retention=window, clock=self.clock)
+        self.gbce = GbceIndex()
+        self._interval_ns = interval // timedelta(microseconds=1) * 1000
+        self._traded : dict[str, None] = {}
+        self._prices : dict[str, float] = {}
+
+    def _sample(self, timestamp_ns : int) -> ReplaySample:
+        """
+        Move the clock to a sample boundary and take the sample.
+        Args:
+        - timestamp_ns (int): The sample time as epoch nanoseconds.
+        Returns:
+        - ReplaySample: The sample.
+        """
+        self.clock.set(timestamp_ns)
+        for symbol, price in self._prices.items():
+            self.gbce.update(symbol, price)
+        self._prices.clear()
+        vwsp = self.store.vwsp
+        return ReplaySample(timestamp_ns, {symbol: vwsp(symbol) for symbol in self._traded}, self.gbce.value)
+
+    def run(self, records : Iterable[tuple[int, int, int, int, float]], stocks : list[Stock|None], on_sample : Callable[[ReplaySample], None]) -> ReplayStats:
+        """
+        Replay trades ordered by time.
+        Args:
+        - records (Iterable[tuple[int, int, int, int, float]]): The timestamp (epoch ns), stock index, side, quantity and price of every trade.
+        - stocks (list[Stock | None]): The stocks by stock index, None for unknown symbols.
+        - on_sample (Callable[[ReplaySample], None]): Receives every sample.
+        Returns:
+        - ReplayStats: The statistics of the replay.
+        Raises:
+        - TradeFileError: If a record has an invalid stock index or side.
+        """
+        stats = ReplayStats()
+        started = time.perf_counter()
+        clock = self.clock
+        record = self.store.record
+        traded = self._traded
+        prices = self._prices
+        trade_types = {trade_type.value: trade_type for trade_type in TradeType}
+        interval_ns = self._interval_ns
+        speed = self.speed
+        first_ns = next_sample_ns = None
+        for timestamp, stock_index, side, quantity, price in records:
+            if next_sample_ns is None:
+                first_ns = timestamp
+                next_sample_ns = (timestamp // interval_ns + 1) * interval_ns
+                clock.set(max(clock.now_ns(), timestamp))
+            while timestamp >= next_sample_ns:
+                on_sample(self._sample(next_sample_ns))
+                stats.samples += 1
+                next_sample_ns += interval_ns
+            if speed is not None:
+                delay = started + (timestamp - first_ns) / 1e9 / speed - time.perf_counter()
+                if delay > 0.001:
+                    time.sleep(delay)
+            # Every record before this one was either replayed or skipped
+            try:
+                stock = stocks[stock_index]
+            except IndexError:
+                raise TradeFileError(f'Invalid symbol index {stock_index} in trade file record {stats.trades + stats.skipped}') from None
+            if stock is None:
+                stats.skipped += 1
+                continue
+            try:
+                trade_type = trade_types[side]
+            except KeyError:
+                raise TradeFileError(f'Invalid Trade type in trade file record {stats.trades + stats.skipped}') from None
+            if timestamp > clock.now_ns():
+                clock.set(timestamp)
+            record(stock, quantity, trade_type, price, timestamp)
+            symbol = stock.symbol
+            traded[symbol] = None
+            prices[symbol] = price
+            stats.trades += 1
+        if next_sample_ns is not None:
+            on_sample(self._sample(next_sample_ns))
+            stats.samples += 1
+        stats.elapsed = time.perf_counter() - started
+        return stats
+
+    def replay_file(self, file_path : str, on_sample : Callable[[ReplaySample], None]) -> ReplayStats|str:
+        """
+        Replay a binary trade file.
+        Args:
+        - file_path (str): The path to the binary trade file, as written by export_trades.
+        - on_sample (Callable[[ReplaySample], None]): Receives every sample.
+        Returns:
+        - ReplayStats | str: The statistics of the replay if successful, an error message otherwise.
+        """
+        try:
+            with open_trade_file(file_path) as (symbols, records):
+                return self.run(records, [self.registry.get(symbol) for symbol in symbols], on_sample)
+        except FileNotFoundError:
+            return "[Error] File does not exist"
+        except ValueError as e:
+            return f"[Error] {e}"
+
+def sample_writer(output : TextIO, output_format : str = 'json') -> Callable[[ReplaySample], None]:
+    """
+    Build a sample callback writing the samples as JSON lines or CSV rows.
+    JSON lines hold one sample each, CSV rows one symbol of a sample each.
+    Args:
+    - output (TextIO): Where the samples are written.
+    - output_format (str): Either json or csv.
+    Returns:
+    - Callable[[ReplaySample], None]: The callback.
+    """
+    if output_format not in REPLAY_OUTPUT_FORMATS:
+        raise ValueError(f'Invalid output format {output_format}')
+    if output_format == 'json':
+        return lambda sample: output.write(json.dumps({'timestamp': sample.timestamp_ns, 'gbce': sample.gbce, 'vwsp': sample.vwsp}) + '\n')
+    writer = csv.writer(output)
+    writer.writerow(REPLAY_CSV_HEADERS)
+
+    def write(sample : ReplaySample) -> None:
+        writer.writerows([sample.timestamp_ns, symbol, vwsp, sample.gbce] for symbol, vwsp in sample.vwsp.items())
+
+    return write
@@ -0,0 +1,160 @@
+import asyncio
+import json
+from models.market import Market
+from models.trade import TradeType
+from utils.convert import timestamp_to_ns
+
+# Size of the buffered responses of a connection above which the server
+# stops reading its requests until the client catches up.
+WRITE_BUFFER_LIMIT = 1024 * 1024
+# Longest accepted request line.
+MAX_LINE_LENGTH = 64 * 1024
+# Number of buffered requests a connection serves before yielding to the
+# other connections.
+REQUESTS_PER_TURN = 256
+
+def handle_request(market : Market, request : dict) -> dict:
+    """
+    Execute a request of the line-delimited JSON protocol.
+    Requests:
+    - {"op": "yield", "symbol": ..., "price": ...}
+    - {"op": "pe", "symbol": ..., "price": ...}
+    - {"op": "trade", "symbol": ..., "type": "buy"|"sell", "quantity": ..., "price": ..., "timestamp": epoch seconds (optional)}
+    - {"op": "vwsp", "symbol": ...}
+    - {"op": "gbce", "prices": [...]} (one price per loaded stock, in load order)
+    Any "id" of the request is echoed in the response.
+    Args:
+    - market (Market): The market the request runs against.
+    - request (dict): The decoded request.
+    Returns:
+    - dict: {"id": ..., "result": ...} if successful, {"id": ..., "error": ...} otherwise.
+    """
+    response = {'id': request.get('id')} if isinstance(request, dict) else {'id': None}
+    try:
+        if not isinstance(request, dict):
+            raise ValueError('Invalid request')
+        op = request.get('op')
+        if op == 'yield':
+            result = market.dividend_yield(request['symbol'], float(request['price']))
+        elif op == 'pe':
+            result = market.pe_ratio(request['symbol'], float(request['price']))
+        elif op == 'trade':
+            trade_type = str(request['type']).lower()
+            if trade_type not in ['buy', 'sell']:
+                raise ValueError('Invalid Trade Type')
+            if not isinstance(request['quantity'], int):
+                raise ValueError('Invalid quantity')
+            timestamp = None
+            if request.get('timestamp') is not None and (timestamp := timestamp_to_ns(str(request['timestamp']))) is None:
+                raise ValueError('Invalid date')
+            market.record_trade(request['symbol'], request['quantity'], TradeType.Buy if trade_type == 'buy' else TradeType.Sell, float(request['price']), timestamp)
+            result = len(market.trades)
+        elif op == 'vwsp':
+            result = market.vwsp(request['symbol'])
+        elif op == 'gbce':
+            result = market.gbce_index([float(price) for price in request['prices']])
+        else:
+            raise ValueError(f'Invalid op {op}')
+        response['result'] = result
+    except KeyError as e:
+        response['error'] = f'Missing field {e}'
+    except Exception as e:
+        response['error'] = str(e)
+    return response
+
+class MarketServer():
+    """
+    asyncio TCP server exposing a Market over a line-delimited JSON protocol.
+    Every connection may pipeline requests. They are executed in order and
+    their responses are written in the same order. A connection whose client
+    does not read its responses stops being read once the buffered responses
+    exceed WRITE_BUFFER_LIMIT, which pushes back on the client through TCP.
+    All requests run on the event loop thread, so the market needs no locking.
+    Attributes:
+    - market (Market): The stocks and trades served.
+    - host (str): The interface to listen on.
+    - port (int): The port to listen on, 0 picks a free port.
+    """
+
+    def __init__(self, market : Market, host : str = '127.0.0.1', port : int = 8765):
+        self.market = market
+        self.host = host
+        self.port = port
+        self._server : asyncio.AbstractServer|None = None
+
+    async def start(self) -> int:
+        """
+        Start listening.
+        Returns:
+        - int: The port the server listens on.
+        """
+        self._server = await asyncio.start_server(self._handle_client, self.host, self.port, limit=MAX_LINE_LENGTH)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def serve_forever(self) -> None:
+        """
+        Start listening if needed and serve until cancelled.
+        """
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self) -> None:
+        """
+        Stop listening and wait for the server to close.
+        """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle_client(self, reader : asyncio.StreamReader, writer : asyncio.StreamWriter) -> None:
+        """
+        Serve the requests of a connection until it is closed.
+        """
+        transport = writer.transport
+        served = 0
+        try:
+            while line := await reader.readline():
+                if not line.strip():
+                    continue
+                served += 1
+                if served % REQUESTS_PER_TURN == 0:
+                    # readline does not yield while requests are buffered
+                    await asyncio.sleep(0)
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    response = {'id': None, 'error': 'Invalid JSON'}
+                else:
+                    response = handle_request(self.market, request)
+                writer.write(json.dumps(response).encode() + b'\n')
+                # Drain only when the client falls behind, so pipelined
+                # requests are answered without a round trip per response
+                if transport.get_write_buffer_size() > WRITE_BUFFER_LIMIT:
+                    await writer.drain()
+            await writer.drain()
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+def run_server(market : Market, host : str = '127.0.0.1', port : int = 8765) -> None:
+    """
+    Serve a market until interrupted.
+    Args:
+    - market (Market): The stocks and trades served.
+    - host (str): The interface to listen on.
+    - port (int): The port to listen on.
+    """
+    server = MarketServer(market, host, port)
+
+    async def serve():
+        print(f"[Info] Serving on {host}:{await server.start()}", flush=True)
+        await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,55 @@
+import io
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from datetime import datetime
+import main
+
+class TestMain(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.stocks_path = self._write("stocks.csv", ["symbol,type,last_dividend,fixed_dividend,par_value", "TEA,Common,0,,100", "POP,Common,8,,100"])
+        now = datetime.now().timestamp()
+        self.trades_path = self._write("trades.csv", ["symbol,type,quantity,price,timestamp", f"TEA,Buy,10,15.0,{now - 60}", f"POP,Sell,5,18.5,{now - 30}"])
+
+    def _write(self, name, lines):
+        file_path = os.path.join(self.directory, name)
+        with open(file_path, 'w') as output:
+            output.write('\n'.join(lines) + '\n')
+        return file_path
+
+    def _run(self, commands, **options):
+        """
+        Run the application on batch commands, returning the number of trades held when it exits.
+        """
+        batch_path = self._write("commands.txt", commands)
+        with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+            main.main(self.stocks_path, True, batch_path=batch_path, **options)
+        return len(main.trade_data)
+
+    def test_restart_with_journal_and_trades(self):
+        journal_path = os.path.join(self.directory, "trades.journal")
+        # The imported trades are not journaled, only the trade recorded while running is
+        self.assertEqual(self._run(["trade POP buy 10 2.5"], trades_path=self.trades_path, journal_path=journal_path), 3)
+        self.assertEqual(self._run([], trades_path=self.trades_path, journal_path=journal_path), 3)
+        self.assertEqual(self._run([], trades_path=self.trades_path, journal_path=journal_path), 3)
+        self.assertEqual(self._run([], journal_path=journal_path), 1)
+
+    def test_restart_with_snapshot_and_trades(self):
+        snapshot_path = os.path.join(self.directory, "market.snapshot")
+        self.assertEqual(self._run(["trade POP buy 10 2.5"], trades_path=self.trades_path, snapshot_path=snapshot_path), 3)
+        # The imported trades are restored from the snapshot, not imported again
+        self.assertEqual(self._run([], trades_path=self.trades_path, snapshot_path=snapshot_path), 3)
+        # Another trade file invalidates the snapshot
+        now = datetime.now().timestamp()
+        self.trades_path = self._write("other.csv", ["symbol,type,quantity,price,timestamp", f"TEA,Sell,1,14.0,{now - 10}"])
+        self.assertEqual(self._run([], trades_path=self.trades_path, snapshot_path=snapshot_path), 1)
+        self.assertEqual(self._run([], trades_path=self.trades_path, snapshot_path=snapshot_path), 1)
+        self.assertEqual(self._run([], snapshot_path=snapshot_path), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,18 @@
+import dataclasses
+import threading
 import unittest
 from datetime import datetime, timedelta
 from models.stock import Stock, StockType
 from models.trade import Trade, TradeType
+from models.trade_store import SymbolTrades, TradeStore
+from models.vwsp import VwspEngine
+from models.gbce import GbceIndex
+from models.symbol_registry import SymbolRegistry
+from utils.convert import datetime_to_ns, ns_to_datetime
+from utils.clock import ManualClock
+from models.market import Market
+from models.bars import BarBuilder
+from models.positions import PositionBook, CostMethod
 
 class TestModels(unittest.TestCase):
 
@@ -50,6 +61,29 @@ class TestModels(unittest.TestCase):
     def test_calculate_pe_ratio_zero_dividend(self):
         self.assertEqual(self.common_stock.calculate_pe_ratio(0), 0)
 
+    def test_cached_pricing_constants_refresh(self):
+        stock = Stock("GIN", 0.08, 0.02, 100.0, StockType.Preferred)
+        rendered = repr(stock)
+        self.assertIs(repr(stock), rendered)
+        self.assertAlmostEqual(stock.calculate_dividend_yield(2.0), 1.0)
+        reloaded = dataclasses.replace(stock, par_value=1.0, last_dividend=0.0)
+        self.assertAlmostEqual(reloaded.calculate_dividend_yield(2.0), 0.01)
+        self.assertEqual(reloaded.calculate_pe_ratio(2.0), 0)
+        self.assertIn("Par Value:1.0", repr(reloaded))
+        self.assertEqual(reloaded, Stock("GIN", 0.0, 0.02, 1.0, StockType.Preferred))
+        with self.assertRaises(ValueError):
+            dataclasses.replace(stock, fixed_dividend=2.0)
+
+    def test_stock_frozen_and_trusted(self):
+        with self.assertRaises(dataclasses.FrozenInstanceError):
+            self.common_stock.last_dividend = 1.0
+        self.assertFalse(hasattr(self.common_stock, "__dict__"))
+        trusted = Stock.trusted("XYZ", 4.0, 0.02, 15.0, StockType.Preferred)
+        self.assertEqual(trusted, self.preferred_stock)
+        self.assertEqual(hash(trusted), hash(self.preferred_stock))
+        self.assertAlmostEqual(trusted.calculate_dividend_yield(20.0), 0.015)
+        self.assertEqual(repr(trusted), repr(self.preferred_stock))
+
     def test_calculate_volume_weighted_stock_price(self):
         trade1 = Trade(self.common_stock, 10, TradeType.Buy, 15.0, datetime.now() - timedelta(minutes=10))
         trade2 = Trade(self.common_stock, 5, TradeType.Sell, 18.0, datetime.now() - timedelta(minutes=5))
@@ -69,6 +103,60 @@ class TestModels(unittest.TestCase):
     def test_calculate_gbce_index_empty_prices(self):
         self.assertEqual(Stock.calculate_gbce_index([]), 0)
 
+    def test_calculate_gbce_index_large_universe(self):
+        self.assertAlmostEqual(Stock.calculate_gbce_index([1e300] * 2000), 1e300, delta=1e288)
+        self.assertAlmostEqual(Stock.calculate_gbce_index([1e-300] * 2000), 1e-300, delta=1e-312)
+        self.assertAlmostEqual(Stock.calculate_gbce_index(iter([2.0, 8.0])), 4.0)
+
+    def test_calculate_gbce_index_zero_price(self):
+        self.assertEqual(Stock.calculate_gbce_index([15.0, 0.0]), 0)
+
+    def test_gbce_index_incremental_update(self):
+        index = GbceIndex({"ABC": 15.0, "XYZ": 18.0})
+        self.assertAlmostEqual(index.value, Stock.calculate_gbce_index([15.0, 18.0]))
+        index.update("ABC", 20.0)
+        self.assertAlmostEqual(index.value, Stock.calculate_gbce_index([20.0, 18.0]))
+        index.update("POP", 0.0)
+        self.assertEqual(index.value, 0)
+        index.remove("POP")
+        self.assertAlmostEqual(index.value, Stock.calculate_gbce_index([20.0, 18.0]))
+        self.assertEqual(len(index), 2)
+        with self.assertRaises(ValueError):
+            index.update("ABC", -1.0)
+        self.assertEqual(GbceIndex().value, 0)
+
+    def test_symbol_registry(self):
+        registry = SymbolRegistry([self.common_stock, self.preferred_stock])
+        self.assertEqual(len(registry), 2)
+        self.assertIs(registry.get("abc"), self.common_stock)
+        self.assertIs(registry.get("XyZ"), self.preferred_stock)
+        self.assertIsNone(registry.get("POP"))
+        self.assertEqual(registry.id_of("xyz"), 1)
+        self.assertIs(registry.stock(0), self.common_stock)
+        self.assertIn("Abc", registry)
+        self.assertEqual(list(registry), [self.common_stock, self.preferred_stock])
+        with self.assertRaises(ValueError):
+            registry.add(Stock("abc", 1.0, 0, 1.0))
+
+    def test_registry_replace_keeps_trades(self):
+        registry = SymbolRegistry([self.common_stock])
+        store = TradeStore(registry=registry)
+        store.add(Trade(self.common_stock, 10, TradeType.Buy, 15.0, datetime.now() - timedelta(minutes=1)))
+        reloaded = dataclasses.replace(self.common_stock, last_dividend=7.0)
+        self.assertEqual(registry.replace(reloaded), 0)
+        self.assertIs(registry.get("ABC"), reloaded)
+        self.assertIs(store.trades_for("ABC")[0].stock, reloaded)
+        with self.assertRaises(ValueError):
+            registry.replace(self.preferred_stock)
+
+    def test_trade_store_shared_registry(self):
+        registry = SymbolRegistry([self.preferred_stock, self.common_stock])
+        store = TradeStore(registry=registry)
+        store.add(Trade(self.common_stock, 10, TradeType.Buy, 15.0, datetime.now() - timedelta(minutes=1)))
+        self.assertEqual([row[1] for row in store.iter_rows()], [1])
+        self.assertAlmostEqual(store.vwsp("abc"), 15.0)
+        self.assertEqual(store.trades_for("XYZ"), [])
+
     #==============================================================================
 
     def test_valid_trade_creation(self):
@@ -79,6 +167,14 @@ class TestModels(unittest.TestCase):
         self.assertEqual(trade.price, 20.0)
         self.assertIsInstance(trade.date, datetime)
 
+    def test_trade_frozen_and_trusted(self):
+        date = datetime(2024, 1, 2, 9, 30)
+        trade = Trade.trusted(self.trade_stock, 100, TradeType.Sell, 20.0, date)
+        self.assertEqual(trade, Trade(self.trade_stock, 100, TradeType.Sell, 20.0, date))
+        self.assertFalse(hasattr(trade, "__dict__"))
+        with self.assertRaises(dataclasses.FrozenInstanceError):
+            trade.price = 21.0
+
     def test_invalid_stock(self):
         with self.assertRaises(ValueError):
             Trade(stock=None, quantity=100, type=TradeType.Buy, price=20.0)
@@ -96,5 +192,262 @@ class TestModels(unittest.TestCase):
         with self.assertRaises(ValueError):
             Trade(stock=self.trade_stock, quantity=100, type=TradeType.Buy, price=20.0, date=future_date)
 
+    #==============================================================================
+
+    def test_trade_store_trades_since(self):
+        now = datetime.now()
+        store = TradeStore()
+        old_trade = Trade(self.common_stock, 10, TradeType.Buy, 15.0, now - timedelta(minutes=30))
+        recent_trade = Trade(self.common_stock, 5, TradeType.Sell, 18.0, now - timedelta(minutes=5))
+        other_trade = Trade(self.preferred_stock, 7, TradeType.Buy, 11.0, now - timedelta(minutes=1))
+        for trade in [recent_trade, other_trade, old_trade]:
+            store.add(trade)
+        self.assertEqual(len(store), 3)
+        self.assertEqual(store.trades_for("ABC"), [old_trade, recent_trade])
+        self.assertEqual(store.trades_since("ABC", now - timedelta(minutes=15)), [recent_trade])
+        self.assertEqual(store.trades_since("MISSING", now), [])
+
+    def test_calculate_volume_weighted_stock_price_trade_store(self):
+        store = TradeStore()
+        store.add(Trade(self.common_stock, 10, TradeType.Buy, 15.0, datetime.now() - timedelta(minutes=10)))
+        store.add(Trade(self.common_stock, 5, TradeType.Sell, 18.0, datetime.now() - timedelta(minutes=5)))
+        store.add(Trade(self.common_stock, 50, TradeType.Sell, 99.0, datetime.now() - timedelta(minutes=20)))
+        store.add(Trade(self.preferred_stock, 50, TradeType.Sell, 99.0, datetime.now() - timedelta(minutes=1)))
+
+        expected_price = (10 * 15.0 + 5 * 18.0) / (10 + 5)
+        self.assertAlmostEqual(self.common_stock.calculate_volume_weighted_stock_price(store), expected_price)
+
+    def test_vwsp_engine_expires_trades(self):
+        minute = 60 * 1_000_000_000
+        start = 1_700_000_000 * 1_000_000_000
+        engine = VwspEngine(timedelta(minutes=15))
+        engine.record("ABC", start, 10.0, 10, now_ns=start)
+        engine.record("ABC", start + 10 * minute, 20.0, 30, now_ns=start + 10 * minute)
+        self.assertAlmostEqual(engine.vwsp("ABC", now_ns=start + 10 * minute), (10 * 10.0 + 30 * 20.0) / 40)
+        self.assertAlmostEqual(engine.vwsp("ABC", now_ns=start + 15 * minute), 20.0)
+        self.assertEqual(engine.vwsp("ABC", now_ns=start + 30 * minute), 0)
+        self.assertEqual(engine.vwsp("MISSING", now_ns=start), 0)
+
+    def test_vwsp_engine_out_of_order_trades(self):
+        minute = 60 * 1_000_000_000
+        now = 1_700_000_000 * 1_000_000_000
+        engine = VwspEngine(timedelta(minutes=5))
+        engine.record("ABC", now - 1 * minute, 10.0, 10, now_ns=now)
+        engine.record("ABC", now - 4 * minute, 30.0, 10, now_ns=now)
+        engine.record("ABC", now - 10 * minute, 99.0, 10, now_ns=now)
+        self.assertAlmostEqual(engine.vwsp("ABC", now_ns=now), 20.0)
+        self.assertAlmostEqual(engine.vwsp("ABC", now_ns=now + 2 * minute), 10.0)
+
+    def test_vwsp_engine_bounded_without_queries(self):
+        second = 1_000_000_000
+        start = 1_700_000_000 * 1_000_000_000
+        engine = VwspEngine(timedelta(minutes=15))
+        for index in range(5000):
+            engine.record("ABC", start + index * second, 10.0 + index % 2, 10, now_ns=start + index * second)
+        self.assertEqual(len(engine._trades["ABC"]), 15 * 60)
+        self.assertAlmostEqual(engine.vwsp("ABC", now_ns=start + 4999 * second), 10.5)
+
+    def test_vwsp_engine_invalid_window(self):
+        with self.assertRaises(ValueError):
+            VwspEngine(timedelta(0))
+
+    def test_trade_store_vwsp_matches_trade_list(self):
+        store = TradeStore(timedelta(minutes=30))
+        trades = [
+            Trade(self.common_stock, 10, TradeType.Buy, 15.0, datetime.now() - timedelta(minutes=25)),
+            Trade(self.common_stock, 3, TradeType.Buy, 17.5, datetime.now() - timedelta(minutes=12)),
+            Trade(self.common_stock, 5, TradeType.Sell, 18.0, datetime.now() - timedelta(minutes=5)),
+        ]
+        for trade in trades:
+            store.add(trade)
+        self.assertAlmostEqual(
+            self.common_stock.calculate_volume_weighted_stock_price(store),
+            self.common_stock.calculate_volume_weighted_stock_price(trades, timedelta(minutes=30))
+        )
+
+    def test_trade_store_columnar_log(self):
+        now = datetime.now().replace(microsecond=0)
+        store = TradeStore()
+        store.add(Trade(self.common_stock, 10, TradeType.Buy, 15.0, now - timedelta(minutes=3)))
+        store.add(Trade(self.preferred_stock, 4, TradeType.Sell, 12.5, now - timedelta(minutes=2)))
+        store.add(Trade(self.common_stock, 5, TradeType.Sell, 18.0, now - timedelta(minutes=1)))
+        rows = list(store.iter_rows())
+        self.assertEqual(len(store), 3)
+        self.assertEqual([row[1] for row in rows], [0, 1, 0])
+        self.assertEqual([row[4] for row in rows], [TradeType.Buy.value, TradeType.Sell.value, TradeType.Sell.value])
+        self.assertEqual(store.totals_since("ABC", now - timedelta(minutes=15)), (10 * 15.0 + 5 * 18.0, 15))
+        trades = list(store)
+        self.assertEqual([trade.stock for trade in trades], [self.common_stock, self.preferred_stock, self.common_stock])
+        self.assertEqual(trades[1].date, now - timedelta(minutes=2))
+
+    def test_trade_store_retention(self):
+        start_ns = datetime_to_ns(datetime(2024, 1, 2, 9))
+        second_ns = 10**9
+        store = TradeStore(retention=timedelta(minutes=15), max_trades=500)
+        for second in range(3600):
+            store.record(self.common_stock, 1, TradeType.Buy, 10.0 + second, start_ns + second * second_ns)
+        store.record(self.preferred_stock, 1, TradeType.Buy, 5.0, start_ns)
+        trades = store.trades_for("ABC")
+        self.assertEqual(len(trades), 500)
+        self.assertEqual([trade.price for trade in trades], [10.0 + second for second in range(3100, 3600)])
+        self.assertLess(store.nbytes(), 2 * 500 * 64)
+        # An old trade arriving late is evicted straight away
+        store.record(self.common_stock, 1, TradeType.Buy, 1.0, start_ns)
+        self.assertEqual(len(store.trades_for("ABC")), 500)
+        self.assertEqual(len(store), sum(len(shard) for shard in store.shards()))
+        self.assertEqual(store.evict(ns_to_datetime(start_ns + 3600 * second_ns)), 1)
+        self.assertEqual(store.trades_for("XYZ"), [])
+        self.assertEqual(store.evict(ns_to_datetime(start_ns + 3600 * second_ns + 15 * 60 * second_ns)), 500)
+        self.assertEqual(len(store), 0)
+        with self.assertRaises(ValueError):
+            TradeStore(timedelta(minutes=15), retention=timedelta(minutes=5))
+
+    def test_trade_store_retention_bounds_vwsp(self):
+        second_ns = 10**9
+        clock = ManualClock(datetime_to_ns(datetime(2024, 1, 2, 9)))
+        store = TradeStore(retention=timedelta(minutes=15), clock=clock)
+        for second in range(10_000):
+            store.record(self.common_stock, 1, TradeType.Buy, float(second % 2), clock.now_ns())
+            clock.advance(timedelta(seconds=1))
+            if second == 5_000:
+                nbytes = store.nbytes()
+        # The symbol is never queried, its window and columns stay bounded all the same
+        shard = store.shards()[0]
+        self.assertEqual(len(store), 900)
+        self.assertEqual(shard.volume, 900)
+        self.assertLessEqual(len(shard.rows), 2 * (900 + SymbolTrades.COMPACT_MIN))
+        self.assertLessEqual(store.nbytes(), 2 * nbytes)
+        self.assertAlmostEqual(store.vwsp("ABC"), 450 / 899)
+
+    def test_trade_store_manual_clock(self):
+        clock = ManualClock(datetime_to_ns(datetime(2024, 1, 2, 9)))
+        market = Market([self.common_stock], clock=clock)
+        market.record_trade("ABC", 10, TradeType.Buy, 15.0)
+        clock.advance(timedelta(minutes=10))
+        market.record_trade("ABC", 5, TradeType.Sell, 18.0)
+        self.assertAlmostEqual(market.vwsp("ABC"), (10 * 15.0 + 5 * 18.0) / 15)
+        clock.advance(timedelta(minutes=10))
+        self.assertAlmostEqual(market.vwsp("ABC"), 18.0)
+        with self.assertRaises(ValueError):
+            market.record_trade("ABC", 5, TradeType.Sell, 18.0, clock.now_ns() + 1)
+        self.assertEqual(market.trades.trades_for("ABC")[0].date, datetime(2024, 1, 2, 9))
+
+    def test_trade_store_concurrent_record(self):
+        now = datetime.now().replace(microsecond=0)
+        stocks = [Stock(f"S{index}", 1.0, 0, 1.0) for index in range(4)]
+        store = TradeStore()
+        threads_per_stock = 2
+        trades_per_thread = 2000
+        snapshots = []
+
+        def write(stock, offset):
+            for index in range(trades_per_thread):
+                store.add(Trade(stock, 1 + index % 5, TradeType.Buy, 10.0 + offset, now - timedelta(seconds=index % 60)))
+
+        def read(stock):
+            # Rows are read without building Trade objects, scaling is measured by benchmarks/bench_concurrency.py
+            for _ in range(20):
+                symbol_id = store.registry.id_of(stock.symbol)
+                rows = [row for shard in store.shards() if shard.symbol_id == symbol_id for row in shard.snapshot()]
+                snapshots.append(all(earlier[0] <= later[0] for earlier, later in zip(rows, rows[1:])))
+
+        threads = [threading.Thread(target=write, args=(stock, offset)) for stock in stocks for offset in range(threads_per_stock)]
+        threads += [threading.Thread(target=read, args=(stock,)) for stock in stocks]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        volume = threads_per_stock * sum(1 + index % 5 for index in range(trades_per_thread))
+        notional = sum((10.0 + offset) * (1 + index % 5) for offset in range(threads_per_stock) for index in range(trades_per_thread))
+        self.assertEqual(len(store), len(stocks) * threads_per_stock * trades_per_thread)
+        self.assertTrue(all(snapshots))
+        for stock in stocks:
+            self.assertEqual(store.totals_since(stock.symbol, now - timedelta(minutes=15)), (notional, volume))
+            self.assertAlmostEqual(store.vwsp(stock.symbol, now), notional / volume)
+
+    def test_bar_builder(self):
+        second = 1_000_000_000
+        base = 1_700_000_100 * second
+        builder = BarBuilder([timedelta(seconds=1), timedelta(minutes=1)])
+        builder.record("POP", base + second // 2, 2.0, 10)
+        builder.record("POP", base + second // 4, 1.0, 10)
+        builder.record("POP", base + 3 * second, 4.0, 20)
+        builder.record("pop", base + second // 2, 3.0, 5)
+        builder.record("POP", base - 30 * second, 5.0, 1)
+        bars = builder.bars("POP", timedelta(seconds=1))
+        self.assertEqual([bar.start_ns for bar in bars], [base - 30 * second, base, base + 3 * second])
+        self.assertEqual((bars[1].open, bars[1].high, bars[1].low, bars[1].close, bars[1].volume, bars[1].trades), (1.0, 3.0, 1.0, 3.0, 25, 3))
+        self.assertAlmostEqual(bars[1].vwap, (20 + 10 + 15) / 25)
+        minute = builder.bars("POP", timedelta(minutes=1))
+        self.assertEqual([(bar.start_ns, bar.open, bar.close, bar.volume) for bar in minute], [(base - 60 * second, 5.0, 5.0, 1), (base, 1.0, 4.0, 45)])
+        self.assertEqual([bar.start_ns for bar in builder.bars("pop", timedelta(seconds=1), base, base + 3 * second)], [base])
+        self.assertEqual(builder.latest("POP", timedelta(seconds=1)).close, 4.0)
+        self.assertEqual(builder.bars("TEA", timedelta(seconds=1)), [])
+        self.assertIsNone(builder.latest("TEA", timedelta(minutes=1)))
+        self.assertEqual(len(builder), 5)
+        with self.assertRaises(ValueError):
+            builder.bars("POP", timedelta(minutes=15))
+        with self.assertRaises(ValueError):
+            BarBuilder([timedelta(0)])
+
+    def test_bar_builder_follows_store(self):
+        stock = Stock("POP", 1.0, 0, 1.0)
+        store = TradeStore()
+        now_ns = datetime_to_ns(datetime.now())
+        store.record(stock, 10, TradeType.Buy, 2.0, now_ns - 5_000_000_000)
+        builder = BarBuilder()
+        builder.attach(store)
+        store.record(stock, 30, TradeType.Sell, 4.0, now_ns)
+        self.assertEqual(builder.symbols(), ["POP"])
+        self.assertEqual(sum(bar.volume for bar in builder.bars("POP", timedelta(seconds=1))), 40)
+        builder.detach(store)
+        store.record(stock, 30, TradeType.Sell, 4.0, now_ns)
+        self.assertEqual(builder.latest("POP", timedelta(minutes=15)).trades, 2)
+
+    def test_position_book_cost_methods(self):
+        stock = Stock("POP", 1.0, 0, 1.0)
+        fifo, average = PositionBook(), PositionBook(method=CostMethod.Average)
+        for book in [fifo, average]:
+            book.record(stock, 10, TradeType.Buy, 100.0)
+            book.record(stock, 10, TradeType.Buy, 110.0)
+            book.record(stock, 15, TradeType.Sell, 120.0)
+        position = fifo.position("pop")
+        self.assertEqual(position.quantity, 5)
+        self.assertAlmostEqual(position.average_cost, 110.0)
+        self.assertAlmostEqual(position.realized, 250.0)
+        self.assertAlmostEqual(position.unrealized, 50.0)
+        position = average.position("POP")
+        self.assertAlmostEqual(position.average_cost, 105.0)
+        self.assertAlmostEqual(position.realized, 225.0)
+        self.assertAlmostEqual(position.unrealized, 75.0)
+
+        # Selling more than the position closes it and opens a short one
+        fifo.record(stock, 10, TradeType.Sell, 130.0)
+        position = fifo.position("POP")
+        self.assertEqual((position.quantity, position.average_cost), (-5, 130.0))
+        self.assertAlmostEqual(position.realized, 350.0)
+        fifo.record(stock, 5, TradeType.Buy, 120.0)
+        self.assertEqual(fifo.position("POP"), dataclasses.replace(position, quantity=0, average_cost=0.0, realized=400.0, unrealized=0.0, price=120.0))
+        self.assertIsNone(fifo.position("TEA"))
+
+    def test_position_book_follows_store(self):
+        registry = SymbolRegistry([Stock("TEA", 0, 0, 1.0), Stock("POP", 1.0, 0, 1.0), Stock("GIN", 1.0, 0.02, 1.0, StockType.Preferred)])
+        store = TradeStore(registry=registry)
+        now_ns = datetime_to_ns(datetime.now())
+        store.record(registry.get("POP"), 10, TradeType.Buy, 2.0, now_ns - 5_000_000_000)
+        book = PositionBook(registry)
+        book.attach(store)
+        store.record(registry.get("GIN"), 4, TradeType.Sell, 5.0, now_ns)
+        store.record(registry.get("POP"), 4, TradeType.Sell, 3.0, now_ns)
+        self.assertEqual([position.symbol for position in book.positions()], ["POP", "GIN"])
+        self.assertEqual(book.totals(), (4.0, 6.0))
+        self.assertAlmostEqual(book.revalue([1.0, 2.5, 4.0]), 7.0)
+        self.assertAlmostEqual(book.revalue({"gin": 6.0}), -1.0)
+        with self.assertRaises(ValueError):
+            book.revalue([1.0] * 4)
+        book.detach(store)
+        store.record(registry.get("POP"), 6, TradeType.Sell, 3.0, now_ns)
+        self.assertEqual(len(book.positions(open_only=True)), 2)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
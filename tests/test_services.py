@@ -0,0 +1,223 @@
+import asyncio
+import io
+import json
+import os
+import tempfile
+import time
+import unittest
+from datetime import timedelta
+from models.stock import Stock, StockType
+from models.market import Market
+from models.trade import TradeType
+from services.batch import run_batch, execute_command
+from services.server import MarketServer, handle_request
+from services.pubsub import TickPipeline
+from services.replay import ReplayEngine, sample_writer
+from utils.clock import ManualClock
+from utils.trade_io import TRADE_FILE_HEADER, TRADE_RECORD, export_trades
+
+class TestServices(unittest.TestCase):
+
+    def setUp(self):
+        self.market = Market([
+            Stock("TEA", 0.0, 0, 1.0, StockType.Common),
+            Stock("POP", 0.08, 0, 1.0, StockType.Common),
+            Stock("GIN", 0.08, 0.02, 1.0, StockType.Preferred),
+        ])
+
+    def test_execute_command(self):
+        self.assertAlmostEqual(execute_command(self.market, ["yield", "gin", "2"]), 0.01)
+        self.assertAlmostEqual(execute_command(self.market, ["pe", "POP", "2"]), 25.0)
+        self.assertEqual(execute_command(self.market, ["trade", "POP", "buy", "10", "2.5"]), 1)
+        self.assertEqual(execute_command(self.market, ["trade", "POP", "Sell", "30", "3.5"]), 2)
+        self.assertAlmostEqual(execute_command(self.market, ["vwsp", "POP"]), 3.25)
+        self.assertAlmostEqual(execute_command(self.market, ["gbce", "1", "2", "4"]), 2.0)
+
+    def test_execute_command_invalid(self):
+        for tokens in [["vwsp", "XXX"], ["yield", "POP"], ["yield", "POP", "abc"], ["trade", "POP", "hold", "1", "1"],
+                       ["trade", "POP", "buy", "0", "1"], ["gbce", "1"], ["gbce", "1", "0", "2"], ["bogus"]]:
+            with self.assertRaises(ValueError):
+                execute_command(self.market, tokens)
+
+    def test_run_batch_json(self):
+        output = io.StringIO()
+        lines = ["# pricing run", "", "trade POP buy 10 2.5", "vwsp POP", "vwsp XXX"]
+        self.assertEqual(run_batch(self.market, lines, output), (2, 1))
+        results = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(results[0], {"line": 3, "op": "trade", "symbol": "POP", "result": 1})
+        self.assertEqual(results[1], {"line": 4, "op": "vwsp", "symbol": "POP", "result": 2.5})
+        self.assertEqual(results[2]["error"], "Invalid ticker XXX")
+
+    def test_run_batch_csv(self):
+        output = io.StringIO()
+        run_batch(self.market, ["pe POP 2", "gbce 1 2"], output, "csv")
+        self.assertEqual(output.getvalue().splitlines(), [
+            "line,op,symbol,result,error",
+            "1,pe,POP,25.0,",
+            '2,gbce,,,"Expected 3 prices, got 2"',
+        ])
+
+    #==============================================================================
+
+    def test_handle_request(self):
+        self.assertEqual(handle_request(self.market, {"id": 1, "op": "pe", "symbol": "POP", "price": 2}), {"id": 1, "result": 25.0})
+        self.assertEqual(handle_request(self.market, {"id": 2, "op": "trade", "symbol": "POP", "type": "buy", "quantity": 10, "price": 2.5}), {"id": 2, "result": 1})
+        self.assertEqual(handle_request(self.market, {"id": 3, "op": "vwsp", "symbol": "pop"}), {"id": 3, "result": 2.5})
+        self.assertAlmostEqual(handle_request(self.market, {"op": "gbce", "prices": [1, 2, 4]})["result"], 2.0)
+        self.assertEqual(handle_request(self.market, {"id": 4, "op": "vwsp"}), {"id": 4, "error": "Missing field 'symbol'"})
+        self.assertIn("error", handle_request(self.market, {"op": "trade", "symbol": "POP", "type": "buy", "quantity": "10", "price": 2.5}))
+        self.assertIn("error", handle_request(self.market, {"op": "unknown"}))
+        self.assertIn("error", handle_request(self.market, [1, 2]))
+
+    def test_market_server_pipelined_clients(self):
+        async def client(port, symbol, count):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            for request_id in range(count):
+                writer.write(json.dumps({"id": request_id, "op": "trade", "symbol": symbol, "type": "buy", "quantity": 1, "price": 2.0}).encode() + b"\n")
+            writer.write(json.dumps({"id": count, "op": "vwsp", "symbol": symbol}).encode() + b"\n")
+            writer.write(b"not json\n")
+            await writer.drain()
+            responses = [json.loads(await reader.readline()) for _ in range(count + 2)]
+            writer.close()
+            await writer.wait_closed()
+            return responses
+
+        async def scenario():
+            server = MarketServer(self.market, port=0)
+            port = await server.start()
+            try:
+                return await asyncio.gather(client(port, "POP", 50), client(port, "GIN", 50))
+            finally:
+                await server.close()
+
+        for responses in asyncio.run(scenario()):
+            self.assertEqual([response["id"] for response in responses[:51]], list(range(51)))
+            self.assertEqual(responses[50]["result"], 2.0)
+            self.assertEqual(responses[51], {"id": None, "error": "Invalid JSON"})
+        self.assertEqual(len(self.market.trades), 100)
+
+    def test_tick_pipeline_coalesces_updates(self):
+        pipeline = TickPipeline(self.market.trades, interval=60)
+        updates = []
+        pipeline.subscribe(updates.append)
+        pop = self.market.find_stock("POP")
+        now_ns = time.time_ns()
+        for index in range(1000):
+            pipeline.publish_trade(pop, 10, TradeType.Buy, 2.0 + index % 2, now_ns)
+        self.market.record_trade("TEA", 5, TradeType.Sell, 4.0)
+        pipeline.publish_price("GIN", 2.0)
+        pipeline.publish_price("GIN", 8.0)
+        self.assertIsNone(pipeline.poll())
+        update = pipeline.flush()
+        self.assertEqual(updates, [update])
+        self.assertAlmostEqual(update.vwsp["POP"], 2.5)
+        self.assertAlmostEqual(update.vwsp["TEA"], 4.0)
+        self.assertNotIn("GIN", update.vwsp)
+        self.assertEqual(update.prices, {"POP": 3.0, "TEA": 4.0, "GIN": 8.0})
+        self.assertAlmostEqual(update.gbce, (3.0 * 4.0 * 8.0) ** (1 / 3))
+        self.assertIsNone(pipeline.flush())
+        pipeline.publish_price("POP", 1.0)
+        self.assertAlmostEqual(pipeline.flush().gbce, (1.0 * 4.0 * 8.0) ** (1 / 3))
+        pipeline.close()
+        self.market.record_trade("TEA", 5, TradeType.Sell, 4.0)
+        self.assertIsNone(pipeline.flush())
+
+    def test_tick_pipeline_validates_trades(self):
+        clock = ManualClock(1_700_000_000 * 1_000_000_000)
+        market = Market(self.market.stocks, clock=clock)
+        pipeline = TickPipeline(market.trades, interval=60)
+        pop = market.find_stock("POP")
+        for arguments, message in [((None, 10, 2.0), "Invalid Trade stock"), ((pop, 0, 2.0), "Invalid Trade quantity"),
+                                   ((pop, 10, -2.0), "Invalid Trade price"), ((pop, 10, 2.0, clock.now_ns() + 1), "Invalid Trade date")]:
+            with self.assertRaisesRegex(ValueError, message):
+                pipeline.publish_trade(arguments[0], arguments[1], TradeType.Buy, *arguments[2:])
+        self.assertEqual(len(market.trades), 0)
+        self.assertIsNone(pipeline.flush())
+        pipeline.publish_trade(pop, 10, TradeType.Buy, 2.0)
+        update = pipeline.flush()
+        self.assertEqual(update.timestamp_ns, clock.now_ns())
+        self.assertEqual(next(market.trades.iter_rows())[0], clock.now_ns())
+        pipeline.close()
+
+    def test_tick_pipeline_background_flush(self):
+        pipeline = TickPipeline(self.market.trades, interval=0.01)
+        updates = []
+        pipeline.subscribe(updates.append)
+        pipeline.start()
+        self.market.record_trade("POP", 10, TradeType.Buy, 2.0)
+        deadline = time.monotonic() + 5
+        while not updates and time.monotonic() < deadline:
+            time.sleep(0.01)
+        pipeline.close()
+        self.assertEqual(updates[0].vwsp, {"POP": 2.0})
+
+    def test_replay_engine(self):
+        base = 1_700_000_040 * 1_000_000_000
+        minute = 60 * 1_000_000_000
+        pop, tea = self.market.find_stock("POP"), self.market.find_stock("TEA")
+        second = 1_000_000_000
+        records = [(base + 5 * second, 0, 1, 10, 2.0), (base + 10 * second, 1, 2, 5, 4.0), (base + 65 * second, 0, 1, 30, 3.0), (base + 125 * second, 2, 1, 1, 1.0), (base + 245 * second, 0, 2, 10, 5.0)]
+        engine = ReplayEngine(self.market.stocks, interval=timedelta(minutes=1), window=timedelta(minutes=2))
+        samples = []
+        stats = engine.run(records, [pop, tea, None], samples.append)
+        self.assertEqual((stats.trades, stats.skipped, stats.samples), (4, 1, 5))
+        self.assertEqual([sample.timestamp_ns for sample in samples], [base + index * minute for index in range(1, 6)])
+        self.assertEqual(samples[0].vwsp, {"POP": 2.0, "TEA": 4.0})
+        self.assertAlmostEqual(samples[0].gbce, (2.0 * 4.0) ** 0.5)
+        self.assertAlmostEqual(samples[1].vwsp["POP"], (10 * 2.0 + 30 * 3.0) / 40)
+        self.assertEqual(samples[2].vwsp, {"POP": 3.0, "TEA": 0})
+        self.assertEqual(samples[3].vwsp, {"POP": 0, "TEA": 0})
+        self.assertEqual(samples[4].vwsp, {"POP": 5.0, "TEA": 0})
+        self.assertAlmostEqual(samples[4].gbce, (5.0 * 4.0) ** 0.5)
+        self.assertEqual(len(engine.store.trades_for("POP")), 1)
+        with self.assertRaises(ValueError):
+            ReplayEngine(self.market.stocks, interval=timedelta(0))
+        with self.assertRaises(ValueError):
+            ReplayEngine(self.market.stocks, speed=0)
+
+    def test_replay_file(self):
+        now_ns = time.time_ns()
+        self.market.record_trade("POP", 10, TradeType.Buy, 2.0, now_ns - 3_000_000_000)
+        self.market.record_trade("GIN", 4, TradeType.Sell, 3.0, now_ns - 2_000_000_000)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        file_path = os.path.join(directory.name, "session.trades")
+        self.assertEqual(export_trades(file_path, self.market.trades), 2)
+        output = io.StringIO()
+        stats = ReplayEngine(self.market.stocks, interval=timedelta(seconds=1), speed=1000).replay_file(file_path, sample_writer(output, "csv"))
+        self.assertEqual(stats.trades, 2)
+        rows = output.getvalue().splitlines()
+        self.assertEqual(rows[0], "timestamp,symbol,vwsp,gbce")
+        self.assertEqual(rows[-1].split(",")[1:3], ["GIN", "3.0"])
+        self.assertEqual(ReplayEngine(self.market.stocks).replay_file(os.path.join(directory.name, "missing"), print), "[Error] File does not exist")
+
+    def test_replay_corrupt_file(self):
+        now_ns = time.time_ns()
+        self.market.record_trade("POP", 10, TradeType.Buy, 2.0, now_ns - 3_000_000_000)
+        self.market.record_trade("GIN", 4, TradeType.Sell, 3.0, now_ns - 2_000_000_000)
+        self.market.record_trade("POP", 5, TradeType.Sell, 2.5, now_ns - 1_000_000_000)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        file_path = os.path.join(directory.name, "session.trades")
+        self.assertEqual(export_trades(file_path, self.market.trades), 3)
+        with open(file_path, "rb") as trade_file:
+            data = trade_file.read()
+        records = len(data) - 3 * TRADE_RECORD.size
+
+        def replay(corrupt):
+            corrupt_path = os.path.join(directory.name, "corrupt.trades")
+            with open(corrupt_path, "wb") as trade_file:
+                trade_file.write(corrupt)
+            return ReplayEngine(self.market.stocks, interval=timedelta(seconds=1)).replay_file(corrupt_path, lambda sample: None)
+
+        # Symbol index of the third record
+        offset = records + 2 * TRADE_RECORD.size + 8
+        self.assertEqual(replay(data[:offset] + (99).to_bytes(4, "little") + data[offset + 4:]), "[Error] Invalid symbol index 99 in trade file record 2")
+        # Side of the second record
+        offset = records + TRADE_RECORD.size + 12
+        self.assertEqual(replay(data[:offset] + bytes([7]) + data[offset + 1:]), "[Error] Invalid Trade type in trade file record 1")
+        self.assertEqual(replay(data[:-1]), "[Error] Truncated trade file")
+        self.assertEqual(replay(data[:TRADE_FILE_HEADER.size + 1]), "[Error] Truncated trade file")
+
+if __name__ == '__main__':
+    unittest.main()
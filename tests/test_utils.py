@@ -1,8 +1,24 @@
+import io
+import os
+import tempfile
 import unittest
+from contextlib import redirect_stdout
 from unittest.mock import mock_open, patch
-from datetime import datetime
-from utils.convert import try_parse_int, try_parse_float, timestamp_to_datetime
-from utils.csv import read_stock_data
+from datetime import datetime, timedelta
+from utils.convert import try_parse_int, try_parse_float, timestamp_to_datetime, datetime_to_ns, ns_to_datetime, timestamp_to_ns, parse_timestamps
+from utils.clock import ManualClock
+from utils.snapshot import source_fingerprint, write_snapshot, load_snapshot
+from utils.instrumentation import Instrumentation, LatencyHistogram, ProfileMode
+from utils.csv import read_stock_data, iter_stock_data, LoadStats, StockDataError, StockRowError, StockDataReloader
+from utils.parallel_csv import split_csv_file
+from utils.trade_io import import_trades_csv, import_trades, export_trades, export_bars, TRADE_RECORD
+from utils.journal import TradeJournal, FsyncPolicy, JOURNAL_HEADER, journal_record_size
+from utils.analytics import HAS_NUMPY, StockArrays, batch_analytics, batch_dividend_yield, batch_pe_ratio
+from models.stock import Stock, StockType
+from models.trade import Trade, TradeType
+from models.trade_store import TradeStore
+from models.bars import BarBuilder
+from models.symbol_registry import SymbolRegistry
 
 class TestUtils(unittest.TestCase):
     def setUp(self):
@@ -58,6 +74,41 @@ class TestUtils(unittest.TestCase):
         result = timestamp_to_datetime("invalid_timestamp")
         self.assertIsNone(result)
 
+    def test_datetime_to_ns_round_trip(self):
+        value = datetime(2024, 3, 1, 12, 30, 5, 123456)
+        self.assertEqual(datetime_to_ns(value) % 1_000_000_000, 123456000)
+        self.assertEqual(ns_to_datetime(datetime_to_ns(value)), value)
+
+    def test_timestamp_to_ns(self):
+        self.assertEqual(timestamp_to_ns("1700000000"), 1_700_000_000_000_000_000)
+        self.assertEqual(timestamp_to_ns("1700000000.123456789"), 1_700_000_000_123_456_789)
+        self.assertIsNone(timestamp_to_ns("invalid_timestamp"))
+        # Float formats, as accepted by timestamp_to_datetime
+        self.assertEqual(timestamp_to_ns("1.7e9"), 1_700_000_000_000_000_000)
+        self.assertEqual(timestamp_to_ns(" 1.7000000005E+9 "), 1_700_000_000_500_000_000)
+        self.assertEqual(timestamp_to_ns("-1.5"), -1_500_000_000)
+        self.assertEqual(timestamp_to_datetime("1.7e9"), ns_to_datetime(timestamp_to_ns("1.7e9")))
+        self.assertIsNone(timestamp_to_ns("inf"))
+        self.assertIsNone(timestamp_to_ns("1.2.3"))
+
+    def test_parse_timestamps(self):
+        values = ["2024-01-02T09:30:00.25", "2024-01-02 09:30:59", "2024-01-02T09:31", "2024-01-02T09:30:00+01:00",
+                  "1700000000.5", " 1700000000 ", "2024-01-02T09:30:60", "2024-13-02T09:30:00", "invalid_timestamp", "1.7e9"]
+        minute = datetime_to_ns(datetime(2024, 1, 2, 9, 30))
+        self.assertEqual(parse_timestamps(values), [
+            minute + 250_000_000, minute + 59_000_000_000, minute + 60_000_000_000,
+            datetime_to_ns(datetime.fromisoformat("2024-01-02T09:30:00+01:00")),
+            1_700_000_000_500_000_000, 1_700_000_000_000_000_000, None, None, None, 1_700_000_000_000_000_000,
+        ])
+
+    def test_manual_clock(self):
+        clock = ManualClock(1_700_000_000_000_000_000)
+        clock.advance(timedelta(seconds=1, microseconds=5))
+        self.assertEqual(clock.now_ns(), 1_700_000_001_000_005_000)
+        self.assertEqual(clock.now(), ns_to_datetime(1_700_000_001_000_005_000))
+        with self.assertRaises(ValueError):
+            clock.set(0)
+
 #================================================================
     def test_read_stock_data_invalid_patj(self):
         result = read_stock_data('invalid_path.csv', skip_on_error=True)
@@ -102,5 +153,480 @@ class TestUtils(unittest.TestCase):
                 result = read_stock_data('invalid_stock_data.csv', skip_on_error=False)
                 self.assertIsInstance(result, str)
 
+    def test_read_stock_data_reordered_headers(self):
+        reordered_csv_data = "type,symbol,par_value,last_dividend,fixed_dividend\nCommon,TEA,1.00,0.00,\nPreferred,GIN,1.00,0.08,0.02"
+        with patch('pathlib.Path.is_file', return_value=True):
+            with patch('builtins.open', new_callable=mock_open, read_data=reordered_csv_data):
+                result = read_stock_data('valid_stock_data.csv', skip_on_error=True)
+                self.assertEqual([stock.symbol for stock in result], ["TEA", "GIN"])
+                self.assertEqual(result[1].fixed_dividend, 0.02)
+
+    def test_read_stock_data_duplicate_symbols(self):
+        duplicate_csv_data = "symbol,type,last_dividend,fixed_dividend,par_value\nTEA,Common,0.00,,1.00\ntea,Common,0.10,,1.00\nPOP,Common,0.08,,1.00"
+        with patch('pathlib.Path.is_file', return_value=True):
+            with patch('builtins.open', new_callable=mock_open, read_data=duplicate_csv_data):
+                with redirect_stdout(io.StringIO()) as output:
+                    result = read_stock_data('duplicate_stock_data.csv', skip_on_error=True)
+                self.assertEqual([stock.symbol for stock in result], ["TEA", "POP"])
+                self.assertIn("Duplicate symbol tea in row 1", output.getvalue())
+            with patch('builtins.open', new_callable=mock_open, read_data=duplicate_csv_data):
+                self.assertEqual(read_stock_data('duplicate_stock_data.csv', skip_on_error=False), "[Error] Duplicate symbol tea in row 1")
+
+    def test_iter_stock_data_chunks_and_stats(self):
+        stats = LoadStats()
+        with patch('pathlib.Path.is_file', return_value=True):
+            with patch('builtins.open', new_callable=mock_open, read_data=self.invalid_csv_stock_data):
+                chunks = list(iter_stock_data('invalid_stock_data.csv', skip_on_error=True, chunk_size=2, stats=stats))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 1])
+        self.assertEqual((stats.rows, stats.loaded, stats.skipped), (5, 3, 2))
+        self.assertGreaterEqual(stats.rows_per_second, 0)
+
+    def test_iter_stock_data_errors(self):
+        with self.assertRaises(StockDataError):
+            list(iter_stock_data('invalid_path.csv'))
+        with patch('pathlib.Path.is_file', return_value=True):
+            with patch('builtins.open', new_callable=mock_open, read_data=self.invalid_csv_stock_data):
+                stocks = iter_stock_data('invalid_stock_data.csv', skip_on_error=False)
+                self.assertEqual(next(stocks).symbol.strip(), "TEA")
+                with self.assertRaises(StockRowError):
+                    next(stocks)
+
+    def _write_temp_csv(self, lines):
+        csv_file = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, newline='')
+        with csv_file:
+            csv_file.write('\n'.join(lines) + '\n')
+        self.addCleanup(os.remove, csv_file.name)
+        return csv_file.name
+
+    def _read_with_output(self, file_path, skip_on_error, workers):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            result = read_stock_data(file_path, skip_on_error=skip_on_error, workers=workers)
+        return result, output.getvalue()
+
+    def test_read_stock_data_parallel_matches_serial(self):
+        lines = ["symbol,type,last_dividend,fixed_dividend,par_value"]
+        for index in range(500):
+            if index % 97 == 0:
+                lines.append(f"S{index},wrong,0.1,,1.0")
+            elif index % 89 == 0:
+                lines.append(f"S{index},Common,0.1,,1.0,extra")
+            elif index % 83 == 0:
+                lines.append(f"S{index},Common,-1,,1.0")
+            elif index % 10 == 0:
+                lines.append(f"S{index},Preferred,0.08,0.02,100")
+            else:
+                lines.append(f"S{index},Common,{index / 1000},,1.0")
+        file_path = self._write_temp_csv(lines)
+        serial = self._read_with_output(file_path, True, workers=1)
+        self.assertEqual(serial, self._read_with_output(file_path, True, workers=3))
+        self.assertIn("Invalid type in row 97", serial[1])
+        self.assertIn("Additional columns detected in row 178", serial[1])
+        self.assertEqual(self._read_with_output(file_path, False, workers=1), self._read_with_output(file_path, False, workers=3))
+
+    def test_read_stock_data_parallel_invalid_headers(self):
+        file_path = self._write_temp_csv(["symbol,type,last_dividend", "TEA,Common,0.00"])
+        self.assertEqual(read_stock_data(file_path, workers=2), read_stock_data(file_path, workers=1))
+
+    def test_split_csv_file_line_boundaries(self):
+        file_path = self._write_temp_csv(["header"] + [f"row{index}" for index in range(100)])
+        ranges = split_csv_file(file_path, len("header\n"), 7)
+        self.assertEqual(ranges[0][0], len("header\n"))
+        self.assertEqual(ranges[-1][1], os.path.getsize(file_path))
+        with open(file_path, 'rb') as csv_file:
+            data = csv_file.read()
+        for start, end in ranges:
+            self.assertEqual(data[start - 1:start], b'\n')
+            self.assertEqual(data[end - 1:end], b'\n')
+
+    def test_read_stock_data_parallel_quoted_fields(self):
+        lines = ["symbol,type,last_dividend,fixed_dividend,par_value"] + [f"S{index},Common,0.1,,1.0" for index in range(200)]
+        # A quoted field spanning lines, and a symbol outside ASCII
+        lines[100:100] = ['"MULTI', 'LINE",Common,0.1,,1.0', "ÉLAN,Common,0.2,,1.0"]
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        file_path = os.path.join(directory.name, "stocks.csv")
+        with open(file_path, 'w', encoding='utf-8', newline='') as csv_file:
+            csv_file.write('\n'.join(lines) + '\n')
+        self.assertEqual(split_csv_file(file_path, len(lines[0]) + 1, 4), [(len(lines[0]) + 1, os.path.getsize(file_path))])
+        serial = self._read_with_output(file_path, True, workers=1)
+        self.assertEqual(serial, self._read_with_output(file_path, True, workers=3))
+        self.assertEqual(len(serial[0]), 202)
+        self.assertIn("ÉLAN", [stock.symbol for stock in serial[0]])
+
+#================================================================
+    def _trade_stocks(self):
+        stocks = {stock.symbol: stock for stock in [Stock("TEA", 0.0, 0, 1.0), Stock("GIN", 0.08, 0.02, 1.0, StockType.Preferred)]}
+        return stocks, stocks.get
+
+    def test_import_trades_csv(self):
+        stocks, find_stock = self._trade_stocks()
+        now = datetime.now().timestamp()
+        file_path = self._write_temp_csv([
+            "symbol,type,quantity,price,timestamp",
+            f"TEA,Buy,10,15.0,{now - 60}",
+            f"GIN,sell,5,18.5,{(datetime.now() - timedelta(seconds=30)).isoformat()}",
+            f"TEA,Hold,5,18.5,{now - 30}",
+            f"ZZZ,Buy,5,18.5,{now - 30}",
+            f"TEA,Sell,2,16.0,{now - 10}",
+        ])
+        for workers in [1, 2]:
+            store = TradeStore()
+            output = io.StringIO()
+            with redirect_stdout(output):
+                self.assertEqual(import_trades_csv(file_path, store, find_stock, workers=workers), 3)
+            self.assertIn("Invalid Trade type in row 2", output.getvalue())
+            self.assertIn("Invalid Trade stock in row 3", output.getvalue())
+            self.assertAlmostEqual(store.vwsp("TEA"), (10 * 15.0 + 2 * 16.0) / 12)
+            self.assertEqual([trade.type for trade in store.trades_for("GIN")], [TradeType.Sell])
+        self.assertEqual(import_trades_csv(file_path, TradeStore(), find_stock, skip_on_error=False), "[Error] Invalid Trade type in row 2")
+        # Read in batches, rows are numbered across them
+        with patch('utils.trade_io.IMPORT_BATCH', 2), redirect_stdout(io.StringIO()):
+            store = TradeStore()
+            self.assertEqual(import_trades_csv(file_path, store, find_stock), 3)
+            self.assertEqual(import_trades_csv(file_path, TradeStore(), find_stock, skip_on_error=False), "[Error] Invalid Trade type in row 2")
+        self.assertAlmostEqual(store.vwsp("TEA"), (10 * 15.0 + 2 * 16.0) / 12)
+
+    def test_import_trades_csv_invalid_headers(self):
+        file_path = self._write_temp_csv(["symbol,type,quantity", "TEA,Buy,10"])
+        self.assertIsInstance(import_trades_csv(file_path, TradeStore(), self._trade_stocks()[1]), str)
+        self.assertIsInstance(import_trades_csv('invalid_path.csv', TradeStore(), self._trade_stocks()[1]), str)
+
+    def test_export_import_trades_binary(self):
+        stocks, find_stock = self._trade_stocks()
+        store = TradeStore()
+        store.add(Trade(stocks["TEA"], 10, TradeType.Buy, 15.0, datetime.now() - timedelta(minutes=2)))
+        store.add(Trade(stocks["GIN"], 4, TradeType.Sell, 12.5, datetime.now() - timedelta(minutes=1)))
+        store.add(Trade(stocks["TEA"], 5, TradeType.Sell, 18.0, datetime.now() - timedelta(minutes=3)))
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        file_path = os.path.join(directory.name, "session.trades")
+        self.assertEqual(export_trades(file_path, store), 3)
+
+        restored = TradeStore()
+        self.assertEqual(import_trades(file_path, restored, find_stock), 3)
+        self.assertEqual(list(restored), list(store))
+        self.assertAlmostEqual(restored.vwsp("TEA"), store.vwsp("TEA"))
+        self.assertEqual(import_trades(file_path, TradeStore(), lambda symbol: None), "[Error] Unknown symbol TEA in trade file")
+
+        # An invalid record past valid ones imports nothing
+        partial = TradeStore()
+        self.assertEqual(import_trades(file_path, partial, lambda symbol: stocks["TEA"] if symbol == "TEA" else None), "[Error] Unknown symbol GIN in trade file")
+        self.assertEqual(len(partial), 0)
+        with open(file_path, 'r+b') as trade_file:
+            trade_file.seek(-TRADE_RECORD.size + 12, os.SEEK_END)
+            trade_file.write(bytes([7]))
+        self.assertEqual(import_trades(file_path, partial, find_stock), "[Error] Invalid Trade type in trade file record 2")
+        self.assertEqual(len(partial), 0)
+
+    def test_export_bars(self):
+        builder = BarBuilder([timedelta(seconds=1), timedelta(minutes=1)])
+        builder.record("TEA", 1_700_000_100_500_000_000, 2.0, 10)
+        builder.record("TEA", 1_700_000_101_500_000_000, 4.0, 30)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        file_path = os.path.join(directory.name, "bars.csv")
+        self.assertEqual(export_bars(file_path, builder, [timedelta(minutes=1)]), 1)
+        with open(file_path) as csv_file:
+            self.assertEqual(csv_file.read().splitlines(), [
+                "symbol,interval,start,open,high,low,close,volume,vwap,trades",
+                "TEA,60.0,1700000100000000000,2.0,4.0,2.0,4.0,40,3.5,2",
+            ])
+        self.assertEqual(export_bars(file_path, builder), 3)
+        self.assertIsInstance(export_bars(file_path, builder, [timedelta(hours=1)]), str)
+        self.assertIsInstance(export_bars(os.path.join(directory.name, "missing", "bars.csv"), builder), str)
+
+    def test_latency_histogram(self):
+        histogram = LatencyHistogram()
+        self.assertEqual(histogram.percentile(0.5), 0)
+        for value in range(1, 10001):
+            histogram.record(value * 1000)
+        self.assertEqual((histogram.count, histogram.min_ns, histogram.max_ns), (10000, 1000, 10_000_000))
+        self.assertAlmostEqual(histogram.mean_ns, 5_000_500)
+        for fraction in [0.5, 0.9, 0.99]:
+            exact = fraction * 10_000_000
+            self.assertGreaterEqual(histogram.percentile(fraction), exact)
+            self.assertLessEqual(histogram.percentile(fraction), exact * 1.07)
+        self.assertEqual(histogram.percentile(1.0), 10_000_000)
+        histogram.clear()
+        self.assertEqual(histogram.count, 0)
+
+    def test_instrumentation(self):
+        instrumentation = Instrumentation()
+        self.addCleanup(instrumentation.disable)
+        original_yield, original_gbce = Stock.calculate_dividend_yield, Stock.__dict__['calculate_gbce_index']
+        stock = Stock("POP", 8.0, 0, 100.0)
+        instrumentation.enable(['models.stock:Stock.calculate_dividend_yield', 'models.stock:Stock.calculate_gbce_index'])
+        self.assertIsNot(Stock.calculate_dividend_yield, original_yield)
+        for _ in range(10):
+            self.assertAlmostEqual(stock.calculate_dividend_yield(4), 2.0)
+        self.assertAlmostEqual(Stock.calculate_gbce_index([1, 4]), 2.0)
+        numbers = instrumentation.snapshot()
+        self.assertEqual(numbers['Stock.calculate_dividend_yield']['calls'], 10)
+        self.assertEqual(numbers['Stock.calculate_gbce_index']['calls'], 1)
+        self.assertNotIn('Stock.calculate_pe_ratio', numbers)
+        self.assertIn('Stock.calculate_dividend_yield', instrumentation.report())
+
+        instrumentation.profile('Stock.calculate_gbce_index', ProfileMode.CProfile, max_calls=2)
+        for _ in range(5):
+            Stock.calculate_gbce_index([1, 4])
+        self.assertEqual(instrumentation.snapshot()['Stock.calculate_gbce_index']['calls'], 4)
+        self.assertIn('over 2 calls', instrumentation.profile_report('Stock.calculate_gbce_index'))
+        with self.assertRaises(ValueError):
+            instrumentation.profile('Stock.calculate_pe_ratio')
+
+        instrumentation.disable()
+        self.assertIs(Stock.calculate_dividend_yield, original_yield)
+        self.assertIs(Stock.__dict__['calculate_gbce_index'], original_gbce)
+        stock.calculate_dividend_yield(4)
+        self.assertEqual(instrumentation.snapshot()['Stock.calculate_dividend_yield']['calls'], 10)
+        instrumentation.reset()
+        self.assertEqual(instrumentation.snapshot(), {})
+
+    def test_snapshot_round_trip(self):
+        stocks_path = self._write_temp_csv(["symbol,type,last_dividend,fixed_dividend,par_value", "TEA,Common,0,,100", "GIN,Preferred,8,0.02,100"])
+        fingerprint = source_fingerprint(stocks_path)
+        registry = SymbolRegistry(read_stock_data(stocks_path))
+        store = TradeStore(registry=registry)
+        now_ns = datetime_to_ns(datetime.now())
+        store.record(registry.get("GIN"), 4, TradeType.Sell, 12.5, now_ns - 60_000_000_000)
+        store.record(registry.get("TEA"), 10, TradeType.Buy, 15.0, now_ns - 30_000_000_000)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        file_path = os.path.join(directory.name, "market.snapshot")
+        self.assertEqual(write_snapshot(file_path, fingerprint, registry, store), 2)
+
+        restored_registry, restored = load_snapshot(file_path, fingerprint, lambda registry: TradeStore(registry=registry))
+        self.assertEqual(list(restored_registry), list(registry))
+        self.assertEqual(restored_registry.id_of("gin"), registry.id_of("GIN"))
+        self.assertAlmostEqual(restored_registry.get("GIN").calculate_dividend_yield(4), 0.5)
+        self.assertEqual(list(restored), list(store))
+        self.assertAlmostEqual(restored.vwsp("TEA"), 15.0)
+        self.assertEqual(len(load_snapshot(file_path, fingerprint, lambda registry: TradeStore(registry=registry), include_trades=False)[1]), 0)
+
+        self.assertEqual(load_snapshot(file_path, (fingerprint[0] + 1, fingerprint[1]), TradeStore), "[Error] Stale snapshot, the stock data file changed")
+        self.assertEqual(load_snapshot(file_path, fingerprint, TradeStore, trades_fingerprint=(10, 20)), "[Error] Stale snapshot, the trade file changed")
+        self.assertEqual(write_snapshot(file_path, fingerprint, registry, store, (10, 20)), 2)
+        self.assertEqual(load_snapshot(file_path, fingerprint, TradeStore), "[Error] Stale snapshot, the trade file changed")
+        self.assertEqual(len(load_snapshot(file_path, fingerprint, lambda registry: TradeStore(registry=registry), trades_fingerprint=(10, 20))[1]), 2)
+        self.assertEqual(len(load_snapshot(file_path, fingerprint, lambda registry: TradeStore(registry=registry), include_trades=False)[1]), 0)
+        self.assertEqual(write_snapshot(file_path, fingerprint, registry, store), 2)
+        with open(file_path, 'r+b') as snapshot_file:
+            snapshot_file.truncate(os.path.getsize(file_path) - 1)
+        self.assertEqual(load_snapshot(file_path, fingerprint, TradeStore), "[Error] Truncated snapshot")
+        self.assertEqual(load_snapshot(stocks_path, fingerprint, TradeStore), "[Error] Invalid snapshot")
+        self.assertEqual(load_snapshot(file_path + ".missing", fingerprint, TradeStore), "[Error] Snapshot does not exist")
+
+    def test_stock_data_reloader(self):
+        header = "symbol,type,last_dividend,fixed_dividend,par_value"
+        rows = ["TEA,Common,0,,100", "POP,Common,8,,100", "GIN,Preferred,8,0.02,100"]
+        stocks_path = self._write_temp_csv([header] + rows)
+        registry = SymbolRegistry(read_stock_data(stocks_path))
+        store = TradeStore(registry=registry)
+        store.record(registry.get("POP"), 10, TradeType.Buy, 16.0, datetime_to_ns(datetime.now()))
+        reloader = StockDataReloader(stocks_path, registry)
+        self.assertEqual(reloader.prime(), 3)
+
+        # One changed row is parsed, the stock keeps its symbol id and its trades
+        with open(stocks_path, 'w') as csv_file:
+            csv_file.write('\n'.join([header, rows[0], "POP,Common,4,,100", rows[2]]) + '\n')
+        stats = reloader.reload()
+        self.assertEqual((stats.parsed, stats.added, stats.changed, stats.removed), (1, [], ["POP"], []))
+        self.assertEqual(registry.id_of("POP"), 1)
+        self.assertAlmostEqual(registry.get("POP").calculate_dividend_yield(2), 2.0)
+        self.assertIs(store.trades_for("POP")[0].stock, registry.get("POP"))
+        self.assertAlmostEqual(store.vwsp("POP"), 16.0)
+
+        # Moved rows are not parsed, removed stocks stay registered
+        with open(stocks_path, 'w') as csv_file:
+            csv_file.write('\n'.join([header, rows[2], "POP,Common,4,,100", "ALE,Common,23,,60"]) + '\n')
+        stats = reloader.reload()
+        self.assertEqual((stats.parsed, stats.added, stats.changed, stats.removed), (1, ["ALE"], [], ["TEA"]))
+        self.assertEqual(len(registry), 4)
+        self.assertEqual(reloader.reload().parsed, 0)
+
+        # Invalid rows are skipped, or abort the reload without applying anything
+        with open(stocks_path, 'w') as csv_file:
+            csv_file.write('\n'.join([header, "GIN,Preferred,9,0.02,100", "POP,Common,4,,100", "ALE,Common,23,,60", "pop,Common,1,,1", "BAD,wrong,1,,1"]) + '\n')
+        self.assertEqual(StockDataReloader(stocks_path, registry, skip_on_error=False).reload(), "[Error] Duplicate symbol pop in row 3")
+        with redirect_stdout(io.StringIO()):
+            stats = reloader.reload()
+        # The new pop row makes the unchanged POP row parsed again, the first row wins
+        self.assertEqual((stats.parsed, stats.changed, stats.skipped), (4, ["GIN"], 2))
+        self.assertAlmostEqual(registry.get("POP").last_dividend, 4)
+        self.assertEqual(StockDataReloader(stocks_path + ".missing", registry).reload(), "[Error] Invalid csv file. File does not exist")
+
+    def test_stock_data_reloader_duplicate_symbols(self):
+        header = "symbol,type,last_dividend,fixed_dividend,par_value"
+        stocks_path = self._write_temp_csv([header, "TEA,Common,1,,100", "POP,Common,8,,100", "TEA,Common,2,,100"])
+        with redirect_stdout(io.StringIO()):
+            registry = SymbolRegistry(read_stock_data(stocks_path))
+        reloader = StockDataReloader(stocks_path, registry)
+        reloader.prime()
+
+        def reload(rows):
+            with open(stocks_path, 'w') as csv_file:
+                csv_file.write('\n'.join([header] + rows) + '\n')
+            with redirect_stdout(io.StringIO()):
+                stats = reloader.reload()
+            with redirect_stdout(io.StringIO()):
+                expected = {stock.symbol: stock for stock in read_stock_data(stocks_path)}
+            self.assertEqual({symbol: registry.get(symbol) for symbol in expected}, expected)
+            return stats
+
+        # Editing the first row of a pair keeps it the winner
+        self.assertEqual(reload(["TEA,Common,3,,100", "POP,Common,8,,100", "TEA,Common,2,,100"]).changed, ["TEA"])
+        self.assertEqual(registry.get("TEA").last_dividend, 3)
+        # The later row takes over once the first is removed, invalid or renamed
+        self.assertEqual(reload(["GIN,Common,3,,100", "POP,Common,8,,100", "TEA,Common,2,,100"]).changed, ["TEA"])
+        self.assertEqual(registry.get("TEA").last_dividend, 2)
+        self.assertEqual(reload(["TEA,Common,5,,100", "POP,Common,8,,100", "TEA,Common,2,,100"]).changed, ["TEA"])
+        self.assertEqual(reload(["TEA,Wrong,5,,100", "POP,Common,8,,100", "TEA,Common,2,,100"]).changed, ["TEA"])
+        self.assertEqual(registry.get("TEA").last_dividend, 2)
+        # Moving the rows of a pair changes the winner
+        self.assertEqual(reload(["POP,Common,8,,100", "TEA,Common,2,,100", "TEA,Common,5,,100"]).changed, [])
+        self.assertEqual(reload(["TEA,Common,5,,100", "TEA,Common,2,,100", "POP,Common,8,,100", "ALE,Common,1,,100"]).changed, ["TEA"])
+        self.assertEqual(registry.get("TEA").last_dividend, 5)
+        self.assertEqual(reload(["TEA,Common,2,,100"]).removed, ["POP", "ALE"])
+
+    def _journal_path(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return os.path.join(directory.name, "trades.journal")
+
+    def test_trade_journal_recovery(self):
+        stocks, find_stock = self._trade_stocks()
+        file_path = self._journal_path()
+        store = TradeStore()
+        with TradeJournal(file_path, FsyncPolicy.Batch, batch_size=2, initial_capacity=2) as journal:
+            store.journal = journal
+            for minutes in [5, 4, 3]:
+                store.add(Trade(stocks["TEA"], minutes, TradeType.Buy, 10.0 + minutes, datetime.now() - timedelta(minutes=minutes)))
+            store.add(Trade(stocks["GIN"], 7, TradeType.Sell, 12.0, datetime.now() - timedelta(minutes=1)))
+            self.assertEqual(len(journal), 4)
+
+        recovered = TradeStore()
+        with TradeJournal(file_path) as journal:
+            self.assertEqual(len(journal), 4)
+            self.assertEqual(journal.replay(recovered, find_stock), 4)
+        self.assertEqual(list(recovered), list(store))
+        self.assertAlmostEqual(recovered.vwsp("TEA"), store.vwsp("TEA"))
+
+    def test_trade_journal_torn_record(self):
+        stocks, find_stock = self._trade_stocks()
+        file_path = self._journal_path()
+        with TradeJournal(file_path, FsyncPolicy.Always) as journal:
+            journal.append("TEA", TradeType.Buy.value, 10, 15.0, datetime_to_ns(datetime.now()))
+            journal.append("TEA", TradeType.Sell.value, 5, 16.0, datetime_to_ns(datetime.now()))
+        with open(file_path, 'r+b') as journal_file:
+            journal_file.seek(JOURNAL_HEADER.size + journal_record_size(3) + 20)
+            journal_file.write(b'\xff')
+
+        with TradeJournal(file_path, FsyncPolicy.Never) as journal:
+            self.assertEqual(len(journal), 1)
+            journal.append("GIN", TradeType.Buy.value, 1, 2.0, datetime_to_ns(datetime.now()))
+        store = TradeStore()
+        with TradeJournal(file_path) as journal:
+            self.assertEqual(journal.replay(store, find_stock), 2)
+        self.assertEqual(store.symbols(), ["TEA", "GIN"])
+
+    def test_trade_journal_invalid(self):
+        file_path = self._journal_path()
+        with open(file_path, 'wb') as journal_file:
+            journal_file.write(b'not a journal file')
+        with self.assertRaises(ValueError):
+            TradeJournal(file_path)
+
+    def test_trade_journal_long_symbols(self):
+        long_stock = Stock("LONGER_THAN_SIXTEEN_BYTES", 1.0, 0, 1.0)
+        stocks = {stock.symbol: stock for stock in [long_stock, Stock("TEA", 0, 0, 1.0)]}
+        file_path = self._journal_path()
+        store = TradeStore()
+        now_ns = datetime_to_ns(datetime.now())
+        with TradeJournal(file_path, initial_capacity=1) as journal:
+            store.journal = journal
+            for index in range(5):
+                store.record(stocks["TEA" if index % 2 else long_stock.symbol], index + 1, TradeType.Buy, 2.0, now_ns + index)
+            self.assertEqual(len(journal), 5)
+        recovered = TradeStore()
+        with TradeJournal(file_path) as journal:
+            self.assertEqual(journal.replay(recovered, stocks.get), 5)
+        self.assertEqual(list(recovered), list(store))
+
+        # A trade the journal rejects is not recorded
+        with TradeJournal(self._journal_path()) as journal:
+            store = TradeStore()
+            store.journal = journal
+            with self.assertRaises(ValueError):
+                store.record(Stock("A" * 70000, 1.0, 0, 1.0), 1, TradeType.Buy, 1.0, now_ns)
+            self.assertEqual((len(store), len(journal)), (0, 0))
+
+    def test_trade_journal_zero_capacity(self):
+        file_path = self._journal_path()
+        now_ns = datetime_to_ns(datetime.now())
+        with TradeJournal(file_path, initial_capacity=0) as journal:
+            for index in range(3):
+                journal.append("TEA", TradeType.Buy.value, index + 1, 2.0, now_ns + index)
+        with TradeJournal(file_path) as journal:
+            self.assertEqual(len(journal), 3)
+        # A journal cut back to its header grows again as well
+        with open(file_path, 'r+b') as journal_file:
+            journal_file.truncate(JOURNAL_HEADER.size)
+        with TradeJournal(file_path) as journal:
+            self.assertEqual(len(journal), 0)
+            journal.append("POP", TradeType.Sell.value, 4, 3.0, now_ns)
+        with TradeJournal(file_path) as journal:
+            self.assertEqual(len(journal), 1)
+
+    def test_trade_store_retention_archive(self):
+        stocks, find_stock = self._trade_stocks()
+        start_ns = datetime_to_ns(datetime(2024, 1, 2, 9))
+        minute_ns = 60 * 10**9
+        store = TradeStore(retention=timedelta(minutes=30))
+        with TradeJournal(self._journal_path()) as archive:
+            store.archive = archive
+            for minute in range(120):
+                store.record(stocks["TEA"], minute + 1, TradeType.Buy, 1.0, start_ns + minute * minute_ns)
+            self.assertEqual(len(store), 30)
+            self.assertEqual(len(archive), 90)
+            restored = TradeStore()
+            self.assertEqual(archive.replay(restored, find_stock), 90)
+        self.assertEqual([trade.quantity for trade in restored], list(range(1, 91)))
+        self.assertEqual([trade.quantity for trade in store], list(range(91, 121)))
+
+#================================================================
+    def _analytics_stocks(self):
+        return [
+            Stock("TEA", 0.0, 0, 1.0, StockType.Common),
+            Stock("POP", 0.08, 0, 1.0, StockType.Common),
+            Stock("GIN", 0.08, 0.02, 100.0, StockType.Preferred),
+        ]
+
+    def _assert_analytics_match_scalar(self, use_numpy):
+        stocks = self._analytics_stocks()
+        prices = [10.0, 0.0, 2.5]
+        trades = TradeStore()
+        trades.add(Trade(stocks[1], 10, TradeType.Buy, 4.0, datetime.now() - timedelta(minutes=1)))
+        arrays = StockArrays(stocks, use_numpy=use_numpy)
+        yields, pe_ratios, vwsps = batch_analytics(arrays, prices, trades)
+        for index, stock in enumerate(stocks):
+            self.assertAlmostEqual(yields[index], stock.calculate_dividend_yield(prices[index]))
+            self.assertAlmostEqual(pe_ratios[index], stock.calculate_pe_ratio(prices[index]))
+            self.assertAlmostEqual(vwsps[index], stock.calculate_volume_weighted_stock_price(trades))
+
+    def test_batch_analytics_pure_python(self):
+        self._assert_analytics_match_scalar(use_numpy=False)
+
+    @unittest.skipUnless(HAS_NUMPY, 'NumPy is not available')
+    def test_batch_analytics_numpy(self):
+        self._assert_analytics_match_scalar(use_numpy=True)
+
+    def test_batch_analytics_price_count_mismatch(self):
+        arrays = StockArrays(self._analytics_stocks(), use_numpy=False)
+        with self.assertRaises(ValueError):
+            batch_dividend_yield(arrays, [1.0])
+        with self.assertRaises(ValueError):
+            batch_pe_ratio(arrays, [1.0, 2.0])
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,101 @@
+from typing import Sequence
+from models.stock import Stock
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+HAS_NUMPY = np is not None
+
+class StockArrays():
+    """
+    Reference data of a list of stocks laid out as columns.
+    Built once per stock universe, so repricing the whole universe does not
+    dispatch on the stock type of every stock.
+    Attributes:
+    - symbols (list[str]): The symbols of the stocks.
+    - last_dividends (Sequence[float]): The last dividend of every stock.
+    - yield_numerators (Sequence[float]): Last dividend for common stocks, fixed dividend * par value for preferred stocks.
+    - use_numpy (bool): Whether the columns are NumPy arrays.
+    """
+
+    def __init__(self, stocks : Sequence[Stock], use_numpy : bool = HAS_NUMPY):
+        if use_numpy and not HAS_NUMPY:
+            raise ValueError('NumPy is not available')
+        self.use_numpy = use_numpy
+        self.symbols = [stock.symbol for stock in stocks]
+        last_dividends = [stock.last_dividend for stock in stocks]
+        yield_numerators = [stock.yield_numerator for stock in stocks]
+        if use_numpy:
+            self.last_dividends = np.asarray(last_dividends, dtype=np.float64)
+            self.yield_numerators = np.asarray(yield_numerators, dtype=np.float64)
+        else:
+            self.last_dividends = last_dividends
+            self.yield_numerators = yield_numerators
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+def _check_prices(stocks : StockArrays, prices : Sequence[float]) -> None:
+    """
+    Check that there is one price per stock.
+    Raises:
+    - ValueError: If the number of prices does not match the number of stocks.
+    """
+    if len(prices) != len(stocks):
+        raise ValueError(f'Expected {len(stocks)} prices, got {len(prices)}')
+
+def batch_dividend_yield(stocks : StockArrays, prices : Sequence[float]) -> Sequence[float]:
+    """
+    Calculate the dividend yield of every stock.
+    Args:
+    - stocks (StockArrays): The reference data of the stocks.
+    - prices (Sequence[float]): The current price of every stock, in the same order.
+    Returns:
+    - Sequence[float]: The dividend yields, 0 where the price is not positive.
+    """
+    _check_prices(stocks, prices)
+    if stocks.use_numpy:
+        prices = np.asarray(prices, dtype=np.float64)
+        return np.divide(stocks.yield_numerators, prices, out=np.zeros(len(prices)), where=prices > 0)
+    return [numerator / price if price > 0 else 0 for numerator, price in zip(stocks.yield_numerators, prices)]
+
+def batch_pe_ratio(stocks : StockArrays, prices : Sequence[float]) -> Sequence[float]:
+    """
+    Calculate the P/E ratio of every stock.
+    Args:
+    - stocks (StockArrays): The reference data of the stocks.
+    - prices (Sequence[float]): The current price of every stock, in the same order.
+    Returns:
+    - Sequence[float]: The P/E ratios, 0 where the last dividend is not positive.
+    """
+    _check_prices(stocks, prices)
+    if stocks.use_numpy:
+        prices = np.asarray(prices, dtype=np.float64)
+        return np.divide(prices, stocks.last_dividends, out=np.zeros(len(prices)), where=stocks.last_dividends > 0)
+    return [price / dividend if dividend > 0 else 0 for dividend, price in zip(stocks.last_dividends, prices)]
+
+def batch_vwsp(stocks : StockArrays, trades : 'TradeStore') -> Sequence[float]:
+    """
+    Get the volume weighted stock price of every stock.
+    Args:
+    - stocks (StockArrays): The reference data of the stocks.
+    - trades (TradeStore): The store holding the recorded trades.
+    Returns:
+    - Sequence[float]: The volume weighted stock prices, 0 for stocks without trades in the window.
+    """
+    values = [trades.vwsp(symbol) for symbol in stocks.symbols]
+    return np.asarray(values, dtype=np.float64) if stocks.use_numpy else values
+
+def batch_analytics(stocks : StockArrays, prices : Sequence[float], trades : 'TradeStore') -> tuple[Sequence[float], Sequence[float], Sequence[float]]:
+    """
+    Calculate dividend yield, P/E ratio and volume weighted stock price of every stock.
+    Args:
+    - stocks (StockArrays): The reference data of the stocks.
+    - prices (Sequence[float]): The current price of every stock, in the same order.
+    - trades (TradeStore): The store holding the recorded trades.
+    Returns:
+    - tuple[Sequence[float], Sequence[float], Sequence[float]]: The dividend yields, P/E ratios and volume weighted stock prices.
+    """
+    return batch_dividend_yield(stocks, prices), batch_pe_ratio(stocks, prices), batch_vwsp(stocks, trades)
@@ -0,0 +1,77 @@
+import time
+from datetime import datetime, timedelta
+from utils.convert import ns_to_datetime
+
+class SystemClock():
+    """
+    The wall clock, read as integer epoch nanoseconds.
+    """
+
+    def now_ns(self) -> int:
+        """
+        Get the current time.
+        Returns:
+        - int: The number of nanoseconds since the epoch.
+        """
+        return time.time_ns()
+
+    def now(self) -> datetime:
+        """
+        Get the current time as a datetime.
+        Returns:
+        - datetime: The current local time.
+        """
+        return datetime.now()
+
+class ManualClock():
+    """
+    A clock that only moves when told to, for tests and for replaying recorded trades.
+    Attributes:
+    - _now_ns (int): The current time as epoch nanoseconds.
+    """
+
+    def __init__(self, now_ns : int = 0):
+        self._now_ns = now_ns
+
+    def now_ns(self) -> int:
+        """
+        Get the current time.
+        Returns:
+        - int: The number of nanoseconds since the epoch.
+        """
+        return self._now_ns
+
+    def now(self) -> datetime:
+        """
+        Get the current time as a datetime.
+        Returns:
+        - datetime: The current local time, truncated to microseconds.
+        """
+        return ns_to_datetime(self._now_ns)
+
+    def set(self, now_ns : int) -> None:
+        """
+        Move the clock to a point in time.
+        Args:
+        - now_ns (int): The new time as epoch nanoseconds.
+        Raises:
+        - ValueError: If the new time is before the current time.
+        """
+        if now_ns < self._now_ns:
+            raise ValueError('Clock cannot move backwards')
+        self._now_ns = now_ns
+
+    def advance(self, delta : timedelta) -> None:
+        """
+        Move the clock forward.
+        Args:
+        - delta (timedelta): How far to move the clock.
+        Raises:
+        - ValueError: If the delta is negative.
+        """
+        self.set(self._now_ns + delta // timedelta(microseconds=1) * 1000)
+
+Clock = SystemClock | ManualClock
+
+# Shared wall clock, the default of every component taking a clock
+SYSTEM_CLOCK = SystemClock()
@@ -1,4 +1,6 @@
 from datetime import datetime
+from decimal import Decimal
+from typing import Iterable
 
 def try_parse_int(value:str) -> int|None:
     """
@@ -26,15 +28,129 @@ def try_parse_float(value:str) -> float|None:
     except ValueError:
         return None
 
-def timestamp_to_datetime(value:int) -> datetime|None:
+def timestamp_to_datetime(value:int|str) -> datetime|None:
     """
     Convert a timestamp to a datetime object.
     Args:
-    - value (int): The timestamp to be converted.
+    - value (int | str): The epoch timestamp in seconds to be converted.
     Returns:
     - datetime | None: The converted datetime object if successful, None otherwise.
     """
+    nanoseconds = timestamp_to_ns(value if isinstance(value, str) else str(value))
+    if nanoseconds is None:
+        return None
+    try:
+        return ns_to_datetime(nanoseconds)
+    except (ValueError, OverflowError, OSError):
+        return None
+
+def datetime_to_ns(value:datetime) -> int:
+    """
+    Convert a datetime object to epoch nanoseconds.
+    Args:
+    - value (datetime): The datetime to be converted.
+    Returns:
+    - int: The number of nanoseconds since the epoch.
+    """
+    return int(value.replace(microsecond=0).timestamp()) * 1_000_000_000 + value.microsecond * 1000
+
+def ns_to_datetime(value:int) -> datetime:
+    """
+    Convert epoch nanoseconds to a datetime object.
+    Args:
+    - value (int): The number of nanoseconds since the epoch.
+    Returns:
+    - datetime: The converted datetime, truncated to microseconds.
+    """
+    seconds, nanoseconds = divmod(value, 1_000_000_000)
+    return datetime.fromtimestamp(seconds).replace(microsecond=nanoseconds // 1000)
+
+def timestamp_to_ns(value:str) -> int|None:
+    """
+    Convert an epoch timestamp in seconds to epoch nanoseconds without going through float.
+    Args:
+    - value (str): The timestamp, with an optional fractional part or in any other float format such as 1.7e9.
+    Returns:
+    - int | None: The number of nanoseconds since the epoch if successful, None otherwise.
+    """
+    try:
+        value = value.strip()
+        seconds, _, fraction = value.partition('.')
+        if fraction.isdigit() and (seconds.lstrip('+-').isdigit() or seconds in ('', '-', '+')):
+            nanoseconds = int(fraction[:9].ljust(9, '0'))
+            seconds = int(seconds) if seconds.lstrip('+-') else 0
+            return seconds * 1_000_000_000 + (-nanoseconds if value.startswith('-') else nanoseconds)
+        if not fraction and seconds.lstrip('+-').isdigit():
+            return int(seconds) * 1_000_000_000
+        # Exponents and the other float formats are converted exactly as decimals
+        decimal = Decimal(value)
+        return int(decimal.scaleb(9)) if decimal.is_finite() else None
+    except (ArithmeticError, ValueError, TypeError, AttributeError):
+        return None
+
+def _iso_to_ns(value:str, minutes:dict[str, int]) -> int|None:
+    """
+    Convert an ISO-8601 date and time to epoch nanoseconds.
+    The date, hour and minute are converted once per distinct minute and
+    cached, the seconds and fraction are added as integers. Values with a
+    UTC offset go through datetime.fromisoformat.
+    Args:
+    - value (str): The date and time, naive values are local time.
+    - minutes (dict[str, int]): Epoch nanoseconds by date, hour and minute prefix, filled as values are converted.
+    Returns:
+    - int | None: The number of nanoseconds since the epoch if successful, None otherwise.
+    """
+    prefix = value[:16]
+    base = minutes.get(prefix)
+    if base is None:
+        try:
+            base = minutes[prefix] = datetime_to_ns(datetime.fromisoformat(prefix))
+        except ValueError:
+            return None
+    rest = value[16:]
+    if not rest:
+        return base
+    if rest[0] == ':' and rest[1:3].isdigit() and rest[1:3] < '60':
+        base += int(rest[1:3]) * 1_000_000_000
+        fraction = rest[3:]
+        if not fraction:
+            return base
+        if fraction[0] in '.,' and fraction[1:].isdigit():
+            return base + int(fraction[1:10].ljust(9, '0'))
     try:
-        return datetime.fromtimestamp(float(value))
-    except (ValueError, TypeError):
-        return None
\ No newline at end of file
+        return datetime_to_ns(datetime.fromisoformat(value))
+    except ValueError:
+        return None
+
+def parse_timestamps(values:Iterable[str]) -> list[int|None]:
+    """
+    Convert a column of timestamps to epoch nanoseconds.
+    Every value is either epoch seconds, with an optional fractional part, or
+    an ISO-8601 date and time such as 2024-01-02T09:30:00.250 or
+    2024-01-02 09:30:00+01:00. Naive ISO-8601 values are local time.
+    Args:
+    - values (Iterable[str]): The timestamps.
+    Returns:
+    - list[int | None]: The number of nanoseconds since the epoch of every value, None where it is invalid.
+    """
+    minutes : dict[str, int] = {}
+    results : list[int|None] = []
+    append = results.append
+    for value in values:
+        if value[4:5] == '-':
+            # ISO-8601, the seconds and fraction of a cached minute are added in one conversion
+            base = minutes.get(value[:16])
+            rest = value[16:]
+            if base is not None and rest[:1] == ':' and rest[1:3].isdigit() and rest[1:3] < '60' and (len(rest) == 3 or (rest[3] == '.' and rest[4:].isdigit())):
+                append(base + int(rest[1:3] + rest[4:13].ljust(9, '0')))
+            else:
+                append(_iso_to_ns(value.strip(), minutes))
+            continue
+        seconds, _, fraction = value.partition('.')
+        if seconds.isdigit() and (not fraction or fraction.isdigit()):
+            # Epoch seconds, the digits of the seconds and the fraction form the nanoseconds
+            append(int(seconds + fraction[:9].ljust(9, '0')))
+            continue
+        value = value.strip()
+        append(_iso_to_ns(value, minutes) if value[4:5] == '-' else timestamp_to_ns(value))
+    return results
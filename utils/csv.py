@@ -1,10 +1,63 @@
 import csv
+import time
+from collections import Counter
+from itertools import compress, count
+from operator import ne
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Iterator
 from models.stock import Stock,StockType
+from models.symbol_registry import SymbolRegistry
 from utils.convert import try_parse_float
+from utils.parallel_csv import CSV_ENCODING, read_csv_header, read_csv_piece, map_csv_pieces
 
 expected_csv_headers = ["symbol", "type", "last_dividend", "fixed_dividend", "par_value"]
 
+class StockDataError(Exception):
+    """
+    Raised when stock data cannot be loaded.
+    """
+
+class StockRowError(StockDataError):
+    """
+    Raised when a row of stock data is invalid and errors are not skipped.
+    """
+
+@dataclass
+class LoadStats():
+    """
+    Throughput of a stock data load.
+    Attributes:
+    - rows (int): The number of rows read.
+    - loaded (int): The number of stocks created.
+    - skipped (int): The number of rows skipped because of errors.
+    - elapsed (float): The load time in seconds.
+    """
+    rows: int = 0
+    loaded: int = 0
+    skipped: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        """
+        The number of rows read per second.
+        """
+        return self.rows / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self):
+        return f"Loaded {self.loaded} stocks from {self.rows} rows ({self.skipped} skipped) in {self.elapsed:.3f}s, {self.rows_per_second:,.0f} rows/s"
+
+def check_headers(headers : list[str]|None) -> bool:
+    """
+    Check that the CSV headers are exactly the expected columns, in any order.
+    Args:
+    - headers (list[str] | None): The headers of the CSV file.
+    Returns:
+    - bool: True if the headers are valid, False otherwise.
+    """
+    return headers is not None and len(headers) == len(expected_csv_headers) and set(headers) == set(expected_csv_headers)
+
 def check_file_exists(file_path : str) -> bool:
     """
     Check if a file exists at the specified path.
@@ -24,15 +77,72 @@ def load_csv(file_path : str) -> list[dict]|str:
     - list[dict] | str: A list of dictionaries representing rows if successful, an error message otherwise.
     """
     try:
-        with open(file_path,newline='') as csv_file:
+        with open(file_path,newline='',encoding=CSV_ENCODING) as csv_file:
             reader = csv.DictReader(csv_file, restval=None, restkey='additional_columns')
-            headers = reader.fieldnames
-            if headers != expected_csv_headers:
+            if not check_headers(reader.fieldnames):
                 return "Invalid headers in csv file"
             return [x for x in reader]
     except Exception as e:
         return str(e)
-        
+
+def iter_csv_rows(file_path : str) -> Iterator[dict]:
+    """
+    Lazily read the rows of a CSV file, one row at a time.
+    Args:
+    - file_path (str): The path to the CSV file.
+    Yields:
+    - dict: The next row of the file.
+    Raises:
+    - StockDataError: If the file cannot be read or its headers are invalid.
+    """
+    try:
+        with open(file_path,newline='',encoding=CSV_ENCODING) as csv_file:
+            reader = csv.DictReader(csv_file, restval=None, restkey='additional_columns')
+            if not check_headers(reader.fieldnames):
+                raise StockDataError("Invalid headers in csv file")
+            yield from reader
+    except StockDataError:
+        raise
+    except Exception as e:
+        raise StockDataError(str(e)) from e
+
+class _IndexedRowError(Exception):
+    """
+    Row error whose message is completed with the index of the row.
+    """
+
+def _build_stock(row : dict) -> Stock:
+    """
+    Build a Stock object from a dictionary.
+    Args:
+    - row (dict): The dictionary representing a row from the CSV file.
+    Returns:
+    - Stock: The initialized Stock object.
+    Raises:
+    - _IndexedRowError: If the row has an invalid type or additional columns.
+    - Exception: If the Stock cannot be created.
+    """
+    symbol = row['symbol']
+    stock_type = row['type'].lower().capitalize()
+    last_dividend = try_parse_float(row['last_dividend'])
+    fixed_dividend = try_parse_float(row['fixed_dividend'])
+    par_value = try_parse_float(row['par_value'])
+    additional_columns = row['additional_columns'] if 'additional_columns' in row else None
+    if stock_type not in ['Common','Preferred']:
+        raise _IndexedRowError('Invalid type in row')
+    else:
+        stock_type = StockType.Common if stock_type == 'Common' else StockType.Preferred
+
+    if additional_columns is not None and len(additional_columns) > 0:
+        raise _IndexedRowError('Additional columns detected in row')
+
+    return Stock(
+        symbol,
+        last_dividend,
+        fixed_dividend if fixed_dividend is not None else 0,
+        par_value,
+        type=stock_type
+    )
 
 def init_stock(row : dict, index : int) -> Stock|str:
     """
@@ -44,36 +154,126 @@ def init_stock(row : dict, index : int) -> Stock|str:
     - Stock | str: The initialized Stock object if successful, an error message otherwise.
     """
     try:
-        symbol = row['symbol']
-        stock_type = row['type'].lower().capitalize()
-        last_dividend = try_parse_float(row['last_dividend'])
-        fixed_dividend = try_parse_float(row['fixed_dividend'])
-        par_value = try_parse_float(row['par_value'])
-        additional_columns = row['additional_columns'] if 'additional_columns' in row else None
-        if stock_type not in ['Common','Preferred']:
-            raise Exception(f'Invalid type in row {index}')
-        else:
-            stock_type = StockType.Common if stock_type == 'Common' else StockType.Preferred
-        
-        if additional_columns is not None and len(additional_columns) > 0:
-            raise Exception(f'Additional columns detected in row {index}')
-        
-        return Stock(
-            symbol,
-            last_dividend,
-            fixed_dividend if fixed_dividend is not None else 0,
-            par_value,
-            type=stock_type
-        )
+        return _build_stock(row)
+    except _IndexedRowError as e:
+        return f'{e} {index}'
     except Exception as e:
         return str(e)
-    
-def read_stock_data(file_path:str, skip_on_error:bool = True) -> list[Stock]|str:
+
+def _parse_stock_piece(file_path : str, fieldnames : list[str], start : int, end : int) -> list[Stock|tuple[str, bool]]:
+    """
+    Parse a byte range of a stock data CSV file, called in a worker process.
+    Row indexes are only known once all pieces are merged, so failures are
+    returned as the error message and whether the row index must be appended.
+    Args:
+    - file_path (str): The path to the CSV file.
+    - fieldnames (list[str]): The column names from the header line.
+    - start (int): The start of the byte range.
+    - end (int): The end of the byte range.
+    Returns:
+    - list[Stock | tuple[str, bool]]: The stock or the failure of every row of the range.
+    """
+    results : list[Stock|tuple[str, bool]] = []
+    for row in read_csv_piece(file_path, fieldnames, start, end):
+        try:
+            results.append(_build_stock(row))
+        except _IndexedRowError as e:
+            results.append((str(e), True))
+        except Exception as e:
+            results.append((str(e), False))
+    return results
+
+def _iter_stock_results(file_path : str, workers : int) -> Iterator[Stock|str]:
+    """
+    Parse the rows of a stock data CSV file in order.
+    Args:
+    - file_path (str): The path to the CSV file.
+    - workers (int): The number of worker processes, 1 parses in the current process.
+    Yields:
+    - Stock | str: The Stock object of the next row, or its error message.
+    Raises:
+    - StockDataError: If the file cannot be read or its headers are invalid.
+    """
+    if workers <= 1:
+        for index,row in enumerate(iter_csv_rows(file_path)):
+            yield init_stock(row,index)
+        return
+    try:
+        fieldnames, start = read_csv_header(file_path)
+        if not check_headers(fieldnames):
+            raise StockDataError("Invalid headers in csv file")
+        pieces = map_csv_pieces(file_path, _parse_stock_piece, fieldnames, start, workers)
+    except StockDataError:
+        raise
+    except Exception as e:
+        raise StockDataError(str(e)) from e
+    index = 0
+    for piece in pieces:
+        for result in piece:
+            if isinstance(result, tuple):
+                message, indexed = result
+                yield f'{message} {index}' if indexed else message
+            else:
+                yield result
+            index += 1
+
+def iter_stock_data(file_path:str, skip_on_error:bool = True, chunk_size:int|None = None, stats:LoadStats|None = None, workers:int = 1) -> Iterator[Stock|list[Stock]]:
+    """
+    Stream stock data from a CSV file, parsing and validating one row at a time.
+    Args:
+    - file_path (str): The path to the CSV file.
+    - skip_on_error (bool): If True, skip rows with errors. If False, stop processing on the first error.
+    - chunk_size (int | None): If set, yield lists of up to chunk_size stocks instead of single stocks.
+    - stats (LoadStats | None): If set, updated with the throughput of the load.
+    - workers (int): The number of worker processes parsing the file, 1 parses in the current process.
+    Yields:
+    - Stock | list[Stock]: The next stock, or the next chunk of stocks.
+    Raises:
+    - StockDataError: If the file cannot be loaded.
+    - StockRowError: If a row fails and skip_on_error is False.
+    """
+    if not check_file_exists(file_path):
+        raise StockDataError("File does not exist")
+    stats = stats if stats is not None else LoadStats()
+    started = time.perf_counter()
+    chunk : list[Stock] = []
+    symbols : set[str] = set()
+    try:
+        for stock in _iter_stock_results(file_path, workers):
+            stats.rows += 1
+            if type(stock) != str:
+                symbol = SymbolRegistry.normalize(stock.symbol)
+                if symbol in symbols:
+                    stock = f'Duplicate symbol {stock.symbol} in row {stats.rows - 1}'
+                else:
+                    symbols.add(symbol)
+            if type(stock) == str:
+                if not skip_on_error:
+                    raise StockRowError(stock)
+                stats.skipped += 1
+                print(f"[Warning] {stock}. Skipped")
+                continue
+            stats.loaded += 1
+            if chunk_size is None:
+                yield stock
+                continue
+            chunk.append(stock)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        stats.elapsed = time.perf_counter() - started
+
+def read_stock_data(file_path:str, skip_on_error:bool = True, stats:LoadStats|None = None, workers:int = 1) -> list[Stock]|str:
     """
     Read stock data from a CSV file.
     Args:
     - file_path (str): The path to the CSV file.
     - skip_on_error (bool): If True, skip rows with errors. If False, stop processing on the first error.
+    - stats (LoadStats | None): If set, updated with the throughput of the load.
+    - workers (int): The number of worker processes parsing the file, 1 parses in the current process.
     Returns:
     - list[Stock] | str: A list of Stock objects if successful, an error message otherwise.
     """
@@ -81,20 +281,259 @@ def read_stock_data(file_path:str, skip_on_error:bool = True) -> list[Stock]|str
         return "[Error] File does not exist"
 
     stock_data : list[Stock] = []
-    rows : list[dict] = load_csv(file_path)
-    
-    if type(rows) == str:
-        return f"[Error] Invalid csv file. {rows}"
-    
-    for index,row in enumerate(rows):
-        stock = init_stock(row,index)
-        if type(stock) == str:
-            if skip_on_error:
-                print(f"[Warning] {stock}. Skipped")
-                continue
+    try:
+        stock_data.extend(iter_stock_data(file_path, skip_on_error, stats=stats, workers=workers))
+    except StockRowError as e:
+        return f"[Error] {e}"
+    except StockDataError as e:
+        return f"[Error] Invalid csv file. {e}"
+
+    return stock_data
+
+@dataclass
+class ReloadStats():
+    """
+    Outcome of a stock data reload.
+    Attributes:
+    - rows (int): The number of rows read.
+    - parsed (int): The number of rows parsed, the rows whose text changed since the previous load and the first rows of the symbols they affect.
+    - added (list[str]): The symbols of the registered new stocks.
+    - changed (list[str]): The symbols of the replaced stocks.
+    - removed (list[str]): The symbols no longer in the file. Their stocks stay registered.
+    - skipped (int): The number of rows skipped because of errors.
+    - elapsed (float): The reload time in seconds.
+    """
+    rows: int = 0
+    parsed: int = 0
+    added: list[str] = field(default_factory=list)
+    changed: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+    skipped: int = 0
+    elapsed: float = 0.0
+
+    def __str__(self):
+        return f"Reloaded {self.rows} rows ({self.parsed} parsed) in {self.elapsed * 1000:.1f}ms: {len(self.added)} added, {len(self.changed)} changed, {len(self.removed)} removed, {self.skipped} skipped"
+
+class StockDataReloader():
+    """
+    Reloads a stock data CSV file into a symbol registry, applying only the stocks that changed.
+    The lines of the previous load are kept, so a reload compares the new
+    lines with them in C, skipping the unchanged lines at both ends and,
+    when no line was added or removed, every unchanged line. Only the rows
+    whose text is new are parsed. As in read_stock_data, the first valid
+    row of a symbol wins: the symbol of every row is remembered, so the
+    winner of a symbol whose rows changed is found again by row position,
+    parsing it if needed. Changed stocks replace
+    the registered ones under the same symbol id, so recorded trades and
+    everything keyed by symbol id stay valid. Stocks removed from the file
+    stay registered, since recorded trades refer to them.
+    Rows are read one per line, quoted fields spanning lines are not supported.
+    Attributes:
+    - file_path (str): The path to the CSV file.
+    - registry (SymbolRegistry): The registry updated in place.
+    - skip_on_error (bool): If True, skip rows with errors. If False, a row error aborts the reload before anything is applied.
+    - _header (str | None): The header line of the previous load.
+    - _lines (list[str]): The rows of the previous load.
+    - _keys (list[str | None]): The normalised symbol of every row, None for invalid rows. Duplicate rows keep their symbol.
+    - _counts (dict[str, int]): The number of rows of every normalised symbol.
+    - _duplicates (set[str]): The normalised symbols of more than one row.
+    """
+
+    def __init__(self, file_path : str, registry : SymbolRegistry, skip_on_error : bool = True):
+        self.file_path = file_path
+        self.registry = registry
+        self.skip_on_error = skip_on_error
+        self._header : str|None = None
+        self._lines : list[str] = []
+        self._keys : list[str|None] = []
+        self._counts : dict[str, int] = {}
+        self._duplicates : set[str] = set()
+
+    def _read(self) -> tuple[str, list[str], list[str]]:
+        """
+        Read the header and the non-empty rows of the file.
+        Returns:
+        - tuple[str, list[str], list[str]]: The header line, the column names and the row lines.
+        Raises:
+        - StockDataError: If the file cannot be read or its headers are invalid.
+        """
+        if not check_file_exists(self.file_path):
+            raise StockDataError("File does not exist")
+        try:
+            with open(self.file_path, encoding=CSV_ENCODING) as csv_file:
+                lines = csv_file.read().splitlines()
+        except Exception as e:
+            raise StockDataError(str(e)) from e
+        header = lines[0] if lines else ''
+        fieldnames = next(csv.reader([header]), None)
+        if not check_headers(fieldnames):
+            raise StockDataError("Invalid headers in csv file")
+        del lines[0]
+        if '' in lines:
+            lines = [line for line in lines if line]
+        return header, fieldnames, lines
+
+    def prime(self) -> int|str:
+        """
+        Remember the rows of the registered stocks, as loaded by read_stock_data from the same file.
+        Only the symbol column is split, the rows are not validated again.
+        Returns:
+        - int | str: The number of remembered symbols if successful, an error message otherwise.
+        """
+        try:
+            header, fieldnames, lines = self._read()
+        except StockDataError as e:
+            return f"[Error] Invalid csv file. {e}"
+        position = fieldnames.index('symbol')
+        normalize = SymbolRegistry.normalize
+        registry = self.registry
+        keys : list[str|None] = []
+        counts : dict[str, int] = {}
+        for values in csv.reader(lines):
+            key = normalize(values[position]) if len(values) > position else None
+            if key is not None and key in registry:
+                counts[key] = counts.get(key, 0) + 1
             else:
-                return f"[Error] {stock}"
+                key = None
+            keys.append(key)
+        self._header, self._lines, self._keys, self._counts = header, lines, keys, counts
+        self._duplicates = {key for key, total in counts.items() if total > 1}
+        return len(counts)
+
+    def _parse(self, lines : list[str], fieldnames : list[str], indices : list[int]) -> list[Stock|str]:
+        """
+        Parse rows of the file.
+        Args:
+        - lines (list[str]): The row lines.
+        - fieldnames (list[str]): The column names.
+        - indices (list[int]): The positions of the rows to parse.
+        Returns:
+        - list[Stock | str]: The stock of every row, an error message for invalid rows.
+        """
+        reader = csv.DictReader([lines[index] for index in indices], fieldnames=fieldnames, restval=None, restkey='additional_columns')
+        return [init_stock(row, index) for index, row in zip(indices, reader)]
+
+    def reload(self) -> ReloadStats|str:
+        """
+        Re-read the file and apply the added and changed stocks to the registry.
+        Without a primed or previous load, or after the header changed,
+        every row is parsed and compared with the registered stock.
+        Returns:
+        - ReloadStats | str: The outcome of the reload if successful, an error message otherwise.
+        """
+        started = time.perf_counter()
+        try:
+            header, fieldnames, lines = self._read()
+        except StockDataError as e:
+            return f"[Error] Invalid csv file. {e}"
+        stats = ReloadStats(rows=len(lines))
+        if header == self._header:
+            old_lines, old_keys, counts, duplicates = self._lines, self._keys, self._counts, self._duplicates
+        else:
+            old_lines, old_keys, counts, duplicates = [], [], {}, set()
+
+        # Unchanged lines at both ends are found by comparing the lists in C
+        common = min(len(lines), len(old_lines))
+        prefix = next(compress(count(), map(ne, lines, old_lines)), common)
+        suffix = next(compress(count(), map(ne, reversed(lines), reversed(old_lines))), common)
+        suffix = min(suffix, common - prefix)
+        old_end, new_end = len(old_lines) - suffix, len(lines) - suffix
+
+        # An edited region of the same length is compared line by line, only
+        # the differing lines are looked at. Otherwise lines may have moved.
+        # The symbol of a row only depends on its text, so a line found among
+        # the replaced lines keeps its symbol without being parsed
+        in_place = old_end - prefix == new_end - prefix
+        if in_place:
+            edited = list(compress(range(prefix, new_end), map(ne, lines[prefix:new_end], old_lines[prefix:old_end])))
+            keys = old_keys[prefix:old_end]
+            replaced = [keys[index - prefix] for index in edited]
+            known = dict(zip([old_lines[index] for index in edited], replaced))
         else:
-            stock_data.append(stock)
-        
-    return stock_data
\ No newline at end of file
+            edited = range(prefix, new_end)
+            keys = [None] * (new_end - prefix)
+            replaced = old_keys[prefix:old_end]
+            known = dict(zip(old_lines[prefix:old_end], replaced))
+        pending : list[int] = []
+        for index in edited:
+            key = known.get(lines[index], known)
+            if key is known:
+                key = None
+                pending.append(index)
+            keys[index - prefix] = key
+
+        # Row errors are reported in row order, as read_stock_data would
+        errors : list[tuple[int, str]] = []
+        parsed : dict[int, Stock] = {}
+        first : dict[str, int] = {}
+        for index, stock in zip(pending, self._parse(lines, fieldnames, pending)):
+            if type(stock) == str:
+                errors.append((index, stock))
+                continue
+            key = SymbolRegistry.normalize(stock.symbol)
+            keys[index - prefix] = key
+            parsed[index] = stock
+            first.setdefault(key, index)
+        stats.parsed = len(pending)
+        removed_counts = Counter(replaced)
+        added_counts = Counter(keys if not in_place else [keys[index - prefix] for index in edited])
+        keys = old_keys[:prefix] + keys + old_keys[old_end:]
+
+        # The winner of a symbol whose rows changed, or whose moved rows may
+        # have changed order, is its first valid row
+        affected = {key for key, _ in removed_counts.items() ^ added_counts.items()}
+        affected.update(first)
+        affected.update(duplicates & added_counts.keys())
+        affected.discard(None)
+        winners : dict[str, tuple[int, Stock]] = {}
+        totals : dict[str, int] = {}
+        for key in affected:
+            total = counts.get(key, 0) + added_counts[key] - removed_counts[key]
+            if total == 1 and key in first:
+                winners[key] = (first[key], parsed[first[key]])
+            index = -1
+            while total and key not in winners:
+                index = keys.index(key, index + 1)
+                stock = parsed.get(index)
+                if stock is None:
+                    stock = self._parse(lines, fieldnames, [index])[0]
+                    stats.parsed += 1
+                    if type(stock) == str:
+                        errors.append((index, stock))
+                        keys[index] = None
+                        total -= 1
+                        continue
+                winners[key] = (index, stock)
+            totals[key] = total
+        errors.extend((index, f'Duplicate symbol {stock.symbol} in row {index}') for index, stock in parsed.items() if winners[keys[index]][0] != index)
+        errors.sort(key=lambda error: error[0])
+        if errors and not self.skip_on_error:
+            return f"[Error] {errors[0][1]}"
+        for _, error in errors:
+            print(f"[Warning] {error}. Skipped")
+        stats.skipped = len(errors)
+
+        # Nothing is applied before every row error had the chance to abort
+        removed : list[str] = []
+        for key, total in totals.items():
+            if total:
+                counts[key] = total
+            elif counts.pop(key, 0):
+                removed.append(key)
+            if total > 1:
+                duplicates.add(key)
+            else:
+                duplicates.discard(key)
+        registry = self.registry
+        for _, stock in sorted(winners.values(), key=lambda winner: winner[0]):
+            registered = registry.get(stock.symbol)
+            if registered is None:
+                registry.add(stock)
+                stats.added.append(stock.symbol)
+            elif registered != stock:
+                registry.replace(stock)
+                stats.changed.append(stock.symbol)
+        stats.removed = [registry.get(key).symbol for key in sorted((key for key in removed if key in registry), key=registry.id_of)]
+        self._header, self._lines, self._keys, self._counts, self._duplicates = header, lines, keys, counts, duplicates
+        stats.elapsed = time.perf_counter() - started
+        return stats
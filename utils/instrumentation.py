@@ -0,0 +1,390 @@
+import cProfile
+import functools
+import importlib
+import io
+import pstats
+import threading
+import time
+import tracemalloc
+from enum import Enum
+from typing import Callable
+
+# Operations instrumented by enable(), as module:attribute paths
+DEFAULT_POINTS = [
+    'models.stock:Stock.calculate_dividend_yield',
+    'models.stock:Stock.calculate_pe_ratio',
+    'models.stock:Stock.calculate_volume_weighted_stock_price',
+    'models.stock:Stock.calculate_gbce_index',
+    'models.trade:Trade.__init__',
+    'models.trade_store:TradeStore.record',
+    'models.trade_store:TradeStore.vwsp',
+    'utils.csv:read_stock_data',
+    'utils.trade_io:import_trades_csv',
+    'utils.trade_io:import_trades',
+    'utils.trade_io:export_trades',
+]
+
+class LatencyHistogram():
+    """
+    HDR-style histogram of latencies in nanoseconds.
+    Values below 32 have a bucket each, larger values are bucketed by their
+    power of two and their next four bits, so every bucket spans at most
+    1/16 of its values whatever the magnitude, with a fixed, small number
+    of buckets. Recording is a bit length, a shift and an increment.
+    Attributes:
+    - count (int): The number of recorded values.
+    - total_ns (int): The sum of the recorded values.
+    - min_ns (int): The smallest recorded value, 0 when empty.
+    - max_ns (int): The largest recorded value.
+    - _buckets (list[int]): The number of values per bucket.
+    """
+    def __init__(self):
+        self.clear()
+
+    def clear(self) -> None:
+        """
+        Forget the recorded values.
+        """
+        self.count = 0
+        self.total_ns = 0
+        self.min_ns = 0
+        self.max_ns = 0
+        self._buckets : list[int] = []
+
+    @staticmethod
+    def _index(value : int) -> int:
+        """
+        Get the bucket of a value.
+        """
+        if value < 32:
+            return value
+        shift = value.bit_length() - 5
+        return shift * 16 + (value >> shift)
+
+    @staticmethod
+    def _highest(index : int) -> int:
+        """
+        Get the largest value of a bucket.
+        """
+        if index < 32:
+            return index
+        shift = index // 16 - 1
+        return ((index % 16 + 17) << shift) - 1
+
+    def record(self, value : int) -> None:
+        """
+        Record a latency.
+        Args:
+        - value (int): The latency in nanoseconds.
+        """
+        value = max(value, 0)
+        index = self._index(value)
+        buckets = self._buckets
+        if index >= len(buckets):
+            buckets.extend([0] * (index + 1 - len(buckets)))
+        buckets[index] += 1
+        if not self.count or value < self.min_ns:
+            self.min_ns = value
+        if value > self.max_ns:
+            self.max_ns = value
+        self.count += 1
+        self.total_ns += value
+
+    def percentile(self, fraction : float) -> int:
+        """
+        Get a percentile of the recorded latencies.
+        Args:
+        - fraction (float): The percentile as a fraction, 0.99 for p99.
+        Returns:
+        - int: The largest value of the bucket holding the percentile, capped at the largest recorded value, 0 when empty.
+        """
+        if not self.count:
+            return 0
+        rank = max(1, min(self.count, round(fraction * self.count)))
+        seen = 0
+        for index, count in enumerate(self._buckets):
+            seen += count
+            if seen >= rank:
+                return min(self._highest(index), self.max_ns)
+        return self.max_ns
+
+    @property
+    def mean_ns(self) -> float:
+        """
+        The mean of the recorded latencies, 0 when empty.
+        """
+        return self.total_ns / self.count if self.count else 0.0
+
+class ProfileMode(Enum):
+    CProfile = 'cprofile'
+    Tracemalloc = 'tracemalloc'
+
+class _Sampler():
+    """
+    Profiles the calls of one operation for a bounded period.
+    Attributes:
+    - mode (ProfileMode): Whether calls run under cProfile or tracemalloc.
+    - deadline (float): The monotonic time the sampling stops at.
+    - max_calls (int | None): The number of profiled calls after which sampling stops, None for no limit.
+    - calls (int): The number of profiled calls.
+    - report (str | None): The profile, set once sampling stopped.
+    """
+
+    def __init__(self, mode : ProfileMode, seconds : float, max_calls : int|None):
+        self.mode = mode
+        self.deadline = time.monotonic() + seconds
+        self.max_calls = max_calls
+        self.calls = 0
+        self.report : str|None = None
+        self.peak_bytes = 0
+        self._busy = threading.Lock()
+        self._profile = cProfile.Profile() if mode == ProfileMode.CProfile else None
+        self._started_tracing = False
+        if mode == ProfileMode.Tracemalloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def call(self, function : Callable, args : tuple, kwargs : dict) -> object:
+        """
+        Run a call of the operation, profiling it unless another thread is being profiled.
+        """
+        if not self._busy.acquire(blocking=False):
+            return function(*args, **kwargs)
+        try:
+            if self._profile is not None:
+                return self._profile.runcall(function, *args, **kwargs)
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.peak_bytes = max(self.peak_bytes, tracemalloc.get_traced_memory()[1] - before)
+        finally:
+            self.calls += 1
+            self._busy.release()
+
+    def expired(self) -> bool:
+        """
+        Whether the sampling period or the number of calls is exhausted.
+        """
+        return time.monotonic() >= self.deadline or (self.max_calls is not None and self.calls >= self.max_calls)
+
+    def finish(self, name : str) -> str:
+        """
+        Stop sampling and render the profile.
+        Args:
+        - name (str): The name of the operation.
+        Returns:
+        - str: The profile.
+        """
+        with self._busy:
+            if self.report is not None:
+                return self.report
+            output = io.StringIO()
+            output.write(f"Profile of {name} ({self.mode.value}) over {self.calls} calls\n")
+            if self._profile is not None:
+                if self.calls:
+                    pstats.Stats(self._profile, stream=output).sort_stats('cumulative').print_stats(20)
+            else:
+                output.write(f"Peak allocated by a call: {self.peak_bytes / 1024:.1f} KiB\n")
+                if tracemalloc.is_tracing():
+                    output.write("Allocations still held, by line:\n")
+                    snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, __file__), tracemalloc.Filter(False, tracemalloc.__file__)])
+                    for statistic in snapshot.statistics('lineno')[:20]:
+                        output.write(f"{statistic}\n")
+                if self._started_tracing:
+                    tracemalloc.stop()
+            self.report = output.getvalue()
+            return self.report
+
+class _Point():
+    """
+    An instrumented attribute of a class or module.
+    Attributes:
+    - owner (object): The class or module holding the attribute.
+    - attribute (str): The name of the attribute.
+    - name (str): The name the operation is reported under.
+    - original (object): The attribute as found, restored by disable().
+    """
+
+    def __init__(self, owner : object, attribute : str, name : str):
+        self.owner = owner
+        self.attribute = attribute
+        self.name = name
+        self.original = owner.__dict__[attribute] if isinstance(owner, type) else getattr(owner, attribute)
+
+class Instrumentation():
+    """
+    Opt-in per-operation call counts, cumulative time and latency histograms.
+    Enabling replaces the instrumented methods and functions with timing
+    wrappers and disabling restores the originals, so a disabled
+    instrumentation costs nothing. Functions imported by name into another
+    module keep their original there, that module is instrumented with
+    instrument() on its own name. An operation can also be profiled with
+    cProfile or tracemalloc for a bounded period.
+    Attributes:
+    - enabled (bool): Whether the wrappers are installed.
+    - _histograms (dict[str, LatencyHistogram]): The latencies by operation name.
+    - _points (dict[tuple[int, str], _Point]): The instrumented attributes by owner and attribute name.
+    - _samplers (dict[str, _Sampler]): The active or finished profiles by operation name.
+    - _lock (threading.Lock): Guards the histograms, operations may run on several threads.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._histograms : dict[str, LatencyHistogram] = {}
+        self._points : dict[tuple[int, str], _Point] = {}
+        self._samplers : dict[str, _Sampler] = {}
+        self._lock = threading.Lock()
+
+    def _wrap(self, point : _Point) -> object:
+        """
+        Build the timing wrapper of an instrumented attribute.
+        """
+        original = point.original
+        function = original.__func__ if isinstance(original, (staticmethod, classmethod)) else original
+        histogram = self._histograms.setdefault(point.name, LatencyHistogram())
+        samplers = self._samplers
+        lock = self._lock
+        name = point.name
+        clock = time.perf_counter_ns
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            sampler = samplers.get(name)
+            if sampler is not None and sampler.report is None:
+                # Profiled calls are slowed down by the profiler, so they are not timed
+                if not sampler.expired():
+                    return sampler.call(function, args, kwargs)
+                sampler.finish(name)
+            started = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = clock() - started
+                with lock:
+                    histogram.record(elapsed)
+
+        if isinstance(original, staticmethod):
+            return staticmethod(wrapper)
+        if isinstance(original, classmethod):
+            return classmethod(wrapper)
+        return wrapper
+
+    def instrument(self, owner : object, attribute : str, name : str|None = None) -> None:
+        """
+        Instrument a method of a class or a function of a module, installed right away when enabled.
+        Args:
+        - owner (object): The class or module holding the attribute.
+        - attribute (str): The name of the method or function.
+        - name (str | None): The name the operation is reported under, operations sharing a name share a histogram. Defaults to the qualified name.
+        """
+        key = (id(owner), attribute)
+        if key in self._points:
+            return
+        if name is None:
+            name = f"{owner.__name__}.{attribute}" if isinstance(owner, type) else attribute
+        point = self._points[key] = _Point(owner, attribute, name)
+        if self.enabled:
+            setattr(owner, attribute, self._wrap(point))
+
+    def enable(self, points : list[str] = DEFAULT_POINTS) -> None:
+        """
+        Install the timing wrappers.
+        Args:
+        - points (list[str]): Operations to instrument as module:attribute or module:Class.method paths, besides those added with instrument().
+        """
+        for path in points:
+            module_name, _, qualified = path.partition(':')
+            owner = importlib.import_module(module_name)
+            *classes, attribute = qualified.split('.')
+            for class_name in classes:
+                owner = getattr(owner, class_name)
+            self.instrument(owner, attribute, qualified)
+        if self.enabled:
+            return
+        self.enabled = True
+        for point in self._points.values():
+            setattr(point.owner, point.attribute, self._wrap(point))
+
+    def disable(self) -> None:
+        """
+        Restore the original methods and functions, keeping the recorded numbers.
+        """
+        if not self.enabled:
+            return
+        self.enabled = False
+        for point in self._points.values():
+            setattr(point.owner, point.attribute, point.original)
+
+    def reset(self) -> None:
+        """
+        Clear the recorded numbers and profiles.
+        """
+        with self._lock:
+            for histogram in self._histograms.values():
+                histogram.clear()
+        self._samplers.clear()
+
+    def profile(self, name : str, mode : ProfileMode = ProfileMode.CProfile, seconds : float = 10.0, max_calls : int|None = None) -> None:
+        """
+        Profile the calls of an instrumented operation for a bounded period.
+        Args:
+        - name (str): The name of the operation.
+        - mode (ProfileMode): Run the calls under cProfile or trace their allocations with tracemalloc.
+        - seconds (float): How long calls are profiled for.
+        - max_calls (int | None): The number of calls profiled at most, None for no limit.
+        Raises:
+        - ValueError: If the operation is not instrumented or the period is invalid.
+        """
+        if name not in self._histograms:
+            raise ValueError(f'Unknown operation {name}')
+        if seconds <= 0 or (max_calls is not None and max_calls < 1):
+            raise ValueError('Invalid profiling period')
+        self._samplers[name] = _Sampler(mode, seconds, max_calls)
+
+    def profile_report(self, name : str) -> str|None:
+        """
+        Get the profile of an operation, stopping the profiling if it is still running.
+        Args:
+        - name (str): The name of the operation.
+        Returns:
+        - str | None: The profile, None if the operation was never profiled.
+        """
+        sampler = self._samplers.get(name)
+        return sampler.finish(name) if sampler is not None else None
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        """
+        Get the numbers of every operation that was called.
+        Returns:
+        - dict[str, dict[str, float]]: The calls, total time, mean, p50, p90, p99 and maximum latency of every operation, times in microseconds.
+        """
+        with self._lock:
+            return {name: {
+                'calls': histogram.count,
+                'total_us': histogram.total_ns / 1000,
+                'mean_us': histogram.mean_ns / 1000,
+                'p50_us': histogram.percentile(0.5) / 1000,
+                'p90_us': histogram.percentile(0.9) / 1000,
+                'p99_us': histogram.percentile(0.99) / 1000,
+                'max_us': histogram.max_ns / 1000,
+            } for name, histogram in self._histograms.items() if histogram.count}
+
+    def report(self) -> str:
+        """
+        Render the numbers of every operation that was called as a table, followed by the profiles.
+        Returns:
+        - str: The report.
+        """
+        lines = [f"{'operation':<48} {'calls':>10} {'total ms':>10} {'mean us':>10} {'p50 us':>10} {'p90 us':>10} {'p99 us':>10} {'max us':>10}"]
+        for name, numbers in sorted(self.snapshot().items()):
+            lines.append(f"{name:<48} {numbers['calls']:>10} {numbers['total_us'] / 1000:>10.3f} {numbers['mean_us']:>10.2f} {numbers['p50_us']:>10.2f} {numbers['p90_us']:>10.2f} {numbers['p99_us']:>10.2f} {numbers['max_us']:>10.2f}")
+        if len(lines) == 1:
+            lines.append('No instrumented operation was called')
+        for name in list(self._samplers):
+            lines.append(self.profile_report(name))
+        return '\n'.join(lines)
+
+# Process wide instrumentation, disabled until enabled
+INSTRUMENTATION = Instrumentation()
@@ -0,0 +1,223 @@
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from enum import Enum
+from typing import Callable, Iterator
+from models.stock import Stock
+from models.trade import TradeType
+
+# Journal file layout, all little endian:
+# - header: magic, format version, record alignment, padding
+# - records: written in order, each starting with a marker byte, the side,
+#   the length of the symbol and a CRC32 of the rest of the record so a torn
+#   last record is detected, then the fixed fields and the UTF-8 encoded
+#   symbol, padded to the record alignment
+# Records hold the symbol itself rather than a symbol id, since the journal is
+# replayed before the ids of a session are assigned and must outlive changes
+# to the stock data file. Format 1 stored it in a fixed 16 byte slot, which
+# made longer symbols fail after their trade was recorded, so format 2 sizes
+# every record to its symbol.
+JOURNAL_MAGIC = b'SSSMJRNL'
+JOURNAL_VERSION = 2
+JOURNAL_HEADER = struct.Struct('<8sHH4x')
+JOURNAL_RECORD_HEAD = struct.Struct('<BBHI')
+JOURNAL_RECORD_BODY = struct.Struct('<qqd')
+JOURNAL_RECORD_ALIGN = 8
+JOURNAL_RECORD_MARKER = 0xA5
+
+def journal_record_size(symbol_length : int) -> int:
+    """
+    Get the size of a journal record.
+    Args:
+    - symbol_length (int): The length of the encoded symbol in bytes.
+    Returns:
+    - int: The size of the record including its padding.
+    """
+    size = JOURNAL_RECORD_HEAD.size + JOURNAL_RECORD_BODY.size + symbol_length
+    return -(-size // JOURNAL_RECORD_ALIGN) * JOURNAL_RECORD_ALIGN
+
+class FsyncPolicy(Enum):
+    Always = 1
+    Batch = 2
+    Never = 3
+
+class TradeJournal():
+    """
+    Append-only, memory-mapped journal of recorded trades.
+    Records are written straight into the mapping, so recording a trade is
+    a couple of struct packs and a memory copy. Symbols of any length fit,
+    a record grows with its symbol. How often
+    the mapping is flushed to disk is set by the fsync policy. Written records
+    survive a crash of the process with any policy, the policy bounds what is
+    lost if the machine itself goes down. Appends from several threads are
+    serialised by a lock.
+    Attributes:
+    - file_path (str): The path of the journal file.
+    - fsync_policy (FsyncPolicy): When the mapping is flushed to disk.
+    - batch_size (int): The number of records after which a Batch policy flushes.
+    - batch_interval (float): The number of seconds after which a Batch policy flushes.
+    """
+
+    def __init__(self, file_path : str, fsync_policy : FsyncPolicy = FsyncPolicy.Batch, batch_size : int = 1024, batch_interval : float = 1.0, initial_capacity : int = 65536):
+        self.file_path = file_path
+        self.fsync_policy = fsync_policy
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._file = open(file_path, 'r+b' if os.path.exists(file_path) else 'w+b')
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            if size == 0:
+                self._file.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, JOURNAL_VERSION, JOURNAL_RECORD_ALIGN))
+                self._file.truncate(JOURNAL_HEADER.size + initial_capacity * journal_record_size(16))
+            else:
+                magic, version, align = JOURNAL_HEADER.unpack(self._file.read(JOURNAL_HEADER.size))
+                if magic != JOURNAL_MAGIC or version != JOURNAL_VERSION or align != JOURNAL_RECORD_ALIGN:
+                    raise ValueError('Invalid journal file')
+            self._mapped = mmap.mmap(self._file.fileno(), 0)
+        except Exception:
+            self._file.close()
+            raise
+        self._offset, self._count = self._scan_end()
+
+    def _scan_end(self) -> tuple[int, int]:
+        """
+        Find the offset after the last complete record.
+        Returns:
+        - tuple[int, int]: The offset the next record is written at, and the number of records.
+        """
+        offset = JOURNAL_HEADER.size
+        count = 0
+        for offset, _ in self._iter_records():
+            count += 1
+        return offset, count
+
+    def _iter_records(self) -> Iterator[tuple[int, tuple[str, int, int, float, int]]]:
+        """
+        Scan the mapped file for complete records, stopping at the first empty or torn one.
+        Yields:
+        - tuple[int, tuple[str, int, int, float, int]]: The offset after the record, and its symbol, side, quantity, price and timestamp.
+        """
+        mapped = self._mapped
+        offset = JOURNAL_HEADER.size
+        end = len(mapped)
+        while offset + JOURNAL_RECORD_HEAD.size <= end:
+            marker, side, symbol_length, crc = JOURNAL_RECORD_HEAD.unpack_from(mapped, offset)
+            size = journal_record_size(symbol_length)
+            if marker != JOURNAL_RECORD_MARKER or offset + size > end:
+                return
+            body_start = offset + JOURNAL_RECORD_HEAD.size
+            body = mapped[body_start:body_start + JOURNAL_RECORD_BODY.size + symbol_length]
+            if zlib.crc32(body, side) != crc:
+                return
+            timestamp, quantity, price = JOURNAL_RECORD_BODY.unpack_from(body)
+            offset += size
+            yield offset, (body[JOURNAL_RECORD_BODY.size:].decode(), side, quantity, price, timestamp)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _grow(self, size : int) -> None:
+        """
+        Double the capacity of the journal file until it holds a size, and map it again.
+        """
+        self._mapped.flush()
+        self._mapped.close()
+        capacity = os.fstat(self._file.fileno()).st_size - JOURNAL_HEADER.size
+        # An empty or truncated journal has no capacity to double
+        capacity = max(capacity, size - JOURNAL_HEADER.size, journal_record_size(16))
+        while JOURNAL_HEADER.size + capacity < size:
+            capacity = 2 * capacity
+        self._file.truncate(JOURNAL_HEADER.size + capacity)
+        self._mapped = mmap.mmap(self._file.fileno(), 0)
+
+    def append(self, symbol : str, side : int, quantity : int, price : float, timestamp_ns : int) -> None:
+        """
+        Append a trade to the journal.
+        Args:
+        - symbol (str): The symbol of the traded stock.
+        - side (int): The trade side, the value of a TradeType.
+        - quantity (int): The quantity of shares traded.
+        - price (float): The price per share.
+        - timestamp_ns (int): The trade time as epoch nanoseconds.
+        Raises:
+        - ValueError: If the symbol is longer than 65535 bytes encoded.
+        """
+        encoded = symbol.encode()
+        if len(encoded) > 0xFFFF:
+            raise ValueError('Symbol too long for the journal')
+        body = JOURNAL_RECORD_BODY.pack(timestamp_ns, quantity, price) + encoded
+        size = journal_record_size(len(encoded))
+        with self._lock:
+            if self._offset + size > len(self._mapped):
+                self._grow(self._offset + size)
+            body_start = self._offset + JOURNAL_RECORD_HEAD.size
+            self._mapped[body_start:body_start + len(body)] = body
+            JOURNAL_RECORD_HEAD.pack_into(self._mapped, self._offset, JOURNAL_RECORD_MARKER, side, len(encoded), zlib.crc32(body, side))
+            self._offset += size
+            self._count += 1
+            self._pending += 1
+            if self.fsync_policy == FsyncPolicy.Always:
+                self._flush()
+            elif self.fsync_policy == FsyncPolicy.Batch and (self._pending >= self.batch_size or time.monotonic() - self._last_flush >= self.batch_interval):
+                self._flush()
+
+    def flush(self) -> None:
+        """
+        Flush the written records to disk.
+        """
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        """
+        Flush the written records to disk. The lock must be held.
+        """
+        self._mapped.flush()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def replay(self, store : 'TradeStore', find_stock : Callable[[str], Stock|None]) -> int:
+        """
+        Rebuild the trades of the journal in a trade store.
+        Args:
+        - store (TradeStore): The store receiving the trades.
+        - find_stock (Callable[[str], Stock | None]): Finds the stock of a symbol.
+        Returns:
+        - int: The number of replayed trades. Trades of unknown symbols are skipped.
+        """
+        trade_types = {trade_type.value: trade_type for trade_type in TradeType}
+        stocks : dict[str, Stock|None] = {}
+        replayed = 0
+        for _, (symbol, side, quantity, price, timestamp) in self._iter_records():
+            if symbol not in stocks:
+                stocks[symbol] = find_stock(symbol)
+                if stocks[symbol] is None:
+                    print(f"[Warning] Unknown symbol {symbol} in journal. Skipped")
+            stock = stocks[symbol]
+            if stock is not None and side in trade_types:
+                store.record(stock, quantity, trade_types[side], price, timestamp)
+                replayed += 1
+        return replayed
+
+    def close(self) -> None:
+        """
+        Flush and close the journal.
+        """
+        with self._lock:
+            if self._mapped.closed:
+                return
+            self._flush()
+            self._mapped.close()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
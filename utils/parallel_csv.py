@@ -0,0 +1,94 @@
+import csv
+import io
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Iterator
+
+# Encoding of the CSV files, the same whether they are read whole or in pieces
+CSV_ENCODING = 'utf-8'
+
+def read_csv_header(file_path : str) -> tuple[list[str]|None, int]:
+    """
+    Read the header line of a CSV file.
+    Args:
+    - file_path (str): The path to the CSV file.
+    Returns:
+    - tuple[list[str] | None, int]: The column names, None for an empty file, and the byte offset of the first data line.
+    """
+    with open(file_path, 'rb') as csv_file:
+        line = csv_file.readline()
+        if not line:
+            return None, 0
+        return next(csv.reader([line.decode(CSV_ENCODING)])), csv_file.tell()
+
+def split_csv_file(file_path : str, start : int, pieces : int) -> list[tuple[int, int]]:
+    """
+    Split the data lines of a CSV file into byte ranges that start and end at line boundaries.
+    A quoted field may span lines, so a file with quoted fields is kept in
+    a single range rather than risk cutting a row in two.
+    Args:
+    - file_path (str): The path to the CSV file.
+    - start (int): The byte offset of the first data line.
+    - pieces (int): The number of ranges to aim for.
+    Returns:
+    - list[tuple[int, int]]: The (start, end) byte ranges in file order.
+    """
+    size = os.path.getsize(file_path)
+    if size <= start:
+        return []
+    boundaries = [start]
+    with open(file_path, 'rb') as csv_file:
+        with mmap.mmap(csv_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if mapped.find(b'"', start) != -1:
+                return [(start, size)]
+        for piece in range(1, pieces):
+            target = start + (size - start) * piece // pieces
+            if target <= boundaries[-1]:
+                continue
+            csv_file.seek(target - 1)
+            # Reading from the byte before the target keeps a target that
+            # already sits on a line start as a boundary.
+            csv_file.readline()
+            offset = csv_file.tell()
+            if boundaries[-1] < offset < size:
+                boundaries.append(offset)
+    boundaries.append(size)
+    return list(zip(boundaries, boundaries[1:]))
+
+def read_csv_piece(file_path : str, fieldnames : list[str], start : int, end : int) -> Iterator[dict]:
+    """
+    Read the rows of a byte range of a CSV file.
+    Rows are read with the same DictReader settings as a full read of the file.
+    Args:
+    - file_path (str): The path to the CSV file.
+    - fieldnames (list[str]): The column names from the header line.
+    - start (int): The start of the byte range.
+    - end (int): The end of the byte range.
+    Returns:
+    - Iterator[dict]: The rows of the range.
+    """
+    with open(file_path, 'rb') as csv_file:
+        csv_file.seek(start)
+        text = csv_file.read(end - start).decode(CSV_ENCODING)
+    return csv.DictReader(io.StringIO(text, newline=''), fieldnames=fieldnames, restval=None, restkey='additional_columns')
+
+def map_csv_pieces(file_path : str, parse_piece : Callable[[str, list[str], int, int], Any], fieldnames : list[str], start : int, workers : int) -> list[Any]:
+    """
+    Parse the pieces of a CSV file in a process pool.
+    Args:
+    - file_path (str): The path to the CSV file.
+    - parse_piece (Callable): Module level function called as parse_piece(file_path, fieldnames, start, end) in a worker.
+    - fieldnames (list[str]): The column names from the header line.
+    - start (int): The byte offset of the first data line.
+    - workers (int): The number of worker processes.
+    Returns:
+    - list[Any]: The results of parse_piece in file order.
+    """
+    # More pieces than workers keeps the pool busy when pieces parse at different speeds
+    ranges = split_csv_file(file_path, start, workers * 4)
+    if not ranges:
+        return []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(parse_piece, file_path, fieldnames, piece_start, piece_end) for piece_start, piece_end in ranges]
+        return [future.result() for future in futures]
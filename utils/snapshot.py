@@ -0,0 +1,162 @@
+import mmap
+import os
+import struct
+from contextlib import contextmanager
+from itertools import groupby
+from operator import itemgetter
+from typing import Callable, Iterator
+from models.stock import Stock, StockType
+from models.symbol_registry import SymbolRegistry
+from models.trade_store import TradeStore
+from utils.trade_io import EXPORT_BATCH, TRADE_RECORD
+
+# Snapshot layout, all little endian:
+# - header: magic, format version, size and modification time (ns) of the
+#   stock data file the stocks were loaded from and of the trade file loaded
+#   at startup, zero without one, number of stocks, number of trades
+# - stocks: in symbol id order, fixed width fields followed by the UTF-8 encoded symbol
+# - trades: the fixed width records of the binary trade file, the symbol index
+#   being the symbol id, grouped by symbol and ordered by time within a symbol
+SNAPSHOT_MAGIC = b'SSSMSNAP'
+SNAPSHOT_VERSION = 2
+SNAPSHOT_HEADER = struct.Struct('<8sHQqQqIQ')
+SNAPSHOT_STOCK = struct.Struct('<dddBH')
+# Fingerprint of the trade file of a snapshot taken without one
+NO_SOURCE = (0, 0)
+
+class SnapshotError(ValueError):
+    """
+    Raised when a snapshot is invalid, truncated or older than its stock data or trade file.
+    """
+
+def source_fingerprint(file_path : str) -> tuple[int, int]:
+    """
+    Identify the version of a stock data file by its size and modification time.
+    Args:
+    - file_path (str): The path to the stock data file.
+    Returns:
+    - tuple[int, int]: The size in bytes and the modification time in epoch nanoseconds.
+    """
+    stat = os.stat(file_path)
+    return stat.st_size, stat.st_mtime_ns
+
+def write_snapshot(file_path : str, fingerprint : tuple[int, int], registry : SymbolRegistry, store : TradeStore, trades_fingerprint : tuple[int, int] = NO_SOURCE) -> int|str:
+    """
+    Write the stocks, their symbol ids and the trades held by a trade store to a snapshot.
+    The snapshot is written next to its destination and renamed over it,
+    so a crash never leaves a partial snapshot behind.
+    Args:
+    - file_path (str): The path of the snapshot.
+    - fingerprint (tuple[int, int]): The fingerprint of the stock data file the stocks were loaded from.
+    - registry (SymbolRegistry): The stocks, in symbol id order.
+    - store (TradeStore): The store holding the trades, using the registry.
+    - trades_fingerprint (tuple[int, int]): The fingerprint of the trade file loaded into the store, NO_SOURCE without one.
+    Returns:
+    - int | str: The number of trades written if successful, an error message otherwise.
+    """
+    # Symbols are copied one at a time, there is no need to merge them by time.
+    # Stocks are registered before their trades, so reading them after the
+    # trades covers every symbol id they hold
+    rows = (row for shard in store.shards() for row in shard.snapshot())
+    stocks = list(registry)
+    temporary_path = f"{file_path}.tmp"
+    count = 0
+    try:
+        with open(temporary_path, 'wb') as snapshot_file:
+            # The trade count is patched in once the trades have been written
+            snapshot_file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, *fingerprint, *trades_fingerprint, len(stocks), 0))
+            for stock in stocks:
+                symbol = stock.symbol.encode()
+                snapshot_file.write(SNAPSHOT_STOCK.pack(stock.last_dividend, stock.fixed_dividend, stock.par_value, stock.type.value, len(symbol)) + symbol)
+            buffer = bytearray(TRADE_RECORD.size * EXPORT_BATCH)
+            batch_count = 0
+            for timestamp, symbol_id, quantity, price, side in rows:
+                TRADE_RECORD.pack_into(buffer, batch_count * TRADE_RECORD.size, timestamp, symbol_id, side, quantity, price)
+                batch_count += 1
+                if batch_count == EXPORT_BATCH:
+                    snapshot_file.write(buffer)
+                    count += batch_count
+                    batch_count = 0
+            snapshot_file.write(memoryview(buffer)[:batch_count * TRADE_RECORD.size])
+            count += batch_count
+            snapshot_file.seek(0)
+            snapshot_file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, *fingerprint, *trades_fingerprint, len(stocks), count))
+        os.replace(temporary_path, file_path)
+    except Exception as e:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        return f"[Error] Could not write snapshot. {e}"
+    return count
+
+@contextmanager
+def open_snapshot(file_path : str, fingerprint : tuple[int, int], trades_fingerprint : tuple[int, int]|None = None) -> Iterator[tuple[list[Stock], Iterator[tuple[int, int, int, int, float]]]]:
+    """
+    Memory-map a snapshot, rebuilding its stocks and unpacking its trades in place.
+    Args:
+    - file_path (str): The path of the snapshot.
+    - fingerprint (tuple[int, int]): The fingerprint of the current stock data file.
+    - trades_fingerprint (tuple[int, int] | None): The fingerprint of the current trade file, NO_SOURCE without one, None to accept the trades of any file.
+    Yields:
+    - tuple[list[Stock], Iterator[tuple[int, int, int, int, float]]]: The stocks in symbol id order, and the timestamp (epoch ns), symbol id, side, quantity and price of every trade. The trades are only valid inside the context.
+    Raises:
+    - SnapshotError: If the snapshot is invalid, truncated or was taken from another version of the stock data or trade file.
+    """
+    with open(file_path, 'rb') as snapshot_file, mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        if len(mapped) < SNAPSHOT_HEADER.size:
+            raise SnapshotError('Invalid snapshot')
+        magic, version, source_size, source_mtime_ns, trades_size, trades_mtime_ns, stock_count, count = SNAPSHOT_HEADER.unpack_from(mapped, 0)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise SnapshotError('Invalid snapshot')
+        if (source_size, source_mtime_ns) != fingerprint:
+            raise SnapshotError('Stale snapshot, the stock data file changed')
+        if trades_fingerprint is not None and (trades_size, trades_mtime_ns) != trades_fingerprint:
+            raise SnapshotError('Stale snapshot, the trade file changed')
+        stock_types = {stock_type.value: stock_type for stock_type in StockType}
+        stocks : list[Stock] = []
+        offset = SNAPSHOT_HEADER.size
+        try:
+            for _ in range(stock_count):
+                last_dividend, fixed_dividend, par_value, stock_type, length = SNAPSHOT_STOCK.unpack_from(mapped, offset)
+                offset += SNAPSHOT_STOCK.size
+                symbol = mapped[offset:offset + length].decode()
+                offset += length
+                stocks.append(Stock.trusted(symbol, last_dividend, fixed_dividend, par_value, stock_types[stock_type]))
+        except (struct.error, KeyError, UnicodeDecodeError):
+            raise SnapshotError('Truncated snapshot') from None
+        end = offset + count * TRADE_RECORD.size
+        if end > len(mapped):
+            raise SnapshotError('Truncated snapshot')
+        with memoryview(mapped) as view, view[offset:end] as section:
+            # Closing the generator releases the unpacker holding the buffer
+            records = (record for record in TRADE_RECORD.iter_unpack(section))
+            try:
+                yield stocks, records
+            finally:
+                records.close()
+
+def load_snapshot(file_path : str, fingerprint : tuple[int, int], make_store : Callable[[SymbolRegistry], TradeStore], include_trades : bool = True, trades_fingerprint : tuple[int, int] = NO_SOURCE) -> tuple[SymbolRegistry, TradeStore]|str:
+    """
+    Restore the stocks and trades of a snapshot.
+    Args:
+    - file_path (str): The path of the snapshot.
+    - fingerprint (tuple[int, int]): The fingerprint of the current stock data file.
+    - make_store (Callable[[SymbolRegistry], TradeStore]): Builds the empty trade store of the restored stocks.
+    - include_trades (bool): Restore the trades, False restores the stocks only.
+    - trades_fingerprint (tuple[int, int]): The fingerprint of the current trade file, NO_SOURCE without one. Checked only when restoring the trades.
+    Returns:
+    - tuple[SymbolRegistry, TradeStore] | str: The stocks and the trade store if successful, an error message otherwise.
+    """
+    if not os.path.isfile(file_path):
+        return "[Error] Snapshot does not exist"
+    try:
+        with open_snapshot(file_path, fingerprint, trades_fingerprint if include_trades else None) as (stocks, records):
+            registry = SymbolRegistry(stocks)
+            store = make_store(registry)
+            if include_trades:
+                for symbol_id, trades in groupby(records, key=itemgetter(1)):
+                    store.restore(stocks[symbol_id], ((timestamp, quantity, price, side) for timestamp, _, side, quantity, price in trades))
+    except SnapshotError as e:
+        return f"[Error] {e}"
+    except Exception as e:
+        return f"[Error] Invalid snapshot. {e}"
+    return registry, store
@@ -0,0 +1,305 @@
+import csv
+import io
+import mmap
+import struct
+import time
+from itertools import islice
+from pathlib import Path
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Callable, Iterable, Iterator
+from models.bars import BarBuilder
+from models.stock import Stock
+from models.trade import Trade, TradeType
+from models.trade_store import TradeStore
+from utils.convert import try_parse_int, try_parse_float, parse_timestamps
+from utils.parallel_csv import CSV_ENCODING, read_csv_header, read_csv_piece, map_csv_pieces
+
+expected_trade_csv_headers = ["symbol", "type", "quantity", "price", "timestamp"]
+
+# Binary trade file layout, all little endian:
+# - header: magic, format version, number of symbols, number of records
+# - symbol table: per symbol a 2 byte length and the UTF-8 encoded symbol
+# - records: fixed width, timestamp (epoch ns), symbol index, side, quantity, price
+TRADE_FILE_MAGIC = b'SSSMTRDS'
+TRADE_FILE_VERSION = 1
+TRADE_FILE_HEADER = struct.Struct('<8sHIQ')
+TRADE_FILE_SYMBOL = struct.Struct('<H')
+TRADE_RECORD = struct.Struct('<qIBxxxqd')
+
+BAR_CSV_HEADERS = ["symbol", "interval", "start", "open", "high", "low", "close", "volume", "vwap", "trades"]
+
+# Number of records packed in memory before being written out
+EXPORT_BATCH = 65536
+# Number of CSV rows parsed together when importing in the current process
+IMPORT_BATCH = 65536
+
+def _parse_trade_row(row : dict, timestamp : int|None, now_ns : int) -> tuple[str, int, int, float, int]:
+    """
+    Parse and validate a row of a trade CSV file.
+    Args:
+    - row (dict): The dictionary representing a row from the CSV file.
+    - timestamp (int | None): The parsed timestamp column of the row, None if invalid.
+    - now_ns (int): The current time as epoch nanoseconds, later trades are invalid.
+    Returns:
+    - tuple[str, int, int, float, int]: The symbol, side, quantity, price and timestamp (epoch ns) of the trade.
+    Raises:
+    - ValueError: If the row is invalid.
+    """
+    if row.get('additional_columns'):
+        raise ValueError('Additional columns detected')
+    trade_type = (row['type'] or '').strip().lower()
+    if trade_type not in ['buy', 'sell']:
+        raise ValueError('Invalid Trade type')
+    quantity = try_parse_int(row['quantity'] or '')
+    if quantity is None or quantity < 1:
+        raise ValueError('Invalid Trade quantity')
+    price = try_parse_float(row['price'] or '')
+    if price is None or price <= 0:
+        raise ValueError('Invalid Trade price')
+    if timestamp is None or timestamp > now_ns:
+        raise ValueError('Invalid Trade date')
+    side = TradeType.Buy.value if trade_type == 'buy' else TradeType.Sell.value
+    return (row['symbol'] or '').strip(), side, quantity, price, timestamp
+
+def _parse_trade_rows(rows : list[dict]) -> list[tuple|str]:
+    """
+    Parse rows of a trade CSV file, converting their timestamp column in bulk.
+    Args:
+    - rows (list[dict]): The rows read from the CSV file.
+    Returns:
+    - list[tuple | str]: The parsed trade or the error message of every row.
+    """
+    timestamps = parse_timestamps([row['timestamp'] or '' for row in rows])
+    now_ns = time.time_ns()
+    results : list[tuple|str] = []
+    for row, timestamp in zip(rows, timestamps):
+        try:
+            results.append(_parse_trade_row(row, timestamp, now_ns))
+        except Exception as e:
+            results.append(str(e))
+    return results
+
+def _parse_trade_piece(file_path : str, fieldnames : list[str], start : int, end : int) -> list[tuple|str]:
+    """
+    Parse a byte range of a trade CSV file, called in a worker process.
+    Args:
+    - file_path (str): The path to the CSV file.
+    - fieldnames (list[str]): The column names from the header line.
+    - start (int): The start of the byte range.
+    - end (int): The end of the byte range.
+    Returns:
+    - list[tuple | str]: The parsed trade or the error message of every row of the range.
+    """
+    return _parse_trade_rows(list(read_csv_piece(file_path, fieldnames, start, end)))
+
+def _iter_trade_results(file_path : str, fieldnames : list[str], start : int) -> Iterator[tuple|str]:
+    """
+    Parse the rows of a trade CSV file as they are read, a batch at a time.
+    Args:
+    - file_path (str): The path to the CSV file.
+    - fieldnames (list[str]): The column names from the header line.
+    - start (int): The byte offset of the first data line.
+    Yields:
+    - tuple | str: The parsed trade or the error message of the next row.
+    """
+    with open(file_path, 'rb') as csv_file:
+        csv_file.seek(start)
+        with io.TextIOWrapper(csv_file, encoding=CSV_ENCODING, newline='') as text:
+            reader = csv.DictReader(text, fieldnames=fieldnames, restval=None, restkey='additional_columns')
+            while rows := list(islice(reader, IMPORT_BATCH)):
+                yield from _parse_trade_rows(rows)
+
+def import_trades_csv(file_path : str, store : TradeStore, find_stock : Callable[[str], Stock|None], skip_on_error : bool = True, workers : int = 1) -> int|str:
+    """
+    Import trades from a CSV file into a trade store without building Trade objects.
+    Args:
+    - file_path (str): The path to the CSV file.
+    - store (TradeStore): The store receiving the trades.
+    - find_stock (Callable[[str], Stock | None]): Finds the stock of a symbol.
+    - skip_on_error (bool): If True, skip rows with errors. If False, stop on the first error, keeping the trades imported so far.
+    - workers (int): The number of worker processes parsing the file, 1 parses in the current process.
+    Returns:
+    - int | str: The number of imported trades if successful, an error message otherwise.
+    """
+    if not Path(file_path).is_file():
+        return "[Error] File does not exist"
+    try:
+        fieldnames, start = read_csv_header(file_path)
+        if fieldnames is None or len(fieldnames) != len(expected_trade_csv_headers) or set(fieldnames) != set(expected_trade_csv_headers):
+            return "[Error] Invalid csv file. Invalid headers in csv file"
+        if workers > 1:
+            pieces = map_csv_pieces(file_path, _parse_trade_piece, fieldnames, start, workers)
+        else:
+            # Streamed, so the rows are recorded as they are read
+            pieces = [_iter_trade_results(file_path, fieldnames, start)]
+    except Exception as e:
+        return f"[Error] Invalid csv file. {e}"
+
+    stocks : dict[str, Stock|None] = {}
+    trade_types = {trade_type.value: trade_type for trade_type in TradeType}
+    imported = 0
+    index = 0
+    try:
+        for piece in pieces:
+            for result in piece:
+                if type(result) != str:
+                    symbol, side, quantity, price, timestamp = result
+                    if symbol not in stocks:
+                        stocks[symbol] = find_stock(symbol)
+                    stock = stocks[symbol]
+                    if stock is not None:
+                        store.record(stock, quantity, trade_types[side], price, timestamp)
+                        imported += 1
+                        index += 1
+                        continue
+                    result = 'Invalid Trade stock'
+                if not skip_on_error:
+                    return f"[Error] {result} in row {index}"
+                print(f"[Warning] {result} in row {index}. Skipped")
+                index += 1
+    except (UnicodeDecodeError, csv.Error) as e:
+        return f"[Error] Invalid csv file. {e}"
+    return imported
+
+def export_trades(file_path : str, store : TradeStore) -> int|str:
+    """
+    Export the trades of a trade store to a binary trade file.
+    Args:
+    - file_path (str): The path of the file to write.
+    - store (TradeStore): The store holding the trades.
+    Returns:
+    - int | str: The number of exported trades if successful, an error message otherwise.
+    """
+    # Symbols are registered before their trades, so reading them after the
+    # snapshot covers every symbol id it holds
+    rows = store.iter_rows()
+    symbols = [symbol.encode() for symbol in store.symbols()]
+    count = 0
+    try:
+        with open(file_path, 'wb') as trade_file:
+            # The record count is patched in once the snapshot has been written
+            trade_file.write(TRADE_FILE_HEADER.pack(TRADE_FILE_MAGIC, TRADE_FILE_VERSION, len(symbols), 0))
+            for symbol in symbols:
+                trade_file.write(TRADE_FILE_SYMBOL.pack(len(symbol)) + symbol)
+            buffer = bytearray(TRADE_RECORD.size * EXPORT_BATCH)
+            while batch := list(islice(rows, EXPORT_BATCH)):
+                for offset, (timestamp, symbol_id, quantity, price, side) in enumerate(batch):
+                    TRADE_RECORD.pack_into(buffer, offset * TRADE_RECORD.size, timestamp, symbol_id, side, quantity, price)
+                trade_file.write(memoryview(buffer)[:len(batch) * TRADE_RECORD.size])
+                count += len(batch)
+            trade_file.seek(0)
+            trade_file.write(TRADE_FILE_HEADER.pack(TRADE_FILE_MAGIC, TRADE_FILE_VERSION, len(symbols), count))
+    except Exception as e:
+        return f"[Error] Could not export trades. {e}"
+    return count
+
+def export_bars(file_path : str, builder : BarBuilder, intervals : Iterable[timedelta]|None = None) -> int|str:
+    """
+    Export OHLCV bars to a CSV file, one row per bar with the interval in seconds and the start in epoch nanoseconds.
+    Args:
+    - file_path (str): The path of the file to write.
+    - builder (BarBuilder): The builder holding the bars.
+    - intervals (Iterable[timedelta] | None): The bar lengths to export, None exports every interval.
+    Returns:
+    - int | str: The number of exported bars if successful, an error message otherwise.
+    """
+    count = 0
+    try:
+        rows = builder.iter_rows(intervals)
+        with open(file_path, 'w', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(BAR_CSV_HEADERS)
+            for symbol, interval, *columns in rows:
+                writer.writerow((symbol, interval.total_seconds(), *columns))
+                count += 1
+    except Exception as e:
+        return f"[Error] Could not export bars. {e}"
+    return count
+
+class TradeFileError(ValueError):
+    """
+    Raised when a binary trade file is invalid.
+    """
+
+@contextmanager
+def open_trade_file(file_path : str) -> Iterator[tuple[list[str], Iterator[tuple[int, int, int, int, float]]]]:
+    """
+    Memory-map a binary trade file and unpack its records in place.
+    Args:
+    - file_path (str): The path to the binary trade file.
+    Yields:
+    - tuple[list[str], Iterator[tuple[int, int, int, int, float]]]: The symbol table, and the timestamp (epoch ns), symbol index, side, quantity and price of every record. The records are only valid inside the context.
+    Raises:
+    - TradeFileError: If the file is not a binary trade file or is truncated.
+    """
+    with open(file_path, 'rb') as trade_file, mmap.mmap(trade_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        if len(mapped) < TRADE_FILE_HEADER.size:
+            raise TradeFileError('Invalid trade file')
+        magic, version, symbol_count, count = TRADE_FILE_HEADER.unpack_from(mapped, 0)
+        if magic != TRADE_FILE_MAGIC or version != TRADE_FILE_VERSION:
+            raise TradeFileError('Invalid trade file')
+        offset = TRADE_FILE_HEADER.size
+        symbols : list[str] = []
+        for _ in range(symbol_count):
+            if offset + TRADE_FILE_SYMBOL.size > len(mapped):
+                raise TradeFileError('Truncated trade file')
+            (length,) = TRADE_FILE_SYMBOL.unpack_from(mapped, offset)
+            offset += TRADE_FILE_SYMBOL.size
+            symbols.append(mapped[offset:offset + length].decode())
+            offset += length
+        end = offset + count * TRADE_RECORD.size
+        if end > len(mapped):
+            raise TradeFileError('Truncated trade file')
+        with memoryview(mapped) as view, view[offset:end] as section:
+            # Closing the generator releases the unpacker holding the buffer,
+            # even when the caller keeps a reference to the records
+            records = (record for record in TRADE_RECORD.iter_unpack(section))
+            try:
+                yield symbols, records
+            finally:
+                records.close()
+
+def import_trades(file_path : str, store : TradeStore, find_stock : Callable[[str], Stock|None]) -> int|str:
+    """
+    Import a binary trade file into a trade store without building Trade objects.
+    The file is memory-mapped and its records are unpacked in place. Every
+    record is checked before the first one is recorded, so an invalid file
+    imports nothing.
+    Args:
+    - file_path (str): The path to the binary trade file.
+    - store (TradeStore): The store receiving the trades.
+    - find_stock (Callable[[str], Stock | None]): Finds the stock of a symbol.
+    Returns:
+    - int | str: The number of imported trades if successful, an error message otherwise.
+    """
+    if not Path(file_path).is_file():
+        return "[Error] File does not exist"
+    trade_types = {trade_type.value: trade_type for trade_type in TradeType}
+    imported = 0
+    try:
+        with open_trade_file(file_path) as (symbols, records):
+            # Symbols without trades may be missing from the loaded stocks
+            stocks = [find_stock(symbol) for symbol in symbols]
+            for index, (_, symbol_index, side, quantity, price) in enumerate(records):
+                if symbol_index >= len(stocks):
+                    return f"[Error] Invalid symbol index {symbol_index} in trade file record {index}"
+                if stocks[symbol_index] is None:
+                    return f"[Error] Unknown symbol {symbols[symbol_index]} in trade file"
+                if side not in trade_types:
+                    return f"[Error] Invalid Trade type in trade file record {index}"
+                try:
+                    Trade.validate(stocks[symbol_index], quantity, price)
+                except ValueError as e:
+                    return f"[Error] {e} in trade file record {index}"
+        # The pages were just read, mapping the file again to record them is cheap
+        with open_trade_file(file_path) as (_, records):
+            record = store.record
+            for timestamp, symbol_index, side, quantity, price in records:
+                record(stocks[symbol_index], quantity, trade_types[side], price, timestamp)
+                imported += 1
+    except TradeFileError as e:
+        return f"[Error] {e}"
+    except Exception as e:
+        return f"[Error] Invalid trade file. {e}"
+    return imported